@@ -0,0 +1,199 @@
+import time
+
+import numpy as np
+
+from distancias import distancias_pares, vizinhos_mais_proximos
+
+OPCOES_PADRAO = {
+    "metodo": "grade",      # "grade" (células quadradas) ou "kmeans"
+    "alvo": 1000,           # número aproximado de pontos de demanda agregados
+    "iteracoes": 10,        # iterações de Lloyd do kmeans (parte da grade)
+}
+
+
+def projetar_plano(L, metrica):
+    """
+    Projeção equirretangular das coordenadas (lat, lon) em torno da latitude média, onde
+    distâncias curtas são aproximadamente proporcionais às da esfera; na métrica euclidiana
+    as coordenadas já estão no plano. Retorna (pontos no plano, fator de escala da longitude).
+    """
+    if metrica == "euclidiana":
+        return L.copy(), 1.0
+    escala = float(np.cos(np.deg2rad(L[:, 0].mean())))
+    return np.column_stack([L[:, 0], L[:, 1] * escala]), escala
+
+
+def _rotular_grade(X, lado):
+    celulas = np.floor((X - X.min(axis=0)) / lado).astype(np.int64)
+    return np.unique(celulas, axis=0, return_inverse=True)[1].reshape(-1)
+
+
+def agrupar_grade(X, alvo):
+    """
+    Grade de células quadradas com o maior número de células ocupadas que não passa de
+    `alvo` (lado da célula ajustado por bissecção). Retorna o grupo de cada ponto.
+    """
+    extensao = float(np.ptp(X, axis=0).max()) if len(X) else 0.0
+    if len(X) <= alvo or extensao == 0:
+        return np.arange(len(X)) if len(X) <= alvo else np.zeros(len(X), dtype=np.int64)
+
+    menor, maior = extensao / (4 * len(X)), 2 * extensao  # lados com muitos grupos e com um só
+    grupos = _rotular_grade(X, maior)
+    for _ in range(40):
+        lado = np.sqrt(menor * maior)
+        rotulos = _rotular_grade(X, lado)
+        if rotulos.max() + 1 <= alvo:
+            maior, grupos = lado, rotulos
+        else:
+            menor = lado
+        if maior / menor < 1.01:
+            break
+    return grupos
+
+
+def _centroides(X, grupos, pesos):
+    """
+    Centroide de cada grupo ponderado por `pesos` (média simples nos grupos de peso nulo).
+    """
+    n = grupos.max() + 1
+    total = np.bincount(grupos, weights=pesos, minlength=n)
+    quantidade = np.bincount(grupos, minlength=n)
+    usar = np.where(total[grupos] > 0, pesos, 1.0)
+    soma = np.where(total > 0, total, quantidade)
+    return np.column_stack([np.bincount(grupos, weights=usar * X[:, c], minlength=n) / soma
+                            for c in range(X.shape[1])])
+
+
+def agrupar_kmeans(X, alvo, pesos, iteracoes):
+    """
+    kmeans ponderado (Lloyd, atribuição pela árvore k-d) partindo dos centroides da grade.
+    Retorna o grupo de cada ponto.
+    """
+    from scipy.spatial import cKDTree
+
+    grupos = agrupar_grade(X, alvo)
+    for _ in range(iteracoes):
+        centros = _centroides(X, grupos, pesos)
+        _, novos = cKDTree(centros).query(X)
+        novos = np.unique(novos, return_inverse=True)[1].reshape(-1)  # descarta grupos vazios
+        if np.array_equal(novos, grupos):
+            break
+        grupos = novos
+    return grupos
+
+
+def agregar(inst, opcoes=None):
+    """
+    Agrega as localidades de `inst` em pontos de demanda: cada grupo vira um ponto no seu
+    centroide (ponderado por w) com a soma de w e de total_moradores.
+
+    Retorna (instância agregada, grupo de cada localidade, info). info["limite_erro"] é
+    sum_i w_i d(i, rep(i)) mais o arredondamento das distâncias: pela desigualdade
+    triangular, para qualquer conjunto de facilities abertas, o custo de alocar cada
+    localidade junto com seu representante difere do custo agregado em no máximo esse valor.
+    """
+    opcoes = {**OPCOES_PADRAO, **(opcoes or {})}
+    desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+    if desconhecidas:
+        raise ValueError(f"Parâmetros de agregação desconhecidos: {sorted(desconhecidas)}")
+    if opcoes["metodo"] not in ["grade", "kmeans"]:
+        raise ValueError("Método de agregação inválido. Deve ser 'grade' ou 'kmeans'.")
+    if opcoes["alvo"] < 1:
+        raise ValueError("O alvo da agregação deve ser pelo menos 1.")
+
+    inicio = time.time()
+    L, w, p = inst["L"], inst["w"], inst["p"]
+    metrica = inst["metrica_distancia"]
+    casas_decimais = None if metrica == "euclidiana" else 2
+    X, escala = projetar_plano(L, metrica)
+
+    if opcoes["metodo"] == "grade":
+        grupos = agrupar_grade(X, opcoes["alvo"])
+    else:
+        grupos = agrupar_kmeans(X, opcoes["alvo"], w, opcoes["iteracoes"])
+
+    centros = _centroides(X, grupos, w)
+    representantes = np.column_stack([centros[:, 0], centros[:, 1] / escala])
+    n = len(representantes)
+
+    distancia_rep = distancias_pares(L, representantes[grupos], metrica, None)
+    arredondamento = 10.0 ** -casas_decimais if casas_decimais is not None else 0.0
+    limite_erro = float(np.dot(w, distancia_rep + arredondamento))
+
+    agregado = dict(inst)
+    agregado.update({
+        "L": representantes,
+        "w": np.bincount(grupos, weights=w, minlength=n),
+        "p": np.bincount(grupos, weights=p, minlength=n),
+        "codigos": [f"agregado_{g}" for g in range(n)],
+    })
+    agregado.pop("M", None)  # w agregado não vem mais de M @ lambdas
+
+    info = {
+        "metodo": opcoes["metodo"],
+        "localidades": len(L),
+        "pontos": n,
+        "limite_erro": limite_erro,
+        "distancia_maxima_representante": float(distancia_rep.max()) if len(L) else 0.0,
+        "tempo": time.time() - inicio,
+    }
+    return agregado, grupos, info
+
+
+def desagregar(inst, grupos, abertas, atribuicao_agregada, vizinhos=8):
+    """
+    Leva a solução agregada de volta às localidades originais: cada localidade começa na
+    facility do seu representante (mesmas cargas, portanto viável) e passa para uma das
+    `vizinhos` facilities abertas mais próximas quando isso reduz o custo e há capacidade.
+
+    Retorna (atribuicao, objetivo) na instância original; o objetivo usa as mesmas
+    distâncias arredondadas do modelo.
+    """
+    nf = len(inst["Ff"])
+    metrica = inst["metrica_distancia"]
+    casas_decimais = None if metrica == "euclidiana" else 2
+    abertas_f = np.concatenate([np.arange(nf), nf + np.asarray(abertas, dtype=np.int64)])
+    atribuicao = np.asarray(atribuicao_agregada, dtype=np.int64)[grupos]
+    if (atribuicao < 0).any():
+        raise ValueError("Solução agregada sem atribuição para algum ponto de demanda.")
+
+    L, w, p = inst["L"], inst["w"], inst["p"]
+    atual = distancias_pares(L, inst["F"][atribuicao], metrica, casas_decimais)
+    indices, distancias = vizinhos_mais_proximos(L, inst["F"][abertas_f], vizinhos, metrica, casas_decimais)
+    indices = abertas_f[indices]
+
+    cap_f = np.concatenate([np.full(nf, np.inf), inst["cap"]])
+    residual = cap_f - np.bincount(atribuicao, weights=p, minlength=len(cap_f))
+    economia = atual - distancias[:, 0]
+    for i in np.flatnonzero(economia > 0)[np.argsort(-economia[economia > 0], kind="stable")].tolist():
+        for j, dist in zip(indices[i].tolist(), distancias[i].tolist()):
+            if dist >= atual[i]:
+                break
+            if residual[j] >= p[i]:
+                residual[atribuicao[i]] += p[i]
+                residual[j] -= p[i]
+                atribuicao[i], atual[i] = j, dist
+                break
+    return atribuicao, float(np.dot(w, atual))
+
+
+def limitante_valido(inst, d_max_agregado, abertas, atribuicoes):
+    """
+    Se limitante agregado - limite_erro vale como limitante da instância original. O limite
+    de erro só compara os problemas sem capacidade ativa e com o mesmo conjunto de pares
+    viáveis: exige cargas das facilities novas abaixo de cap em cada atribuição de
+    `atribuicoes` e na alocação de cada localidade à facility aberta mais próxima, e o mesmo
+    d_max nas duas instâncias.
+    """
+    nf = len(inst["Ff"])
+    metrica = inst["metrica_distancia"]
+    casas_decimais = None if metrica == "euclidiana" else 2
+    abertas_f = np.concatenate([np.arange(nf), nf + np.asarray(abertas, dtype=np.int64)])
+    indices, _ = vizinhos_mais_proximos(inst["L"], inst["F"][abertas_f], 1, metrica, casas_decimais)
+    for atribuicao in list(atribuicoes) + [abertas_f[indices[:, 0]]]:
+        novas = atribuicao >= nf
+        cargas = np.bincount(atribuicao[novas] - nf, weights=inst["p"][novas], minlength=len(inst["Fn"]))
+        if (cargas >= inst["cap"]).any():
+            return False
+    _, distancias = vizinhos_mais_proximos(inst["L"], inst["F"], 1, metrica, casas_decimais)
+    return d_max_agregado is not None and float(distancias.max()) == d_max_agregado
@@ -0,0 +1,92 @@
+"""
+Modo de avaliação do facility_v4: dado o conjunto de facilities novas abertas, calcula só a
+alocação e o objetivo, sem o MILP de localização. As fixas estão sempre abertas.
+
+Entrada: "modo": "avaliacao", "avaliacao": {"abertas": [3, 17, [-8.05, -34.90]]}, com cada
+facility nova dada pelo índice na lista das não fixas (na ordem da entrada) ou pela coordenada.
+
+Sem capacidade ativa, cada localidade vai para a facility aberta mais próxima (argmin
+vetorizado). Se essa alocação exceder a capacidade de alguma facility nova, a atribuição com
+atendimento único (cada localidade numa só facility) é resolvida pelo modelo radial com as
+facilities fixadas (modelo_radial): só as localidades que alcançam facilities saturadas
+recebem variáveis de alocação, e a relaxação linear de um fluxo de custo mínimo não basta,
+pois dividiria localidades entre facilities.
+"""
+import time
+
+import numpy as np
+
+from modelo_radial import atribuir_mais_proxima, facilities_violadas, resolver_radial
+from solucao import valor_objetivo
+
+OPCOES_PADRAO = {
+    "abertas": None,  # facilities novas abertas: índices em Fn ou coordenadas [lat, lon]
+}
+
+
+def indices_abertas(inst, abertas):
+    """
+    Converte a lista de facilities novas abertas (índices em Fn ou coordenadas) em índices
+    em Fn, ordenados e sem repetição.
+    """
+    Fn = inst["Fn"]
+    indices = []
+    for facility in abertas:
+        if isinstance(facility, (list, tuple)):
+            iguais = np.flatnonzero((Fn == np.asarray(facility[:2], dtype=np.float64)).all(axis=1))
+            if len(iguais) == 0:
+                raise ValueError(f"Nenhuma facility nova na coordenada {facility}.")
+            indices.append(int(iguais[0]))
+        elif isinstance(facility, (int, np.integer)) and not isinstance(facility, bool):
+            if not 0 <= facility < len(Fn):
+                raise ValueError(f"Índice de facility nova fora do intervalo: {facility}.")
+            indices.append(int(facility))
+        else:
+            raise ValueError(f"Facility aberta inválida: {facility}. Use o índice em Fn ou a coordenada.")
+    return np.unique(np.array(indices, dtype=np.int64))
+
+
+def resolver_atribuicao(inst, opcoes=None, config_solver=None):
+    """
+    Aloca as localidades às facilities abertas de opcoes["abertas"]. Usa inst["d"] e
+    inst["d_max"] (calcular_distancias).
+
+    Retorna (status, objetivo, abertas, atribuicao, info), como os demais modos; o objetivo
+    segue o tipo_problema e info traz a distância ponderada, se a capacidade ficou ativa e o
+    tempo.
+    """
+    config = dict(OPCOES_PADRAO)
+    if opcoes:
+        desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+        if desconhecidas:
+            raise ValueError(f"Parâmetros da avaliação desconhecidos: {sorted(desconhecidas)}")
+        config.update(opcoes)
+    if config["abertas"] is None:
+        raise ValueError("Facilities abertas não fornecidas para a avaliação.")
+
+    inicio = time.time()
+    abertas = indices_abertas(inst, config["abertas"])
+    info = {"abertas": len(abertas), "capacidade_ativa": False}
+    if inst["flag_problema"] == 2 and inst["c"][abertas].sum() > inst["c_max"]:
+        info.update({"motivo": "orçamento excedido", "tempo": time.time() - inicio})
+        return "Infeasible", None, None, None, info
+
+    atribuicao = atribuir_mais_proxima(inst, abertas)
+    if (inst["d"][np.arange(len(atribuicao)), atribuicao] > inst["d_max"]).any():
+        info.update({"motivo": "localidades sem facility aberta a até d_max", "tempo": time.time() - inicio})
+        return "Infeasible", None, None, None, info
+
+    status = "Optimal"
+    if len(facilities_violadas(inst, atribuicao)):
+        info["capacidade_ativa"] = True
+        status, _, _, atribuicao, info_radial = resolver_radial(inst, config_solver, abertas=abertas)
+        info["rodadas"] = info_radial["rodadas"]
+        if atribuicao is None:
+            info["tempo"] = time.time() - inicio
+            return status, None, None, None, info
+
+    info.update({
+        "distancia_ponderada": float(np.dot(inst["w"], inst["d"][np.arange(len(atribuicao)), atribuicao])),
+        "tempo": time.time() - inicio,
+    })
+    return status, valor_objetivo(inst, abertas, atribuicao), abertas, atribuicao, info
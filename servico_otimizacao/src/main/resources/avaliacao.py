@@ -0,0 +1,132 @@
+"""
+Estatísticas de uma solução do facility_v4 (do MILP, de uma heurística ou editada à mão):
+carga de cada centro contra a capacidade, violações, distâncias médias e percentis (simples e
+ponderados pela população) e parcela da população a até cada raio. Entram no bloco
+"estatisticas" do resultado.
+
+Entrada (opcional): "estatisticas": {"raios": [1, 2, 5], "percentis": [50, 90, 95, 99]}, com
+os raios na unidade das distâncias; "estatisticas": false desliga o bloco.
+
+Tudo é calculado com uma ordenação e somas por centro (bincount), O(l log l), rápido o
+bastante para avaliar soluções dentro de laços de heurísticas em instâncias grandes.
+"""
+import numpy as np
+
+from distancias import distancias_pares
+
+OPCOES_PADRAO = {
+    "raios": [1, 2, 5],              # cobertura: parcela a até cada distância
+    "percentis": [50, 90, 95, 99],   # percentis das distâncias às facilities atribuídas
+}
+
+
+def opcoes_estatisticas(opcoes):
+    """
+    Opções do campo "estatisticas" da entrada: True ou ausente usa OPCOES_PADRAO, False
+    desliga (retorna None).
+    """
+    if opcoes is False:
+        return None
+    config = dict(OPCOES_PADRAO)
+    if isinstance(opcoes, dict):
+        desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+        if desconhecidas:
+            raise ValueError(f"Parâmetros de estatísticas desconhecidos: {sorted(desconhecidas)}")
+        config.update(opcoes)
+    elif opcoes not in (None, True):
+        raise ValueError("O campo 'estatisticas' deve ser um objeto, true ou false.")
+    if any(not 0 <= q <= 100 for q in config["percentis"]):
+        raise ValueError("Os percentis devem estar entre 0 e 100.")
+    return config
+
+
+def distancias_atribuidas(inst, atribuicao):
+    """
+    Distância de cada localidade à facility atribuída: da matriz inst["d"], quando calculada,
+    ou só dos pares atribuídos (modos que não montam a matriz inteira).
+    """
+    atribuicao = np.asarray(atribuicao, dtype=np.int64)
+    if inst.get("d") is not None:
+        return inst["d"][np.arange(len(atribuicao)), atribuicao]
+    metrica = inst["metrica_distancia"]
+    return distancias_pares(inst["L"], inst["F"][atribuicao], metrica, None if metrica == "euclidiana" else 2)
+
+
+def cargas(inst, atribuicao):
+    """
+    População atribuída a cada facility de F.
+    """
+    return np.bincount(np.asarray(atribuicao, dtype=np.int64), weights=inst["p"], minlength=len(inst["F"]))
+
+
+def violacoes(inst, carga):
+    """
+    (índices em F, excesso) das facilities novas com carga acima da capacidade.
+    """
+    nf = len(inst["Ff"])
+    excesso = carga[nf:] - inst["cap"]
+    acima = np.flatnonzero(excesso > 1e-9)
+    return nf + acima, excesso[acima]
+
+
+def avaliar(inst, atribuicao, abertas=None, opcoes=None, distancias=None):
+    """
+    Bloco "estatisticas" da solução. `abertas` (índices em Fn) faz os centros novos abertos
+    sem localidades aparecerem com carga zero; `distancias` evita recalcular as distâncias
+    atribuídas quando o chamador já as tem.
+    """
+    opcoes = opcoes or OPCOES_PADRAO
+    nf = len(inst["Ff"])
+    p = inst["p"]
+    if distancias is None:
+        distancias = distancias_atribuidas(inst, atribuicao)
+
+    carga = cargas(inst, atribuicao)
+    usados = carga > 0
+    usados[:nf] = True
+    if abertas is not None:
+        usados[nf + np.asarray(abertas, dtype=np.int64)] = True
+    centros = np.flatnonzero(usados)
+    capacidade = np.concatenate([np.full(nf, np.nan), inst["cap"]])[centros]
+    acima, excesso = violacoes(inst, carga)
+
+    # Distâncias ordenadas com a população acumulada: percentis ponderados e cobertura por busca binária
+    ordem = np.argsort(distancias, kind="stable")
+    ordenadas = distancias[ordem]
+    acumulada = np.cumsum(p[ordem])
+    total = acumulada[-1] if len(acumulada) and acumulada[-1] > 0 else 1.0
+    percentis = np.asarray(opcoes["percentis"], dtype=np.float64)
+    posicao = np.minimum(np.searchsorted(acumulada, percentis / 100 * total), len(ordenadas) - 1)
+    raios = np.asarray(opcoes["raios"], dtype=np.float64)
+    dentro = np.searchsorted(ordenadas, raios, side="right")
+    populacao_dentro = np.where(dentro > 0, acumulada[np.maximum(dentro - 1, 0)], 0.0)
+
+    estatisticas = {
+        "distancia": {
+            "media": float(distancias.mean()),
+            "media_populacao": float(np.dot(p, distancias) / total),
+            "maxima": float(ordenadas[-1]),
+            "percentis": {f"p{q:g}": float(v) for q, v in zip(percentis, np.percentile(ordenadas, percentis))},
+            "percentis_populacao": {f"p{q:g}": float(v) for q, v in zip(percentis, ordenadas[posicao])},
+        },
+        "cobertura": {
+            "raios": raios.tolist(),
+            "localidades": (dentro / len(ordenadas)).tolist(),
+            "populacao": (populacao_dentro / total).tolist(),
+        },
+        "cargas": {
+            "centro": centros.tolist(),
+            "carga": carga[centros].tolist(),
+            "capacidade": [None if np.isnan(c) else float(c) for c in capacidade],
+            "utilizacao": [None if np.isnan(c) or c == 0 else float(x / c) for x, c in zip(carga[centros], capacidade)],
+        },
+        "violacoes": {
+            "quantidade": len(acima),
+            "excesso_total": float(excesso.sum()),
+            "centros": acima.tolist(),
+            "excesso": excesso.tolist(),
+        },
+    }
+    if inst.get("d_max") is not None:
+        estatisticas["distancia"]["acima_d_max"] = int(len(ordenadas) - np.searchsorted(ordenadas, inst["d_max"], side="right"))
+    return estatisticas
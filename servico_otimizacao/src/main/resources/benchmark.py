@@ -0,0 +1,329 @@
+"""
+Benchmark reprodutível dos otimizadores (facility_v3 e facility_v4) sobre as entradas do
+repositório e instâncias sintéticas escaladas.
+
+Configuração (JSON, todos os campos opcionais):
+    {
+        "versoes": ["facility_v3", "facility_v4"],
+        "instancias": ["entrada.json", "entrada0.json", {"base": "entrada3.json", "fator": 4}],
+        "variantes": {"pulp": {}, "matricial": {"modelo": "matricial"},
+                      "cbc": {"solver": {"nome": "cbc"}}},
+        "repeticoes": 3,
+        "tempo_limite": 600,
+        "baseline": "baseline_benchmark.json",
+        "atualizar_baseline": false,
+        "tolerancia": 0.2
+    }
+
+Entradas sem "pesos" ou "proporcao_inversa" (como entrada0.json) recebem pesos iguais para
+todas as métricas e nenhuma métrica invertida. O facility_v3 exige facilities fixas e novas e é
+pulado nas instâncias sem uma delas. A entrada2.json pede mais centros do que tem facilities e
+não roda em nenhuma versão. Cada variante é mesclada na entrada antes
+da execução. {"base", "fator"} gera a instância
+sintética com `fator` cópias da base lado a lado (escalar_instancia). Cada execução roda num
+processo próprio e registra o tempo de cada fase (pelo log estruturado do diagnostico.py), o
+pico de memória (RSS) do processo, o tamanho do modelo (linhas, colunas, não nulos, poda), o
+status, o objetivo e o gap. Os resultados vão para {prefixo}.csv e {prefixo}.json; com
+"baseline", as medianas são comparadas às gravadas e o script termina com código 1 se houver
+regressão. Uma baseline não é gravada se alguma execução terminar com status "Erro".
+
+Uso:
+    python benchmark.py [configuracao.json] [prefixo]
+"""
+import csv
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+OPCOES_PADRAO = {
+    "versoes": ["facility_v4"],
+    "instancias": ["entrada.json", "entrada0.json"],
+    "variantes": {"padrao": {}},
+    "repeticoes": 1,
+    "tempo_limite": None,         # segundos do solver em cada execução (padrão: o do script)
+    "baseline": None,             # arquivo com as medianas de referência
+    "atualizar_baseline": False,  # grava as medianas desta rodada como nova referência
+    "tolerancia": 0.2,            # aumento relativo aceito nos tempos e na memória
+    "tolerancia_segundos": 0.5,   # diferenças de tempo abaixo disto são ruído
+}
+
+# facility_v1 e facility_v2 usam formatos de entrada próprios e não entram no benchmark
+VERSOES = ["facility_v3", "facility_v4"]
+
+# Fases registradas pelo diagnostico.py dos otimizadores, mais o tempo total do processo
+FASES = ["leitura", "preparacao", "agregacao", "distancias", "heuristica", "lagrangiana",
+         "modelo", "resolucao", "extracao", "resultados", "escrita", "graficos", "total"]
+
+COLUNAS = ["versao", "instancia", "variante", "repeticao", "status", "objetivo", "gap",
+           "linhas", "colunas", "nao_nulos", "poda", "rss_pico_mb"] + [f"tempo_{fase}" for fase in FASES]
+
+# Medidas comparadas com a baseline (quanto menor, melhor)
+MEDIDAS_COMPARADAS = ["tempo_modelo", "tempo_resolucao", "tempo_total", "rss_pico_mb"]
+
+
+def escalar_instancia(dados, fator):
+    """
+    Instância sintética com `fator` cópias das localidades e facilities de `dados` dispostas
+    lado a lado numa grade (cada cópia deslocada pela extensão das coordenadas) e
+    num_centros_desejado multiplicado pelo fator: mantém a densidade e a estrutura da base.
+    """
+    if fator < 1:
+        raise ValueError("O fator de escala deve ser pelo menos 1.")
+    coordenadas = [item["coordenada"] for chave in ("localidades", "facilities") for item in dados[chave]]
+    altura = (max(c[0] for c in coordenadas) - min(c[0] for c in coordenadas)) * 1.05
+    largura = (max(c[1] for c in coordenadas) - min(c[1] for c in coordenadas)) * 1.05
+    colunas = math.ceil(math.sqrt(fator))
+
+    escalada = dict(dados, localidades=[], facilities=[])
+    for copia in range(fator):
+        deslocamento = [(copia // colunas) * altura, (copia % colunas) * largura]
+        for chave, campo in (("localidades", "codigo"), ("facilities", "codigo_cnes")):
+            for item in dados[chave]:
+                novo = dict(item, coordenada=[item["coordenada"][0] + deslocamento[0],
+                                              item["coordenada"][1] + deslocamento[1]])
+                if copia and novo.get(campo) is not None:
+                    novo[campo] = f"{novo[campo]}_{copia}"
+                escalada[chave].append(novo)
+    escalada["num_centros_desejado"] = dados["num_centros_desejado"] * fator
+    return escalada
+
+
+def completar_entrada(dados):
+    """
+    Pesos iguais e nenhuma métrica invertida para as entradas que não os definem.
+    """
+    num_metricas = len(dados.get("nome_metricas") or dados["localidades"][0]["metricas"])
+    completa = dict(dados)
+    completa.setdefault("pesos", [1 / num_metricas] * num_metricas)
+    completa.setdefault("proporcao_inversa", [0] * num_metricas)
+    return completa
+
+
+def suporta(versao, dados):
+    """
+    Se a versão roda a instância: o facility_v3 exige facilities fixas e novas.
+    """
+    if versao != "facility_v3":
+        return True
+    fixas = sum(1 for facility in dados["facilities"] if facility.get("fixed"))
+    return 0 < fixas < len(dados["facilities"])
+
+
+def _executar(versao, entrada, log, diretorio):
+    """
+    Roda uma execução num processo novo. Retorna (resultado gravado, medidas, pico de RSS em MB);
+    as medidas vêm do log estruturado do diagnóstico e o tempo total é o do processo inteiro.
+    """
+    base = os.path.join(diretorio, "execucao")
+    saida = f"{base}_saida.json"
+    for arquivo in (saida, log):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
+    inicio = time.perf_counter()
+    with open(f"{base}.log", 'w', encoding='utf-8') as saida_processo:
+        processo = subprocess.Popen(
+            [sys.executable, f"{versao}.py", entrada, saida],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(os.environ, MPLBACKEND="Agg"),
+            stdout=saida_processo, stderr=subprocess.STDOUT,
+        )
+        # wait4 devolve o uso de recursos deste processo (e dos filhos que ele esperou)
+        _, estado, uso = os.wait4(processo.pid, 0)
+        processo.returncode = os.waitstatus_to_exitcode(estado)
+    medidas = {"fases": {"total": time.perf_counter() - inicio}, "modelo": {}}
+
+    if os.path.exists(log):
+        with open(log, encoding='utf-8') as arquivo:
+            for evento in map(json.loads, arquivo):
+                if evento["evento"] == "fase":
+                    medidas["fases"][evento["fase"]] = medidas["fases"].get(evento["fase"], 0.0) + evento["tempo"]
+                elif evento["evento"] == "resumo":
+                    medidas["modelo"] = evento["modelo"]
+    try:
+        with open(saida, encoding='utf-8') as arquivo:
+            resultados = json.load(arquivo)
+    except (OSError, ValueError):
+        resultados = {"status": "Erro", "mensagem": f"Execução terminou com código {processo.returncode}"}
+    return resultados, medidas, uso.ru_maxrss / 1024
+
+
+def _linha(versao, instancia, variante, repeticao, resultados, medidas, rss):
+    status = resultados.get("status")
+    objetivo = resultados.get(resultados.get("tipo_problema")) if "tipo_problema" in resultados else None
+    linha = {
+        "versao": versao, "instancia": instancia, "variante": variante, "repeticao": repeticao,
+        "status": status,
+        "objetivo": objetivo,
+        "gap": resultados.get("gap", 0.0 if status == "Optimal" else None),
+        "linhas": medidas["modelo"].get("restricoes"),
+        "colunas": medidas["modelo"].get("variaveis"),
+        "nao_nulos": medidas["modelo"].get("nao_nulos"),
+        "poda": medidas["modelo"].get("poda"),
+        "rss_pico_mb": rss,
+    }
+    linha.update({f"tempo_{fase}": medidas["fases"].get(fase) for fase in FASES})
+    if status == "Erro":
+        linha["mensagem"] = resultados.get("mensagem")
+    return linha
+
+
+def _carregar_instancias(opcoes, diretorio_base):
+    """
+    Lista de (nome, dados) das instâncias da configuração; caminhos relativos ao arquivo de
+    configuração.
+    """
+    instancias = []
+    for especificacao in opcoes["instancias"]:
+        if isinstance(especificacao, str):
+            especificacao = {"base": especificacao, "fator": 1}
+        desconhecidas = set(especificacao) - {"base", "fator"}
+        if desconhecidas:
+            raise ValueError(f"Campos de instância desconhecidos: {sorted(desconhecidas)}")
+        with open(os.path.join(diretorio_base, especificacao["base"]), encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+        nome = os.path.splitext(os.path.basename(especificacao["base"]))[0]
+        fator = especificacao.get("fator", 1)
+        if fator != 1:
+            dados, nome = escalar_instancia(dados, fator), f"{nome}_x{fator}"
+        instancias.append((nome, completar_entrada(dados)))
+    return instancias
+
+
+def medianas(linhas):
+    """
+    Mediana de cada medida por (versão, instância, variante), com o status e o objetivo da
+    última repetição.
+    """
+    grupos = {}
+    for linha in linhas:
+        grupos.setdefault(f"{linha['versao']}/{linha['instancia']}/{linha['variante']}", []).append(linha)
+    resumo = {}
+    for chave, grupo in grupos.items():
+        resumo[chave] = {"status": grupo[-1]["status"], "objetivo": grupo[-1]["objetivo"]}
+        for medida in MEDIDAS_COMPARADAS + [f"tempo_{fase}" for fase in FASES]:
+            valores = [linha[medida] for linha in grupo if linha.get(medida) is not None]
+            resumo[chave][medida] = statistics.median(valores) if valores else None
+    return resumo
+
+
+def comparar(atual, baseline, tolerancia=0.2, tolerancia_segundos=0.5):
+    """
+    Regressões de `atual` em relação a `baseline` (ambos no formato de medianas): tempos ou
+    memória acima de (1 + tolerancia) vezes a referência, objetivo pior ou perda do status ótimo.
+    """
+    regressoes = []
+    for chave, referencia in baseline.items():
+        if chave not in atual:
+            continue
+        medidas = atual[chave]
+        for medida in MEDIDAS_COMPARADAS:
+            novo, antigo = medidas.get(medida), referencia.get(medida)
+            if novo is None or antigo is None:
+                continue
+            limite = antigo * (1 + tolerancia)
+            if medida.startswith("tempo_"):
+                limite = max(limite, antigo + tolerancia_segundos)
+            if novo > limite:
+                regressoes.append({"chave": chave, "medida": medida, "baseline": antigo, "atual": novo})
+        if referencia.get("objetivo") is not None:
+            novo = medidas.get("objetivo")
+            if novo is None or novo > referencia["objetivo"] + 1e-6 * max(1.0, abs(referencia["objetivo"])):
+                regressoes.append({"chave": chave, "medida": "objetivo",
+                                   "baseline": referencia["objetivo"], "atual": novo})
+        if referencia.get("status") == "Optimal" and medidas.get("status") != "Optimal":
+            regressoes.append({"chave": chave, "medida": "status",
+                               "baseline": referencia["status"], "atual": medidas.get("status")})
+    return regressoes
+
+
+def executar_benchmark(opcoes=None, prefixo="benchmark", diretorio_base="."):
+    """
+    Roda todas as combinações versão x instância x variante x repetição, grava
+    {prefixo}.csv e {prefixo}.json e compara com a baseline. Retorna o resumo gravado no JSON.
+    """
+    opcoes = {**OPCOES_PADRAO, **(opcoes or {})}
+    desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+    if desconhecidas:
+        raise ValueError(f"Parâmetros do benchmark desconhecidos: {sorted(desconhecidas)}")
+    invalidas = set(opcoes["versoes"]) - set(VERSOES)
+    if invalidas:
+        raise ValueError(f"Versões sem suporte no benchmark: {sorted(invalidas)}. Use {VERSOES}.")
+    if opcoes["repeticoes"] < 1:
+        raise ValueError("O número de repetições deve ser pelo menos 1.")
+
+    linhas = []
+    with tempfile.TemporaryDirectory() as diretorio:
+        log = os.path.join(diretorio, "execucao_diagnostico.jsonl")
+        for nome, dados in _carregar_instancias(opcoes, diretorio_base):
+            for variante, ajustes in opcoes["variantes"].items():
+                entrada_variante = {**dados, **ajustes}
+                entrada_variante["diagnostico"] = {**(entrada_variante.get("diagnostico") or {}), "log": log}
+                # Cada repetição resolve de fato (o cache de resultados devolveria a anterior)
+                entrada_variante.setdefault("cache_resultados", False)
+                if opcoes["tempo_limite"] is not None:
+                    entrada_variante["solver"] = {"tempo_limite": opcoes["tempo_limite"],
+                                                  **entrada_variante.get("solver", {})}
+                entrada = os.path.join(diretorio, f"{nome}_{variante}.json")
+                with open(entrada, 'w', encoding='utf-8') as arquivo:
+                    json.dump(entrada_variante, arquivo)
+
+                for versao in opcoes["versoes"]:
+                    if not suporta(versao, dados):
+                        print(f"{versao} {nome}: instância sem facilities fixas ou novas; pulada")
+                        continue
+                    for repeticao in range(opcoes["repeticoes"]):
+                        resultados, medidas, rss = _executar(versao, entrada, log, diretorio)
+                        linha = _linha(versao, nome, variante, repeticao, resultados, medidas, rss)
+                        print(f"{versao} {nome} {variante} #{repeticao}: {linha['status']} "
+                              f"{linha['objetivo']} em {linha['tempo_total'] or 0:.2f} s, "
+                              f"{linha['rss_pico_mb']:.0f} MB")
+                        linhas.append(linha)
+                os.remove(entrada)
+
+    with open(f"{prefixo}.csv", 'w', encoding='utf-8', newline='') as arquivo:
+        escritor = csv.DictWriter(arquivo, fieldnames=COLUNAS + ["mensagem"], restval="")
+        escritor.writeheader()
+        escritor.writerows(linhas)
+
+    resumo = {"execucoes": linhas, "medianas": medianas(linhas)}
+    baseline = opcoes["baseline"] and os.path.join(diretorio_base, opcoes["baseline"])
+    if baseline and os.path.exists(baseline) and not opcoes["atualizar_baseline"]:
+        with open(baseline, encoding='utf-8') as arquivo:
+            referencia = json.load(arquivo)
+        resumo["regressoes"] = comparar(resumo["medianas"], referencia,
+                                        opcoes["tolerancia"], opcoes["tolerancia_segundos"])
+        for regressao in resumo["regressoes"]:
+            print(f"Regressão em {regressao['chave']}: {regressao['medida']} "
+                  f"{regressao['baseline']} -> {regressao['atual']}")
+    elif baseline and any(linha["status"] == "Erro" for linha in linhas):
+        resumo["baseline_recusada"] = [f"{linha['versao']}/{linha['instancia']}/{linha['variante']}"
+                                       for linha in linhas if linha["status"] == "Erro"]
+        print(f"Baseline não gravada: execuções com erro em {sorted(set(resumo['baseline_recusada']))}")
+    elif baseline:
+        with open(baseline, 'w', encoding='utf-8') as arquivo:
+            json.dump(resumo["medianas"], arquivo, indent=4)
+        print(f"Baseline gravada em {baseline}")
+
+    with open(f"{prefixo}.json", 'w', encoding='utf-8') as arquivo:
+        json.dump(resumo, arquivo, indent=4)
+    return resumo
+
+
+def main():
+    opcoes, diretorio_base = None, "."
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as arquivo:
+            opcoes = json.load(arquivo)
+        diretorio_base = os.path.dirname(os.path.abspath(sys.argv[1]))
+    resumo = executar_benchmark(opcoes, sys.argv[2] if len(sys.argv) > 2 else "benchmark", diretorio_base)
+    sys.exit(1 if resumo.get("regressoes") or resumo.get("baseline_recusada") else 0)
+
+
+if __name__ == "__main__":
+    main()
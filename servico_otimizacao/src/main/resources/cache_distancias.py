@@ -0,0 +1,182 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from distancias import matriz_distancias, linhas_por_bloco
+from cache_resultados import diretorio_privado
+
+# Diretório e tamanho máximo do cache (as entradas menos usadas recentemente saem primeiro); o
+# diretório padrão é próprio do usuário e só é usado se for privado (diretorio_privado)
+DIRETORIO_PADRAO = os.environ.get("CACHE_DISTANCIAS_DIR") or os.path.join(tempfile.gettempdir(),
+                                                                          f"cache_distancias_{os.getuid()}")
+LIMITE_MB_PADRAO = int(os.environ.get("CACHE_DISTANCIAS_MB", 4096))
+
+
+def chave(L, F, metrica, casas_decimais):
+    """
+    Hash do conteúdo das coordenadas e da métrica: a mesma entrada sempre cai no mesmo arquivo.
+    """
+    h = hashlib.sha256()
+    for parte in (np.ascontiguousarray(L, dtype=np.float64), np.ascontiguousarray(F, dtype=np.float64)):
+        h.update(str(parte.shape).encode())
+        h.update(parte.tobytes())
+    h.update(f"{metrica}|{casas_decimais}".encode())
+    return h.hexdigest()
+
+
+def _abrir(caminho):
+    """
+    Abre o .npy mapeado em memória, só leitura; processos que abrem o mesmo arquivo
+    compartilham as páginas. Devolve um ndarray comum (sem a sobrecarga de np.memmap).
+    """
+    os.utime(caminho)  # marca o uso para o LRU
+    return np.asarray(np.load(caminho, mmap_mode='r'))
+
+
+def _correspondencia(novos, antigos):
+    """
+    Para cada ponto de `novos`, o índice de um ponto com as mesmas coordenadas em `antigos`
+    (-1 se não houver).
+    """
+    indice = {p.tobytes(): k for k, p in enumerate(antigos)}
+    return np.array([indice.get(p.tobytes(), -1) for p in novos], dtype=np.int64)
+
+
+def _melhor_parcial(diretorio, L, F, metrica, casas_decimais):
+    """
+    Entrada do cache com a mesma métrica que mais aproveita pares (linha, coluna) já calculados.
+    Retorna (caminho, linhas, colunas) com a correspondência de L e F, ou None.
+    """
+    melhor, aproveitados = None, 0
+    for meta in glob.glob(os.path.join(diretorio, "*.json")):
+        if meta.endswith(".tmp.json"):
+            continue  # entrada sendo escrita por outro processo
+        try:
+            with open(meta, encoding='utf-8') as arquivo:
+                info = json.load(arquivo)
+            base = meta[:-len(".json")]
+            if info["metrica"] != metrica or info["casas_decimais"] != casas_decimais \
+                    or not os.path.exists(base + ".npy"):
+                continue
+            coordenadas = np.load(base + ".coords.npz")
+        except (OSError, ValueError, KeyError):
+            continue
+        linhas = _correspondencia(L, coordenadas["L"])
+        colunas = _correspondencia(F, coordenadas["F"])
+        total = int((linhas >= 0).sum()) * int((colunas >= 0).sum())
+        if total > aproveitados:
+            melhor, aproveitados = (base + ".npy", linhas, colunas), total
+    return melhor
+
+
+def _preencher(destino, L, F, metrica, casas_decimais, parcial=None, memoria_max_mb=256):
+    """
+    Preenche `destino` (l x f), copiando de uma entrada antiga os pares já conhecidos e
+    calculando só as linhas e colunas novas.
+    """
+    if parcial is None:
+        matriz_distancias(L, F, metrica, casas_decimais=casas_decimais, memoria_max_mb=memoria_max_mb, out=destino)
+        return
+
+    caminho, linhas, colunas = parcial
+    antiga = np.load(caminho, mmap_mode='r')
+    linhas_velhas, colunas_velhas = np.flatnonzero(linhas >= 0), np.flatnonzero(colunas >= 0)
+    linhas_novas, colunas_novas = np.flatnonzero(linhas < 0), np.flatnonzero(colunas < 0)
+
+    passo = linhas_por_bloco(len(F), memoria_max_mb, temporarios=2)
+    for inicio in range(0, len(linhas_velhas), passo):
+        bloco = linhas_velhas[inicio:inicio + passo]
+        valores = np.empty((len(bloco), len(F)), dtype=destino.dtype)
+        valores[:, colunas_velhas] = antiga[linhas[bloco]][:, colunas[colunas_velhas]]
+        if len(colunas_novas):
+            valores[:, colunas_novas] = matriz_distancias(L[bloco], F[colunas_novas], metrica,
+                                                          casas_decimais=casas_decimais)
+        destino[bloco] = valores
+    if len(linhas_novas):
+        for inicio in range(0, len(linhas_novas), passo):
+            bloco = linhas_novas[inicio:inicio + passo]
+            destino[bloco] = matriz_distancias(L[bloco], F, metrica, casas_decimais=casas_decimais)
+
+
+def _remover(base):
+    for sufixo in (".npy", ".json", ".coords.npz"):
+        try:
+            os.remove(base + sufixo)
+        except FileNotFoundError:
+            pass
+
+
+def limpar_cache(diretorio=DIRETORIO_PADRAO, limite_mb=LIMITE_MB_PADRAO, manter=None):
+    """
+    Remove as entradas usadas há mais tempo até o cache caber em limite_mb.
+    `manter` é o caminho base de uma entrada que nunca é removida (a que acabou de ser usada).
+    """
+    entradas = []
+    for npy in glob.glob(os.path.join(diretorio, "*.npy")):
+        base = npy[:-len(".npy")]
+        if base.endswith(".tmp"):
+            continue
+        try:
+            tamanho = sum(os.path.getsize(base + s) for s in (".npy", ".json", ".coords.npz")
+                          if os.path.exists(base + s))
+            entradas.append((os.path.getmtime(npy), tamanho, base))
+        except OSError:
+            continue
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, base in sorted(entradas):
+        if total <= limite_mb * 1024 * 1024:
+            break
+        if base != manter:
+            _remover(base)
+            total -= tamanho
+
+
+def matriz_distancias_cache(L, F, metrica="cosseno", casas_decimais=2, diretorio=DIRETORIO_PADRAO,
+                            limite_mb=LIMITE_MB_PADRAO):
+    """
+    matriz_distancias com cache em disco: a matriz fica em {diretorio}/{hash}.npy e é aberta
+    mapeada em memória (só leitura) nas execuções seguintes. Se não houver entrada para essas
+    coordenadas, aproveita a entrada com mais linhas/colunas em comum (por exemplo quando só
+    algumas facilities foram incluídas ou removidas) e calcula apenas o que falta.
+
+    Retorna (d, origem), com origem "cache", "parcial" ou "calculada". Se o diretório não
+    puder ser usado ou não for privado do usuário (outro usuário poderia plantar matrizes
+    nele), calcula a matriz em memória normalmente.
+    """
+    L = np.asarray(L, dtype=np.float64).reshape(-1, 2)
+    F = np.asarray(F, dtype=np.float64).reshape(-1, 2)
+    if not diretorio_privado(diretorio, "distâncias"):
+        return matriz_distancias(L, F, metrica, casas_decimais=casas_decimais), "calculada"
+    base = os.path.join(diretorio, chave(L, F, metrica, casas_decimais))
+
+    if os.path.exists(base + ".npy"):
+        try:
+            return _abrir(base + ".npy"), "cache"
+        except (OSError, ValueError) as e:
+            logging.warning("Entrada do cache de distâncias ilegível (%s); recalculando.", e)
+
+    # Escreve em arquivos temporários e publica com os.replace: leitores nunca veem um .npy incompleto
+    temporario = f"{base}.{os.getpid()}.tmp"
+    try:
+        parcial = _melhor_parcial(diretorio, L, F, metrica, casas_decimais)
+        destino = np.lib.format.open_memmap(temporario + ".npy", mode='w+', dtype=np.float64, shape=(len(L), len(F)))
+        _preencher(destino, L, F, metrica, casas_decimais, parcial)
+        destino.flush()
+        del destino
+        np.savez(temporario + ".coords.npz", L=L, F=F)
+        with open(temporario + ".json", 'w', encoding='utf-8') as arquivo:
+            json.dump({"metrica": metrica, "casas_decimais": casas_decimais, "formato": [len(L), len(F)]}, arquivo)
+        for sufixo in (".coords.npz", ".json", ".npy"):
+            os.replace(temporario + sufixo, base + sufixo)
+
+        limpar_cache(diretorio, limite_mb, manter=base)
+        return _abrir(base + ".npy"), ("parcial" if parcial is not None else "calculada")
+    except OSError as e:
+        _remover(temporario)
+        logging.warning("Cache de distâncias indisponível em %s (%s); calculando em memória.", diretorio, e)
+        return matriz_distancias(L, F, metrica, casas_decimais=casas_decimais), "calculada"
@@ -0,0 +1,273 @@
+"""
+Cache em disco dos resultados do facility_v4, endereçado pelo conteúdo da entrada.
+
+A chave é o hash canônico do que influencia a solução: coordenadas, métricas, população e
+custos (como arrays), os demais campos da entrada (pesos, proporcao_inversa, tipo_problema,
+num_centros_desejado, modo, ...) em JSON com chaves ordenadas, a configuração do solver e as
+versões do código e dos backends. Campos que só afetam a execução (arquivo_saida,
+gerar_graficos, diagnostico, cache_*) ficam de fora. Uma entrada idêntica devolve o resultado
+guardado, marcado em "cache": {"acerto": true}, desde que ele seja ótimo ("Optimal").
+
+Entradas com a mesma instância (mesmas coordenadas, métricas, população e custos) e outro k ou
+outros pesos são acertos próximos: as facilities abertas delas servem de solução inicial.
+Soluções viáveis não provadas ótimas (limite de tempo, gap) são guardadas só para isso: uma
+nova execução com mais tempo resolveria melhor, então elas nunca são devolvidas como acerto.
+
+Entrada (opcional): "cache_resultados": {"diretorio": ..., "limite_mb": 512, "idade_max_dias": 30}
+ou false para desligar. As entradas usadas há mais tempo saem primeiro quando o cache passa do
+limite, e as mais velhas que idade_max_dias saem sempre. Resultados sem solução (fora de
+STATUS_COM_SOLUCAO) não são guardados.
+
+O diretório padrão é próprio do usuário ($TMPDIR/cache_resultados_{uid}) e é criado com modo
+0700; um diretório de outro usuário ou com escrita para grupo ou outros desliga o cache.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+import time
+
+import numpy as np
+import scipy
+
+from escrita import gravar_resultados
+from solucao import STATUS_COM_SOLUCAO
+
+try:
+    import pulp
+except ImportError:  # dependência opcional: só entra na versão dos backends
+    pulp = None
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# Versão do formato das entradas e do código que produz os resultados: mudá-la invalida o cache
+VERSAO = 1
+
+OPCOES_PADRAO = {
+    "diretorio": os.environ.get("CACHE_RESULTADOS_DIR") or os.path.join(tempfile.gettempdir(), f"cache_resultados_{os.getuid()}"),
+    "limite_mb": int(os.environ.get("CACHE_RESULTADOS_MB", 512)),
+    "idade_max_dias": float(os.environ.get("CACHE_RESULTADOS_DIAS", 30)),
+}
+
+# Campos da entrada que não mudam a solução (as listas de localidades e facilities entram pelos arrays)
+CAMPOS_IGNORADOS = {"arquivo_saida", "gerar_graficos", "diagnostico", "cache_resultados", "cache_distancias",
+                    "localidades", "facilities", "colunas"}
+# Campos do solver que não mudam a solução
+SOLVER_IGNORADOS = {"msg", "caminho"}
+
+
+def versoes_backends():
+    """
+    Versões do código e das bibliotecas que resolvem o modelo.
+    """
+    return {
+        "cache": VERSAO,
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "pulp": getattr(pulp, "__version__", None),
+        "highspy": getattr(highspy, "__version__", None) if highspy is not None else None,
+    }
+
+
+def diretorio_privado(diretorio, nome="resultados"):
+    """
+    Cria `diretorio` com modo 0700, se preciso, e diz se ele é seguro para o cache: do usuário
+    atual e sem escrita para grupo ou outros (num $TMPDIR compartilhado, outro usuário poderia
+    criá-lo antes e plantar entradas). `nome` identifica o cache nos avisos.
+    """
+    try:
+        os.makedirs(diretorio, mode=0o700, exist_ok=True)
+        estado = os.lstat(diretorio)
+    except OSError as e:
+        logging.warning("Cache de %s indisponível em %s (%s).", nome, diretorio, e)
+        return False
+    if not stat.S_ISDIR(estado.st_mode) or estado.st_uid != os.getuid() or estado.st_mode & 0o022:
+        logging.warning("Cache de %s desligado: %s não é um diretório privado do usuário.", nome, diretorio)
+        return False
+    return True
+
+
+def chave_instancia(inst):
+    """
+    Hash dos arrays da instância (coordenadas, métricas, população, custos, códigos) e da
+    métrica de distância.
+    """
+    h = hashlib.sha256()
+    for nome in ("L", "M", "p", "Ff", "Fn", "c"):
+        parte = np.ascontiguousarray(inst[nome], dtype=np.float64)
+        h.update(f"{nome}{parte.shape}".encode())
+        h.update(parte.tobytes())
+    h.update(json.dumps([inst["codigos"], inst["codigo_cnes"], inst["metrica_distancia"]], default=str).encode())
+    return h.hexdigest()
+
+
+def chave_resultado(dados, inst, config_solver):
+    """
+    Hash da instância, dos parâmetros da entrada, da configuração do solver e das versões.
+    """
+    parametros = {campo: valor for campo, valor in dados.items() if campo not in CAMPOS_IGNORADOS}
+    solver = {campo: valor for campo, valor in (config_solver or {}).items() if campo not in SOLVER_IGNORADOS}
+    h = hashlib.sha256(chave_instancia(inst).encode())
+    h.update(json.dumps([parametros, solver, versoes_backends()], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class CacheResultados:
+    """
+    Cache de uma execução do facility_v4. Cada entrada é {instancia}.{chave}.npz (facilities
+    abertas e alocação) e, só para resultados ótimos, {instancia}.{chave}.json (o resultado);
+    o hash da instância no nome permite achar os acertos próximos só pelo nome dos arquivos.
+    A data de modificação do .npz marca o último uso da entrada.
+    """
+
+    def __init__(self, opcoes, dados, inst, config_solver=None):
+        self.opcoes = None
+        if opcoes is False:
+            return
+        self.opcoes = dict(OPCOES_PADRAO)
+        if isinstance(opcoes, dict):
+            desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+            if desconhecidas:
+                raise ValueError(f"Parâmetros do cache de resultados desconhecidos: {sorted(desconhecidas)}")
+            self.opcoes.update(opcoes)
+        elif opcoes not in (None, True):
+            raise ValueError("O campo 'cache_resultados' deve ser um objeto, true ou false.")
+        if not diretorio_privado(self.opcoes["diretorio"]):
+            self.opcoes = None
+            return
+        self.instancia = chave_instancia(inst)
+        self.chave = chave_resultado(dados, inst, config_solver)
+        self.k = inst["k"]
+        self.base = os.path.join(self.opcoes["diretorio"], f"{self.instancia}.{self.chave}")
+
+    @property
+    def ativo(self):
+        return self.opcoes is not None
+
+    def buscar(self):
+        """
+        Resultado ótimo guardado para esta entrada (com o bloco "cache" de acerto) ou None.
+        """
+        if not self.ativo or not os.path.exists(self.base + ".json"):
+            return None
+        try:
+            with open(self.base + ".json", encoding='utf-8') as arquivo:
+                resultados = json.load(arquivo)
+            os.utime(self.base + ".npz")  # marca o uso para o LRU
+        except (OSError, ValueError) as e:
+            logging.warning("Entrada do cache de resultados ilegível (%s); resolvendo de novo.", e)
+            return None
+        if resultados.get("status") != "Optimal":
+            return None
+        # Resultado binário guardado como compacto volta a ter as alocações no .npz ao lado da saída
+        original = resultados.pop("formato_original", None)
+        if original is not None:
+            resultados["formato"] = original
+        resultados["cache"] = {"acerto": True, "chave": self.chave}
+        return resultados
+
+    def proxima(self):
+        """
+        Facilities novas abertas (índices em Fn) da entrada da mesma instância com k mais
+        próximo (a usada mais recentemente, no empate), ou None.
+        """
+        if not self.ativo:
+            return None
+        melhor, criterio = None, None
+        for caminho in glob.glob(os.path.join(self.opcoes["diretorio"], f"{self.instancia}.*.npz")):
+            if caminho.endswith(".tmp.npz") or caminho == self.base + ".npz":
+                continue
+            try:
+                with np.load(caminho) as arquivo:
+                    if not arquivo["com_solucao"]:
+                        continue
+                    k, abertas = int(arquivo["k"]), arquivo["abertas"]
+                uso = os.path.getmtime(caminho)
+            except (OSError, ValueError, KeyError):
+                continue
+            atual = (abs(k - self.k), -uso)
+            if criterio is None or atual < criterio:
+                melhor, criterio = abertas, atual
+        return melhor
+
+    def guardar(self, resultados, abertas=None, atribuicao=None):
+        """
+        Guarda o resultado (sem o bloco de diagnóstico da execução) e aplica a limpeza.
+        Resultados sem solução (inviáveis, sem solução no tempo limite, erros) não são guardados;
+        os viáveis não ótimos ficam só no .npz, como solução inicial para proxima().
+        """
+        if not self.ativo or resultados.get("status") not in STATUS_COM_SOLUCAO:
+            return
+        otimo = resultados["status"] == "Optimal"
+        diretorio = self.opcoes["diretorio"]
+        temporario = f"{self.base}.{os.getpid()}.tmp"
+        guardado = {campo: valor for campo, valor in resultados.items() if campo not in ("diagnostico", "cache")}
+        # As alocações do formato binário ficam no próprio JSON da entrada (o .npz ao lado da
+        # saída é refeito por gravar_resultados num acerto)
+        if guardado.get("formato") == "binario":
+            guardado["formato"] = "compacto"
+            guardado["formato_original"] = "binario"
+        try:
+            with open(temporario + ".npz", 'wb') as arquivo:
+                np.savez(arquivo, k=self.k, com_solucao=True,
+                         abertas=np.asarray([] if abertas is None else abertas, dtype=np.int64),
+                         atribuicao=np.asarray([] if atribuicao is None else atribuicao, dtype=np.int64))
+            if otimo:
+                gravar_resultados(guardado, temporario + ".json")
+            os.replace(temporario + ".npz", self.base + ".npz")
+            if otimo:
+                os.replace(temporario + ".json", self.base + ".json")
+            elif os.path.exists(self.base + ".json"):
+                os.remove(self.base + ".json")
+        except OSError as e:
+            for sufixo in (".npz", ".json", ".json.tmp"):
+                if os.path.exists(temporario + sufixo):
+                    os.remove(temporario + sufixo)
+            logging.warning("Cache de resultados indisponível em %s (%s).", diretorio, e)
+            return
+        limpar_cache(diretorio, self.opcoes["limite_mb"], self.opcoes["idade_max_dias"], manter=self.base)
+
+
+def _remover(base):
+    for sufixo in (".json", ".npz"):
+        try:
+            os.remove(base + sufixo)
+        except FileNotFoundError:
+            pass
+
+
+def limpar_cache(diretorio=OPCOES_PADRAO["diretorio"], limite_mb=OPCOES_PADRAO["limite_mb"],
+                 idade_max_dias=OPCOES_PADRAO["idade_max_dias"], manter=None):
+    """
+    Remove as entradas mais velhas que idade_max_dias (pelo último uso) e, depois, as usadas
+    há mais tempo até o cache caber em limite_mb. `manter` é o caminho base de uma entrada que
+    nunca é removida (a que acabou de ser gravada).
+    """
+    agora = time.time()
+    entradas = []
+    for caminho in glob.glob(os.path.join(diretorio, "*.npz")):
+        base = caminho[:-len(".npz")]
+        if base.endswith(".tmp"):
+            continue
+        try:
+            uso = os.path.getmtime(caminho)
+            tamanho = sum(os.path.getsize(base + s) for s in (".json", ".npz") if os.path.exists(base + s))
+        except OSError:
+            continue
+        if base != manter and agora - uso > idade_max_dias * 86400:
+            _remover(base)
+            continue
+        entradas.append((uso, tamanho, base))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, base in sorted(entradas):
+        if total <= limite_mb * 1024 * 1024:
+            break
+        if base != manter:
+            _remover(base)
+            total -= tamanho
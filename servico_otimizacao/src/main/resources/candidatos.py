@@ -0,0 +1,170 @@
+import time
+
+import numpy as np
+
+from distancias import matriz_distancias, vizinhos_mais_proximos
+from modelo_matricial import montar_modelo, resolver_highs, decodificar, vetor_solucao
+
+OPCOES_PADRAO = {
+    "vizinhos": 8,          # facilities candidatas iniciais por localidade
+    "max_rodadas": 20,      # rodadas de expansão das listas
+}
+
+
+class ListasCandidatas:
+    """
+    Para cada localidade, as K_i facilities de F mais próximas e a distância da (K_i + 1)-ésima,
+    limite inferior para qualquer par que ficou fora da lista. Só essas distâncias são
+    calculadas; listas que já contêm todos os pares com d <= d_max são completas.
+    """
+
+    def __init__(self, inst, vizinhos):
+        self.inst = inst
+        self.metrica = inst["metrica_distancia"]
+        self.casas_decimais = None if self.metrica == "euclidiana" else 2
+        l, self.f = len(inst["L"]), len(inst["F"])
+        self.J = [None] * l
+        self.D = [None] * l
+        self.proxima = np.full(l, np.inf)  # distância do primeiro par omitido (inf: lista completa)
+        self.K = np.zeros(l, dtype=np.int64)
+
+        J, D = self._consultar(np.arange(l), vizinhos)
+        self.d_max = float(D[:, 0].max()) if D.size else 0
+        inst["d_max"] = self.d_max
+        self._guardar(np.arange(l), J, D, vizinhos)
+
+    def _consultar(self, linhas, k):
+        return vizinhos_mais_proximos(self.inst["L"][linhas], self.inst["F"], k + 1,
+                                      self.metrica, self.casas_decimais)
+
+    def _guardar(self, linhas, J, D, k):
+        for i, jl, dl in zip(linhas.tolist(), J, D):
+            viaveis = dl[:k] <= self.d_max
+            self.J[i], self.D[i] = jl[:k][viaveis], dl[:k][viaveis]
+            completa = len(dl) <= k or dl[k] > self.d_max
+            self.proxima[i] = np.inf if completa else dl[k]
+        self.K[linhas] = k
+
+    def expandir(self, linhas):
+        """
+        Dobra K nas linhas indicadas (as que usaram a folga).
+        """
+        novos = np.minimum(2 * self.K[linhas], self.f)
+        for k in np.unique(novos).tolist():
+            grupo = linhas[novos == k]
+            J, D = self._consultar(grupo, k)
+            self._guardar(grupo, J, D, k)
+
+    def pares(self):
+        """
+        Retorna (pares_i, pares_j, distancias) de todas as listas.
+        """
+        tamanhos = [len(j) for j in self.J]
+        pares_i = np.repeat(np.arange(len(self.J)), tamanhos)
+        return pares_i, np.concatenate(self.J), np.concatenate(self.D)
+
+    def folgas(self):
+        """
+        Linhas com lista incompleta e custo da folga (w_i vezes a distância do primeiro par
+        omitido, que nenhuma alocação fora da lista consegue superar).
+        """
+        linhas = np.flatnonzero(np.isfinite(self.proxima))
+        return linhas, self.inst["w"][linhas] * self.proxima[linhas]
+
+
+def atender_folgas(inst, listas, abertas, atribuicao, linhas, tolerancia=1e-9):
+    """
+    Teste da facility aberta mais próxima: uma localidade que usou a folga pode ir para uma
+    facility aberta fora da sua lista que custe o mesmo que a folga (empate de distâncias) e
+    ainda tenha capacidade, sem mudar o objetivo. Altera `atribuicao` e retorna as linhas
+    que continuam sem atendimento.
+    """
+    nf = len(inst["Ff"])
+    abertas_f = np.concatenate([np.arange(nf), nf + np.asarray(abertas, dtype=np.int64)])
+    cap_f = np.concatenate([np.full(nf, np.inf), inst["cap"]])
+    atendidas = atribuicao >= 0
+    residual = cap_f - np.bincount(atribuicao[atendidas], weights=inst["p"][atendidas], minlength=len(cap_f))
+
+    d = matriz_distancias(inst["L"][linhas], inst["F"][abertas_f], listas.metrica,
+                          casas_decimais=listas.casas_decimais)
+    pendentes = []
+    for i, distancias in zip(linhas.tolist(), d):
+        limite = listas.proxima[i] + tolerancia
+        for opcao in np.argsort(distancias, kind="stable").tolist():
+            j = abertas_f[opcao]
+            if distancias[opcao] > limite:
+                pendentes.append(i)
+                break
+            if residual[j] >= inst["p"][i]:
+                atribuicao[i] = j
+                residual[j] -= inst["p"][i]
+                break
+        else:
+            pendentes.append(i)
+    return np.array(pendentes, dtype=np.int64)
+
+
+def resolver_restrito(inst, opcoes=None, config_solver=None, listas=None, inicial=None):
+    """
+    Resolve o p-median do facility_v4 (tipo_problema 1) com O(l·K) variáveis de alocação.
+
+    Cada localidade recebe só suas K facilities mais próximas e uma folga com o custo do
+    primeiro par omitido, o que torna o modelo restrito uma relaxação do modelo completo.
+    Se a solução ótima não usa nenhuma folga (ou cada folga usada pode ser trocada por uma
+    facility aberta de mesmo custo), ela é viável e portanto ótima no modelo completo; caso
+    contrário as listas dessas localidades são dobradas e o modelo é resolvido de novo,
+    partindo da solução anterior.
+
+    `listas` permite reaproveitar (e continuar expandindo) listas de uma chamada anterior
+    sobre as mesmas localidades e facilities; `inicial` é uma solução (abertas, atribuicao)
+    usada como ponto de partida da primeira rodada.
+
+    Retorna (status, objetivo, abertas, atribuicao, info).
+    """
+    if inst["flag_problema"] != 1:
+        raise ValueError("O modo restrito suporta apenas tipo_problema 1 (minimizar distância ponderada).")
+    opcoes = {**OPCOES_PADRAO, **(opcoes or {})}
+    desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+    if desconhecidas:
+        raise ValueError(f"Parâmetros do modo restrito desconhecidos: {sorted(desconhecidas)}")
+    config_solver = config_solver or {}
+
+    inicio = time.time()
+    if listas is None:
+        listas = ListasCandidatas(inst, opcoes["vizinhos"])
+    rodadas = []
+    anterior = inicial
+
+    for rodada in range(1, opcoes["max_rodadas"] + 1):
+        pares_i, pares_j, distancias = listas.pares()
+        modelo = montar_modelo(inst, (pares_i, pares_j), inst["w"][pares_i] * distancias, listas.folgas())
+        inicial = vetor_solucao(modelo, *anterior) if anterior is not None else None
+
+        status, vetor, objetivo = resolver_highs(
+            modelo,
+            time_limit=config_solver.get("tempo_limite"),
+            mip_rel_gap=config_solver.get("gap"),
+            threads=config_solver.get("threads"),
+            inicial=inicial,
+        )
+        if vetor is None:
+            break
+        abertas, atribuicao = decodificar(modelo, vetor)
+        anterior = (abertas, atribuicao.copy())
+        usaram_folga = np.flatnonzero(atribuicao < 0)
+        pendentes = atender_folgas(inst, listas, abertas, atribuicao, usaram_folga)
+        rodadas.append({"pares": modelo["n_x"], "folgas": modelo["n_f"],
+                        "folgas_usadas": len(usaram_folga), "pendentes": len(pendentes), "objetivo": objetivo})
+        print(f"Rodada {rodada}: {modelo['n_x']} pares, {len(usaram_folga)} folgas usadas, "
+              f"{len(pendentes)} sem facility equivalente, objetivo {objetivo}")
+
+        if len(pendentes) == 0:
+            # Sem folga a solução é viável no modelo completo; o status do restrito vale para ele
+            info = {"rodadas": rodadas, "tempo": time.time() - inicio}
+            return status, objetivo, abertas, atribuicao, info
+        if status != "Optimal":
+            break  # sem otimalidade no restrito, a folga não prova nada sobre o modelo completo
+        listas.expandir(pendentes)
+
+    info = {"rodadas": rodadas, "tempo": time.time() - inicio}
+    return (status if vetor is None else "Not Solved"), None, None, None, info
@@ -0,0 +1,219 @@
+"""
+Lote de cenários do facility_v4: uma instância base e uma lista de alterações, resolvidas no
+mesmo processo reaproveitando a leitura, as distâncias e a matriz de restrições.
+
+Entrada:
+    {
+        "base": {... entrada do facility_v4 ...},
+        "cenarios": [
+            {"id": "k60", "num_centros_desejado": 60},
+            {"id": "custo", "tipo_problema": 2},
+            {"id": "pesos_b", "pesos": [0.4, 0.2, 0.2, 0.1, 0.1], "proporcao_inversa": [0, 0, 0, 0, 1]}
+        ],
+        "workers": 2
+    }
+
+Cada cenário é gravado em {saida sem extensão}_{id}.json com o esquema de saída do
+facility_v4; `saida` recebe o índice com status, objetivo, tempo e arquivo de cada cenário.
+
+Uso:
+    python cenarios.py lote.json saida.json
+"""
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from instancia import preparar_instancia, calcular_distancias, calcular_pesos, validar_pesos, validar_num_centros
+from modelo_matricial import montar_modelo, resolver_highs, decodificar, vetor_solucao
+from heuristicas import heuristica_inicial
+from solucao import montar_resultados, STATUS_COM_SOLUCAO
+from escrita import gravar_resultados
+from solvers import configuracao_solver
+
+CHAVES_CENARIO = {"id", "pesos", "proporcao_inversa", "num_centros_desejado", "tipo_problema"}
+
+# Instância, modelos e configuração preparados no processo principal e herdados pelos workers (fork)
+_PREPARADO = None
+
+
+def aplicar_cenario(inst, cenario):
+    """
+    Retorna uma cópia rasa de `inst` com as alterações do cenário (k, tipo de problema, pesos).
+    Os arrays grandes (coordenadas, distâncias) são compartilhados com a base.
+    """
+    desconhecidas = set(cenario) - CHAVES_CENARIO
+    if desconhecidas:
+        raise ValueError(f"Campos de cenário não suportados: {sorted(desconhecidas)}")
+
+    variante = dict(inst)
+    flag_problema = cenario.get("tipo_problema", inst["flag_problema"])
+    if flag_problema not in [1, 2]:
+        raise ValueError("Flag invalida. Deve ser 1 ou 2.")
+    variante["flag_problema"] = flag_problema
+
+    variante["k"] = cenario.get("num_centros_desejado", inst["k"])
+    validar_num_centros(variante["k"], len(inst["Ff"]), len(inst["Fn"]))
+
+    if "pesos" in cenario or "proporcao_inversa" in cenario:
+        lambdas = cenario.get("pesos", inst["lambdas"])
+        flag_proporcao_inversa = cenario.get("proporcao_inversa", inst["proporcao_inversa"])
+        validar_pesos(lambdas, flag_proporcao_inversa, inst["M"].shape[1])
+        variante["w"] = calcular_pesos(inst["M"], lambdas, flag_proporcao_inversa)
+        variante["lambdas"] = lambdas
+        variante["proporcao_inversa"] = flag_proporcao_inversa
+    return variante
+
+
+def _ajustar_modelo(modelo, distancias_pares, variante):
+    """
+    Troca no modelo já montado só o que o cenário altera: custos das alocações (pesos) e o
+    lado direito da restrição de cardinalidade.
+    """
+    if variante["flag_problema"] == 1:
+        modelo["c"][:modelo["n_x"]] = variante["w"][modelo["pares_i"]] * distancias_pares
+    novas = variante["k"] - len(variante["Ff"])
+    modelo["lb"][modelo["linha_cardinalidade"]] = novas
+    modelo["ub"][modelo["linha_cardinalidade"]] = novas
+
+
+def _viavel(modelo, vetor, tolerancia=1e-6):
+    """
+    Verifica se o vetor (x, y) satisfaz as restrições do modelo, para usá-lo como solução inicial.
+    """
+    linhas = modelo["A"] @ vetor
+    return bool(((linhas >= modelo["lb"] - tolerancia) & (linhas <= modelo["ub"] + tolerancia)).all())
+
+
+def resolver_cenario(cenario, anterior=None):
+    """
+    Resolve um cenário com o modelo do seu tipo de problema, partindo da solução `anterior`
+    (abertas, atribuicao) quando ela é viável; no tipo_problema 1, sem solução anterior viável,
+    parte da heurística gulosa + trocas. Retorna (resultados, solução para o próximo cenário).
+    """
+    inst, modelos, distancias_pares, config = (_PREPARADO[c] for c in ("inst", "modelos", "distancias_pares", "config"))
+    inicio = time.time()
+    variante = aplicar_cenario(inst, cenario)
+    modelo = modelos[variante["flag_problema"]]
+    _ajustar_modelo(modelo, distancias_pares[variante["flag_problema"]], variante)
+
+    inicial = None
+    if anterior is not None:
+        inicial = vetor_solucao(modelo, *anterior)
+        if not _viavel(modelo, inicial):
+            inicial = None
+    if inicial is None and variante["flag_problema"] == 1:
+        heuristica = heuristica_inicial(variante)
+        if heuristica["objetivo"] is not None:
+            inicial = vetor_solucao(modelo, heuristica["abertas"], heuristica["atribuicao"])
+
+    status, vetor, objetivo = resolver_highs(
+        modelo,
+        time_limit=config["tempo_limite"],
+        mip_rel_gap=config["gap"],
+        threads=config["threads"],
+        inicial=inicial,
+    )
+    if status not in STATUS_COM_SOLUCAO:
+        return {"status": status}, anterior
+    abertas, atribuicao = decodificar(modelo, vetor)
+    resultados = montar_resultados(variante, status, objetivo, time.time() - inicio, abertas, atribuicao)
+    resultados["solucao_inicial"] = inicial is not None
+    return resultados, (abertas, atribuicao)
+
+
+def _arquivo_cenario(saida, identificador):
+    raiz, extensao = os.path.splitext(saida)
+    return f"{raiz}_{identificador}{extensao or '.json'}"
+
+
+def _resolver_sequencia(tarefas):
+    """
+    Resolve uma sequência de (cenário, arquivo) encadeando as soluções iniciais e grava cada
+    resultado. Retorna as linhas do índice.
+    """
+    indice, anterior = [], None
+    for cenario, arquivo in tarefas:
+        inicio = time.time()
+        try:
+            resultados, anterior = resolver_cenario(cenario, anterior)
+        except Exception as e:
+            resultados = {"status": "Erro", "mensagem": str(e)}
+        gravar_resultados(resultados, arquivo)
+
+        problema = resultados.get("tipo_problema")
+        indice.append({
+            "id": cenario["id"],
+            "saida": arquivo,
+            "status": resultados["status"],
+            "objetivo": resultados.get(problema),
+            "tempo": time.time() - inicio,
+        })
+        print(f"Cenário {cenario['id']}: {resultados['status']} {resultados.get(problema)}")
+    return indice
+
+
+def executar_lote(lote, saida):
+    """
+    Resolve todos os cenários do lote e grava o índice em `saida`. Os cenários são divididos
+    em blocos contíguos, um por worker, para que cada bloco reaproveite a solução anterior.
+    """
+    global _PREPARADO
+    if "base" not in lote or not isinstance(lote.get("cenarios"), list):
+        raise ValueError("Lote deve conter 'base' e a lista 'cenarios'.")
+    base = lote["base"]
+    cenarios = [dict(c, id=str(c.get("id", n))) for n, c in enumerate(lote["cenarios"])]
+    if len({c["id"] for c in cenarios}) != len(cenarios):
+        raise ValueError("Identificadores de cenário repetidos.")
+    workers = max(1, min(int(lote.get("workers", 1)), len(cenarios) or 1))
+
+    inicio = time.time()
+    inst = preparar_instancia(base)
+    d = calcular_distancias(inst)
+
+    # Uma matriz de restrições por tipo de problema usado no lote, montada uma única vez
+    tipos = {c.get("tipo_problema", inst["flag_problema"]) for c in cenarios} & {1, 2}
+    modelos, distancias_pares = {}, {}
+    for tipo in tipos:
+        modelo = montar_modelo(dict(inst, flag_problema=tipo))
+        modelos[tipo] = modelo
+        distancias_pares[tipo] = d[modelo["pares_i"], modelo["pares_j"]]
+    print(f"Lote: {len(cenarios)} cenários, {workers} workers, preparação em {time.time() - inicio:.2f} s")
+
+    _PREPARADO = {
+        "inst": inst,
+        "modelos": modelos,
+        "distancias_pares": distancias_pares,
+        "config": configuracao_solver(base, tempo_limite_padrao=1000),
+    }
+    tarefas = [(c, _arquivo_cenario(saida, c["id"])) for c in cenarios]
+    try:
+        if workers == 1:
+            indice = _resolver_sequencia(tarefas)
+        else:
+            blocos = [b.tolist() for b in np.array_split(np.arange(len(tarefas)), workers)]
+            contexto = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as pool:
+                partes = pool.map(_resolver_sequencia, [[tarefas[t] for t in bloco] for bloco in blocos])
+                indice = [linha for parte in partes for linha in parte]
+    finally:
+        _PREPARADO = None
+
+    resultados = {"status": "Concluido", "tempo_execucao": time.time() - inicio, "cenarios": indice}
+    with open(saida, 'w', encoding='utf-8') as saidas:
+        json.dump(resultados, saidas, indent=4)
+    return resultados
+
+
+def main():
+    with open(sys.argv[1], encoding='utf-8') as entradas:
+        lote = json.load(entradas)
+    executar_lote(lote, sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
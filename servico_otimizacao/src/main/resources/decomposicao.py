@@ -0,0 +1,272 @@
+"""
+Modo "decomposicao" do facility_v4 para instâncias grandes do p-median (tipo_problema 1):
+divide localidades e facilities em regiões, resolve as regiões em paralelo e repara as
+fronteiras entre elas. A solução é viável, sem garantia de otimalidade.
+
+Entrada: "modo": "decomposicao", "decomposicao": {"particao": "kmeans", "regioes": 8,
+"workers": 8, "modo": "restrito", "vizinhos": 32, "tempo_reparo": 60}, todos opcionais:
+- particao: "kmeans" (pelas coordenadas, ponderado por w) ou "municipio" (7 primeiros dígitos
+  do código da localidade).
+- regioes: número de regiões do kmeans (padrão: workers).
+- workers: processos que resolvem as regiões (padrão: os.cpu_count()).
+- modo: modelo de cada região, "restrito" (candidatos) ou "exato" (modelo matricial completo);
+  restrito traz as opções do modo restrito.
+- vizinhos e tempo_reparo: facilities candidatas por localidade e segundos de trocas no reparo
+  das fronteiras.
+- semente: semente das trocas do reparo.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from agregacao import projetar_plano, agrupar_kmeans
+from candidatos import resolver_restrito
+from distancias import distancias_pares
+from heuristicas import heuristica_inicial
+from instancia import calcular_distancias
+from modelo_matricial import montar_modelo, resolver_highs, decodificar, vetor_solucao
+from solucao import STATUS_COM_SOLUCAO
+from vns import listas_candidatas, EstadoVNS, atribuir_listas
+
+OPCOES_PADRAO = {
+    "particao": "kmeans",   # "kmeans" (coordenadas) ou "municipio" (7 primeiros dígitos do código)
+    "regioes": None,        # número de regiões do kmeans (padrão: workers)
+    "workers": None,        # processos (padrão: os.cpu_count())
+    "modo": "restrito",     # modelo de cada região: "restrito" ou "exato"
+    "restrito": None,       # opções do modo restrito nas regiões
+    "vizinhos": 32,         # candidatas por localidade no reparo das fronteiras
+    "tempo_reparo": 60,     # segundos de trocas no reparo das fronteiras
+    "semente": 0,
+}
+
+# Instância e regiões compartilhadas com os processos do pool (via fork)
+_DECOMPOSICAO = None
+
+
+def particionar(inst, opcoes, regioes):
+    """
+    Região de cada localidade e de cada facility de F. As facilities ficam na região da
+    localidade mais próxima; localidades de regiões sem nenhuma facility passam para a região
+    da facility mais próxima.
+    """
+    from scipy.spatial import cKDTree
+
+    L, F = inst["L"], inst["F"]
+    X, escala = projetar_plano(L, inst["metrica_distancia"])
+    Y = np.column_stack([F[:, 0], F[:, 1] * escala])
+
+    if opcoes["particao"] == "municipio":
+        municipios = [str(codigo)[:7] for codigo in inst["codigos"]]
+        regiao_l = np.unique(municipios, return_inverse=True)[1].reshape(-1)
+    else:
+        regiao_l = agrupar_kmeans(X, regioes, inst["w"], 10)
+
+    _, mais_proxima = cKDTree(X).query(Y)
+    regiao_f = regiao_l[mais_proxima]
+
+    sem_facility = ~np.isin(regiao_l, regiao_f)
+    if sem_facility.any():
+        _, facility = cKDTree(Y).query(X[sem_facility])
+        regiao_l[sem_facility] = regiao_f[facility]
+    rotulos, regiao_l = np.unique(regiao_l, return_inverse=True)
+    regiao_f = np.searchsorted(rotulos, regiao_f)
+    return regiao_l.reshape(-1), regiao_f
+
+
+def dividir_orcamento(inst, regiao_l, regiao_f):
+    """
+    Número de facilities novas de cada região, proporcional à demanda ponderada (soma de w),
+    com arredondamento pelos maiores restos e limitado às candidatas da região. Regiões sem
+    facility fixa recebem ao menos uma nova, quando o orçamento permite.
+    """
+    nf = len(inst["Ff"])
+    n = regiao_l.max() + 1
+    novas = inst["k"] - nf
+    demanda = np.bincount(regiao_l, weights=inst["w"], minlength=n)
+    candidatas = np.bincount(regiao_f[nf:], minlength=n)
+    fixas = np.bincount(regiao_f[:nf], minlength=n)
+
+    cota = novas * demanda / demanda.sum() if demanda.sum() > 0 else np.full(n, novas / n)
+    orcamento = np.zeros(n, dtype=np.int64)
+    minimo = (fixas == 0) & (candidatas > 0)
+    if minimo.sum() <= novas:
+        orcamento[minimo] = 1
+
+    # Distribui o restante, uma facility por vez, para a região mais abaixo da sua cota
+    for _ in range(novas - orcamento.sum()):
+        falta = np.where(orcamento < candidatas, cota - orcamento, -np.inf)
+        orcamento[int(np.argmax(falta))] += 1
+    return orcamento
+
+
+def _subinstancia(inst, linhas, colunas, novas):
+    """
+    Instância do facility_v4 restrita às localidades `linhas` e às facilities `colunas` (em F).
+    """
+    nf = len(inst["Ff"])
+    fixas, candidatas = colunas[colunas < nf], colunas[colunas >= nf] - nf
+    sub = dict(inst)
+    sub.update({
+        "L": inst["L"][linhas], "w": inst["w"][linhas], "p": inst["p"][linhas],
+        "codigos": [inst["codigos"][i] for i in linhas.tolist()],
+        "Ff": inst["Ff"][fixas], "Fn": inst["Fn"][candidatas],
+        "F": np.concatenate([inst["Ff"][fixas], inst["Fn"][candidatas]]).reshape(-1, 2),
+        "c": inst["c"][candidatas], "cap": inst["cap"][candidatas],
+        "codigo_cnes": [inst["codigo_cnes"][j] for j in fixas.tolist()],
+        "k": len(fixas) + novas,
+    })
+    sub.pop("M", None)
+    sub.pop("d", None)
+    return sub, np.concatenate([fixas, nf + candidatas])
+
+
+def _resolver_regiao(r):
+    """
+    Resolve a região r num processo do pool. Retorna (r, status, objetivo, abertas e
+    atribuicao em índices de F da instância completa, tempo).
+    """
+    inicio = time.time()
+    inst, regiao_l, regiao_f, orcamento, opcoes, config = _DECOMPOSICAO
+    linhas = np.flatnonzero(regiao_l == r)
+    sub, mapa = _subinstancia(inst, linhas, np.flatnonzero(regiao_f == r), int(orcamento[r]))
+    nf_sub = len(sub["Ff"])
+
+    if opcoes["modo"] == "restrito":
+        status, objetivo, abertas, atribuicao, _ = resolver_restrito(sub, opcoes["restrito"], config)
+    else:
+        calcular_distancias(sub)
+        modelo = montar_modelo(sub)
+        heuristica = heuristica_inicial(sub)
+        inicial = None
+        if heuristica["objetivo"] is not None:
+            inicial = vetor_solucao(modelo, heuristica["abertas"], heuristica["atribuicao"])
+        status, vetor, objetivo = resolver_highs(modelo, time_limit=config.get("tempo_limite"),
+                                                 mip_rel_gap=config.get("gap"), threads=config.get("threads"),
+                                                 inicial=inicial)
+        abertas, atribuicao = decodificar(modelo, vetor) if status in STATUS_COM_SOLUCAO else (None, None)
+
+    if status not in STATUS_COM_SOLUCAO:
+        return r, status, None, None, None, time.time() - inicio
+    atribuicao = np.where(atribuicao >= 0, mapa[np.maximum(atribuicao, 0)], -1)
+    return r, status, objetivo, mapa[nf_sub + np.asarray(abertas, dtype=np.int64)], atribuicao, time.time() - inicio
+
+
+def reparar_fronteiras(inst, regiao_l, abertas_f, opcoes):
+    """
+    Reparo das fronteiras entre regiões: trocas (abre uma facility fechada, fecha uma nova
+    aberta de qualquer região) testadas nas facilities cujas localidades candidatas
+    pertencem a mais de uma região, e reatribuição de todas as localidades à aberta mais
+    próxima com capacidade. Retorna (abertas_f, atribuicao, trocas); a atribuição tem -1 nas
+    localidades que não couberam em nenhuma aberta da sua lista.
+    """
+    listas = listas_candidatas(inst, opcoes["vizinhos"])
+    nf, f = listas["nf"], listas["f"]
+    colunas = np.repeat(np.arange(f), np.diff(listas["inv_inicio"]))
+    regioes = regiao_l[listas["inv_linhas"]]
+    minima = np.full(f, np.iinfo(np.int64).max)
+    maxima = np.full(f, -1)
+    np.minimum.at(minima, colunas, regioes)
+    np.maximum.at(maxima, colunas, regioes)
+    fronteira = np.flatnonzero(maxima > minima)
+    fronteira = fronteira[fronteira >= nf]
+
+    estado = EstadoVNS(listas, abertas_f)
+    rng = np.random.default_rng(opcoes["semente"])
+    inicio, trocas, melhorou = time.time(), 0, True
+    while melhorou and time.time() - inicio < opcoes["tempo_reparo"]:
+        melhorou = False
+        for entra in rng.permutation(fronteira):
+            if estado.aberta[entra]:
+                continue
+            delta, sai = estado.melhor_saida(entra)
+            if delta < -1e-9:
+                estado.trocar(entra, sai)
+                trocas, melhorou = trocas + 1, True
+
+    cap_f = np.concatenate([np.full(nf, np.inf), inst["cap"]])
+    return estado.abertas, atribuir_listas(listas, estado.abertas, inst["p"], cap_f), trocas
+
+
+def resolver_decomposicao(inst, opcoes=None, config_solver=None):
+    """
+    Resolve o p-median do facility_v4 (tipo_problema 1) por decomposição espacial: divide
+    localidades e facilities em regiões, reparte as facilities novas pela demanda ponderada,
+    resolve as regiões em paralelo e repara as fronteiras (trocas entre regiões e
+    reatribuição). A solução é viável, sem garantia de otimalidade.
+
+    Retorna (status, objetivo, abertas, atribuicao, info).
+    """
+    global _DECOMPOSICAO
+    if inst["flag_problema"] != 1:
+        raise ValueError("O modo decomposicao suporta apenas tipo_problema 1 (minimizar distância ponderada).")
+    opcoes = {**OPCOES_PADRAO, **(opcoes or {})}
+    desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+    if desconhecidas:
+        raise ValueError(f"Parâmetros de decomposicao desconhecidos: {sorted(desconhecidas)}")
+    if opcoes["particao"] not in ["kmeans", "municipio"]:
+        raise ValueError("Partição inválida. Deve ser 'kmeans' ou 'municipio'.")
+    if opcoes["modo"] not in ["restrito", "exato"]:
+        raise ValueError("Modo das regiões inválido. Deve ser 'restrito' ou 'exato'.")
+    config_solver = config_solver or {}
+    workers = opcoes["workers"] or os.cpu_count() or 1
+
+    inicio = time.time()
+    regiao_l, regiao_f = particionar(inst, opcoes, opcoes["regioes"] or workers)
+    orcamento = dividir_orcamento(inst, regiao_l, regiao_f)
+    n = len(orcamento)
+    print(f"Decomposição: {n} regiões, orçamento {orcamento.tolist()}")
+
+    _DECOMPOSICAO = (inst, regiao_l, regiao_f, orcamento, opcoes, config_solver)
+    try:
+        if workers == 1 or n == 1:
+            partes = [_resolver_regiao(r) for r in range(n)]
+        else:
+            contexto = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=min(workers, n), mp_context=contexto) as pool:
+                partes = list(pool.map(_resolver_regiao, range(n)))
+    finally:
+        _DECOMPOSICAO = None
+
+    nf = len(inst["Ff"])
+    abertas_f = [np.arange(nf)]
+    atribuicao = np.full(len(inst["L"]), -1, dtype=np.int64)
+    regioes = []
+    for r, status, objetivo, abertas, atribuicao_r, tempo in partes:
+        regioes.append({"regiao": r, "localidades": int((regiao_l == r).sum()), "novas": int(orcamento[r]),
+                        "status": status, "objetivo": objetivo, "tempo": tempo})
+        if status in STATUS_COM_SOLUCAO:
+            abertas_f.append(abertas)
+            atribuicao[regiao_l == r] = atribuicao_r
+    abertas_f = np.concatenate(abertas_f).astype(np.int64)
+
+    # Regiões sem solução deixam facilities do orçamento sem abrir: completa com as primeiras candidatas
+    faltam = inst["k"] - len(abertas_f)
+    if faltam > 0:
+        fechadas = np.setdiff1d(np.arange(nf, len(inst["F"])), abertas_f)
+        abertas_f = np.concatenate([abertas_f, fechadas[:faltam]])
+
+    metrica = inst["metrica_distancia"]
+    casas_decimais = None if metrica == "euclidiana" else 2
+
+    def objetivo_de(atrib):
+        if (atrib < 0).any():
+            return None
+        return float(np.dot(inst["w"], distancias_pares(inst["L"], inst["F"][atrib], metrica, casas_decimais)))
+
+    antes = objetivo_de(atribuicao)
+    inicio_reparo = time.time()
+    reparadas, reatribuida, trocas = reparar_fronteiras(inst, regiao_l, abertas_f, opcoes)
+    objetivo = objetivo_de(reatribuida)
+    if objetivo is not None and (antes is None or objetivo < antes):
+        abertas_f, atribuicao = reparadas, reatribuida
+    else:
+        objetivo = antes  # a reatribuição com capacidades não melhorou a junção das regiões
+
+    info = {"regioes": regioes, "objetivo_antes_reparo": antes, "trocas_reparo": trocas,
+            "tempo_reparo": time.time() - inicio_reparo, "tempo": time.time() - inicio}
+    if objetivo is None:
+        return "Not Solved", None, None, None, info
+    return "Feasible", objetivo, abertas_f[abertas_f >= nf] - nf, atribuicao, info
@@ -0,0 +1,130 @@
+"""
+Instrumentação dos otimizadores: tempo de parede e de CPU por fase, picos de memória e
+tamanho do modelo, devolvidos no bloco "diagnostico" do resultado.
+
+Entrada (opcional): "diagnostico": {"tracemalloc": true, "log": "diagnostico.jsonl"}.
+- tracemalloc: registra também o pico de memória alocada pelo Python em cada fase (a execução
+  fica mais lenta enquanto o tracemalloc está ativo).
+- log: cada fase encerrada e o resumo final são anexados ao arquivo, uma linha JSON por evento.
+"""
+import json
+import os
+import resource
+import time
+import tracemalloc
+
+OPCOES_PADRAO = {
+    "tracemalloc": False,  # pico de memória do Python por fase
+    "log": None,           # arquivo de log estruturado (JSON por linha)
+}
+
+MB = 1024 * 1024
+
+
+def rss_pico_mb():
+    """
+    Pico do RSS do processo até agora, em MB (ru_maxrss é dado em KB no Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Diagnostico:
+    """
+    Cronômetro por fases: fase(nome) encerra a fase corrente e inicia a seguinte, de modo que
+    o script só marca as fronteiras. Fases repetidas (ex.: "agregacao" antes e depois da
+    resolução) se acumulam.
+    """
+
+    def __init__(self, opcoes=None):
+        self.opcoes = dict(OPCOES_PADRAO)
+        self.fases = {}
+        self.modelo = {}
+        self._inicio = time.perf_counter()
+        self._inicio_cpu = time.process_time()
+        self._atual = None
+        self._iniciou_tracemalloc = False
+        self.configurar(opcoes)
+
+    def configurar(self, opcoes):
+        """
+        Aplica as opções do campo "diagnostico" da entrada (lida depois de criado o cronômetro).
+        """
+        if opcoes is None or isinstance(opcoes, bool):
+            return
+        desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+        if desconhecidas:
+            raise ValueError(f"Parâmetros de diagnóstico desconhecidos: {sorted(desconhecidas)}")
+        self.opcoes.update(opcoes)
+        if self.opcoes["tracemalloc"] and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._iniciou_tracemalloc = True
+
+    def fase(self, nome):
+        """
+        Encerra a fase corrente (se houver) e inicia `nome`.
+        """
+        self._encerrar_fase()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._atual = (nome, time.perf_counter(), time.process_time())
+
+    def _encerrar_fase(self):
+        if self._atual is None:
+            return
+        nome, inicio, inicio_cpu = self._atual
+        self._atual = None
+        medida = {"tempo": time.perf_counter() - inicio, "cpu": time.process_time() - inicio_cpu,
+                  "rss_pico_mb": rss_pico_mb()}
+        if tracemalloc.is_tracing():
+            medida["tracemalloc_pico_mb"] = tracemalloc.get_traced_memory()[1] / MB
+
+        acumulada = self.fases.setdefault(nome, {"tempo": 0.0, "cpu": 0.0})
+        acumulada["tempo"] += medida["tempo"]
+        acumulada["cpu"] += medida["cpu"]
+        acumulada["rss_pico_mb"] = medida["rss_pico_mb"]
+        if "tracemalloc_pico_mb" in medida:
+            acumulada["tracemalloc_pico_mb"] = max(acumulada.get("tracemalloc_pico_mb", 0.0),
+                                                   medida["tracemalloc_pico_mb"])
+        self._registrar({"evento": "fase", "fase": nome, **medida})
+
+    def registrar_modelo(self, variaveis=None, restricoes=None, nao_nulos=None, pares=None, pares_total=None):
+        """
+        Tamanho do modelo; `pares` variáveis de alocação criadas de `pares_total` possíveis
+        (l x f) dão a razão de poda.
+        """
+        self.modelo = {"variaveis": variaveis, "restricoes": restricoes, "nao_nulos": nao_nulos}
+        if pares is not None and pares_total:
+            self.modelo.update({"pares": pares, "pares_total": pares_total,
+                                "poda": 1 - pares / pares_total})
+
+    def resumo(self):
+        """
+        Bloco "diagnostico" com as fases já encerradas (a fase corrente fica de fora).
+        """
+        resumo = {
+            "fases": {nome: dict(medida) for nome, medida in self.fases.items()},
+            "tempo_total": time.perf_counter() - self._inicio,
+            "cpu_total": time.process_time() - self._inicio_cpu,
+            "rss_pico_mb": rss_pico_mb(),
+            "modelo": dict(self.modelo),
+        }
+        if tracemalloc.is_tracing():
+            resumo["tracemalloc_pico_mb"] = max(
+                (medida.get("tracemalloc_pico_mb", 0.0) for medida in self.fases.values()), default=0.0)
+        return resumo
+
+    def encerrar(self):
+        """
+        Encerra a fase corrente, grava o resumo no log e desliga o tracemalloc iniciado aqui.
+        """
+        self._encerrar_fase()
+        self._registrar({"evento": "resumo", **self.resumo()})
+        if self._iniciou_tracemalloc:
+            tracemalloc.stop()
+            self._iniciou_tracemalloc = False
+
+    def _registrar(self, evento):
+        if not self.opcoes["log"]:
+            return
+        with open(self.opcoes["log"], 'a', encoding='utf-8') as log:
+            log.write(json.dumps({"instante": time.time(), "pid": os.getpid(), **evento}) + "\n")
@@ -0,0 +1,146 @@
+import numpy as np
+
+# Raio efetivo (km) implícito em getDistanceBetweenPointsNew: 60 milhas náuticas por grau,
+# 1.1515 milhas terrestres por milha náutica e 1.609344 km por milha terrestre.
+RAIO_TERRA_KM = 60 * 1.1515 * 1.609344 * 180 / np.pi
+
+METRICAS = ("cosseno", "haversine", "euclidiana")
+
+
+def deg2rad(degrees):
+    """
+    Converte graus para radianos (mesma sequência de operações da versão escalar).
+    """
+    return degrees * np.pi / 180
+
+
+def _cosseno(lat1, lon1, lat2, lon2):
+    """
+    Lei esférica dos cossenos, idêntica a getDistanceBetweenPointsNew do facility_v4.
+    """
+    lat1, lat2 = deg2rad(lat1), deg2rad(lat2)
+    theta = lon1 - lon2
+    cosine_similarity = (np.sin(lat1) * np.sin(lat2)) + \
+                        (np.cos(lat1) * np.cos(lat2) * np.cos(deg2rad(theta)))
+    np.clip(cosine_similarity, -1, 1, out=cosine_similarity)
+    distance = 60 * 1.1515 * (np.arccos(cosine_similarity) * 180 / np.pi)
+    return distance * 1.609344
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """
+    Fórmula de Haversine, numericamente estável para pontos muito próximos.
+    """
+    lat1, lat2 = deg2rad(lat1), deg2rad(lat2)
+    dlat = lat2 - lat1
+    dlon = deg2rad(lon2 - lon1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    np.clip(a, 0, 1, out=a)
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(a))
+
+
+def _euclidiana(x1, y1, x2, y2):
+    """
+    Distância euclidiana no plano, com o fator 1000 de distancia_euclidiana (v2–v4).
+    """
+    return np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) * 1000
+
+
+_FORMULAS = {
+    "cosseno": _cosseno,
+    "haversine": _haversine,
+    "euclidiana": _euclidiana,
+}
+
+
+def linhas_por_bloco(f, memoria_max_mb, temporarios=6):
+    """
+    Quantidade de linhas por bloco para que os temporários float64 caibam em memoria_max_mb.
+    """
+    bytes_linha = max(f, 1) * 8 * temporarios
+    return max(1, int(memoria_max_mb * 1024 * 1024 // bytes_linha))
+
+
+def matriz_distancias(L, F, metrica="cosseno", dtype=np.float64, casas_decimais=2,
+                      memoria_max_mb=256, out=None):
+    """
+    Calcula a matriz de distâncias (l x f) entre localidades L e facilities F.
+
+    L e F são sequências/arrays de pares (lat, lon) — ou (x, y) para a métrica euclidiana.
+    O cálculo é feito em blocos de linhas, de modo que os temporários nunca passem de
+    memoria_max_mb; o resultado é gravado em `out` (por exemplo um np.memmap) quando informado.
+    Com casas_decimais=2 os valores coincidem com getDistanceBetweenPointsNew.
+    """
+    if metrica not in _FORMULAS:
+        raise ValueError(f"Métrica de distância inválida: {metrica}. Use uma de {METRICAS}.")
+
+    L = np.asarray(L, dtype=np.float64).reshape(-1, 2)
+    F = np.asarray(F, dtype=np.float64).reshape(-1, 2)
+    l, f = len(L), len(F)
+
+    if out is None:
+        out = np.empty((l, f), dtype=dtype)
+    elif out.shape != (l, f):
+        raise ValueError(f"Matriz de saída com formato {out.shape}, esperado {(l, f)}.")
+
+    if l == 0 or f == 0:
+        return out
+
+    calcular = _FORMULAS[metrica]
+    passo = linhas_por_bloco(f, memoria_max_mb)
+    for inicio in range(0, l, passo):
+        fim = min(inicio + passo, l)
+        Lb = L[inicio:fim]
+        bloco = calcular(Lb[:, 0][:, None], Lb[:, 1][:, None], F[:, 0][None, :], F[:, 1][None, :])
+        if casas_decimais is not None:
+            bloco = np.round(bloco, casas_decimais)
+        out[inicio:fim] = bloco
+
+    return out
+
+
+def distancias_pares(A, B, metrica="cosseno", casas_decimais=2):
+    """
+    Distância entre pares de pontos: A e B são arrays (..., 2) com formatos compatíveis por
+    broadcasting (por exemplo L[:, None, :] e F[indices]). Mesmos valores de matriz_distancias.
+    """
+    if metrica not in _FORMULAS:
+        raise ValueError(f"Métrica de distância inválida: {metrica}. Use uma de {METRICAS}.")
+    A = np.asarray(A, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    d = _FORMULAS[metrica](A[..., 0], A[..., 1], B[..., 0], B[..., 1])
+    return np.round(d, casas_decimais) if casas_decimais is not None else d
+
+
+def _coordenadas_busca(P, metrica):
+    """
+    Coordenadas para a árvore k-d: pontos na esfera unitária (a corda cresce com a distância
+    sobre a esfera) ou o próprio plano na métrica euclidiana.
+    """
+    if metrica == "euclidiana":
+        return P
+    lat, lon = deg2rad(P[:, 0]), deg2rad(P[:, 1])
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def vizinhos_mais_proximos(L, F, k, metrica="cosseno", casas_decimais=2):
+    """
+    Para cada localidade, as k facilities de F mais próximas, sem montar a matriz l x f.
+
+    Retorna (indices, distancias), ambos l x min(k, f) e em ordem crescente de distância.
+    """
+    from scipy.spatial import cKDTree
+
+    if metrica not in _FORMULAS:
+        raise ValueError(f"Métrica de distância inválida: {metrica}. Use uma de {METRICAS}.")
+    L = np.asarray(L, dtype=np.float64).reshape(-1, 2)
+    F = np.asarray(F, dtype=np.float64).reshape(-1, 2)
+    k = min(k, len(F))
+
+    arvore = cKDTree(_coordenadas_busca(F, metrica))
+    _, indices = arvore.query(_coordenadas_busca(L, metrica), k=k)
+    indices = np.asarray(indices, dtype=np.int64).reshape(len(L), k)
+
+    distancias = distancias_pares(L[:, None, :], F[indices], metrica, casas_decimais)
+    ordem = np.argsort(distancias, axis=1, kind="stable")
+    return np.take_along_axis(indices, ordem, axis=1), np.take_along_axis(distancias, ordem, axis=1)
@@ -0,0 +1,94 @@
+"""
+Gravação do resultado do facility_v4.
+
+- "verboso" (padrão): o esquema original, json.dump com indent=4.
+- "compacto": alocações como arrays paralelos (código da localidade e índice na tabela de
+  centros, cada centro listado uma única vez), gravados sem indentação e por blocos, sem
+  montar a string inteira em memória. Usa o orjson quando instalado.
+- "binario": como o compacto, mas as alocações vão para o arquivo {saida}.alocacoes.npz
+  (arrays "localidade" e "centro") e o JSON só referencia esse arquivo.
+
+Os arquivos são escritos num temporário e publicados com os.replace, então leitores
+nunca veem um resultado pela metade.
+"""
+import json
+import os
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # dependência opcional: sem ela usa o json da biblioteca padrão
+    orjson = None
+
+FORMATOS = ["verboso", "compacto", "binario"]
+TAMANHO_BLOCO = 65536  # elementos por bloco na escrita das listas grandes
+
+
+def _codificar(valor):
+    if orjson is not None:
+        return orjson.dumps(valor, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(valor, separators=(",", ":"), ensure_ascii=False)
+
+
+def _escrever(arquivo, valor):
+    """
+    Escreve `valor` em JSON compacto; dicionários são percorridos chave a chave e listas ou
+    arrays grandes são codificados em blocos de TAMANHO_BLOCO elementos.
+    """
+    if isinstance(valor, dict):
+        arquivo.write("{")
+        for n, (chave, item) in enumerate(valor.items()):
+            arquivo.write(("," if n else "") + _codificar(str(chave)) + ":")
+            _escrever(arquivo, item)
+        arquivo.write("}")
+    elif isinstance(valor, (list, tuple, np.ndarray)) and len(valor) > TAMANHO_BLOCO:
+        arquivo.write("[")
+        for inicio in range(0, len(valor), TAMANHO_BLOCO):
+            bloco = valor[inicio:inicio + TAMANHO_BLOCO]
+            bloco = bloco.tolist() if isinstance(bloco, np.ndarray) else list(bloco)
+            arquivo.write(("," if inicio else "") + _codificar(bloco)[1:-1])
+        arquivo.write("]")
+    else:
+        arquivo.write(_codificar(valor.tolist() if isinstance(valor, np.ndarray) else valor))
+
+
+def _sidecar(saida):
+    raiz, _ = os.path.splitext(saida)
+    return f"{raiz}.alocacoes.npz"
+
+
+def gravar_resultados(resultados, saida):
+    """
+    Grava o dicionário de resultados no formato indicado por resultados["formato"]
+    (ausente: verboso).
+    """
+    formato = resultados.get("formato", "verboso")
+    temporario = f"{saida}.tmp"
+    if formato == "binario" and isinstance(resultados.get("alocacoes"), dict):
+        alocacoes = resultados["alocacoes"]
+        sidecar = _sidecar(saida)
+        with open(sidecar + ".tmp", 'wb') as arquivo:
+            np.savez(arquivo,
+                     localidade=np.array(["" if c is None else str(c) for c in alocacoes["localidade"]]),
+                     centro=np.asarray(alocacoes["centro"], dtype=np.int32))
+        os.replace(sidecar + ".tmp", sidecar)
+        resultados = {**resultados, "alocacoes": {"arquivo": os.path.basename(sidecar)}}
+
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        if formato == "verboso":
+            json.dump(resultados, arquivo, indent=4)
+        else:
+            _escrever(arquivo, resultados)
+    os.replace(temporario, saida)
+
+
+def ler_alocacoes(saida, resultados):
+    """
+    Alocações (localidade, centro) de um resultado compacto ou binário, como arrays.
+    """
+    alocacoes = resultados["alocacoes"]
+    if "arquivo" in alocacoes:
+        with np.load(os.path.join(os.path.dirname(saida), alocacoes["arquivo"])) as arquivo:
+            return arquivo["localidade"], arquivo["centro"]
+    return np.array(alocacoes["localidade"]), np.array(alocacoes["centro"])
@@ -2,7 +2,9 @@ from matplotlib import pyplot as plt
 from pulp import *
 import math
 import json
+import os
 import sys
+from solvers import configuracao_solver, criar_solver_pulp
 
 # Obtendo o nome dos arquivos de entrada e saída do terminal
 entrada = sys.argv[1]
@@ -105,11 +107,15 @@ for i in range(l):
 
 #To cplex
 path_to_cplex = "/opt/ibm/ILOG/CPLEX_Studio2211/cplex/bin/x86-64_linux/cplex"
-#solver = CPLEX_CMD(msg=1)
-solver = CPLEX_CMD(path=path_to_cplex, msg=1)
 
-# Define o tempo limite para o solver
-solver.timeLimit = 7200
+# Solver (campo "solver" do JSON ou variáveis SOLVER_*), com tempo limite padrão de 7200 s
+# e fallback para solvers livres quando o CPLEX não está instalado
+config_solver = configuracao_solver(
+    dados,
+    tempo_limite_padrao=7200,
+    caminho_padrao=path_to_cplex if os.path.exists(path_to_cplex) else None,
+)
+nome_solver, solver = criar_solver_pulp(config_solver)
 
 # Solução 
 prob.solve(solver)
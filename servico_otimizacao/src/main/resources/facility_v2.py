@@ -4,6 +4,7 @@ import math
 import json
 import time
 import sys
+from solvers import configuracao_solver, criar_solver_pulp
 
 def distancia_euclidiana(ponto1, ponto2):
     x1, y1 = ponto1
@@ -37,6 +38,9 @@ try:
         M = [localidade["metricas"] for localidade in dados["setores"] if "metricas" in localidade and not localidade["facility"]]
 
         K_max= dados.get("num_facilities",None)
+
+        # Solver (campo "solver" do JSON ou variáveis SOLVER_*), com fallback para solvers livres
+        config_solver = configuracao_solver(dados)
         
         # Nome métricas
         nome_metricas = dados.get("nome_metricas", None)
@@ -88,7 +92,8 @@ try:
         inicio = time.time()
 
         # Resolvendo 
-        prob.solve(CPLEX(msg=1))
+        nome_solver, solver = criar_solver_pulp(config_solver)
+        prob.solve(solver)
 
         # Finalizando tempo
         termino = time.time()
@@ -1,11 +1,13 @@
 import logging
 from matplotlib import pyplot as plt
 from numpy import arccos, cos, sin, pi
-from pulp import LpVariable, LpProblem, LpMinimize, lpSum, value, LpStatus, CPLEX_CMD
+from pulp import LpVariable, LpProblem, LpMinimize, lpSum, value, LpStatus
 import math
 import json
 import time
 import sys
+from solvers import configuracao_solver, criar_solver_pulp
+from diagnostico import Diagnostico
 
 def distancia_euclidiana(ponto1, ponto2):
     """
@@ -54,7 +56,8 @@ def main():
     
     #logging.basicConfig(filename='teste2.txt', level=logging.DEBUG, format='%(asctime)s - %(message)s')
 
-   
+    # Tempo de parede e de CPU, memória e tamanho do modelo por fase (bloco "diagnostico")
+    diagnostico = Diagnostico()
     try:
         entrada = sys.argv[1]
         saida = sys.argv[2] # Nome do arquivo de saída
@@ -64,6 +67,7 @@ def main():
 
         try:
             
+            diagnostico.fase("leitura")
             with open(entrada, encoding='utf-8') as entradas:
                 dados = json.load(entradas)
             print("Dados lidos com sucesso.")
@@ -72,6 +76,8 @@ def main():
 
         try:
            #Leitura
+            diagnostico.configurar(dados.get("diagnostico"))
+            diagnostico.fase("preparacao")
             
             #saida = dados.get("arquivo_saida", "saida.json")  # Nome do arquivo de saída
             k = dados.get("num_centros_desejado")  # Número de centros a serem utilizados
@@ -92,7 +98,14 @@ def main():
             l, f = len(L), len(F)
             m = len(M[0]) if M else 0
             w = [sum(lambdas[j] * M[i][j] for j in range(len(lambdas))) for i in range(l)]
+            diagnostico.fase("distancias")
             d = [[getDistanceBetweenPointsNew(L[i], F[j]) for j in range(f)] for i in range(l)]
+
+            # Modelo esparso: não cria x[i][j] para pares com d[i][j] > d_max (mesmo conjunto viável)
+            modelo_esparso = dados.get("modelo_esparso", False)
+
+            # Solver (campo "solver" do JSON ou variáveis SOLVER_*), com fallback para solvers livres
+            config_solver = configuracao_solver(dados, tempo_limite_padrao=180)
             #logging.debug(f"Distancias {d}")
             
             if not L or not Fn or not Ff or not M or not c or not cap or not p:
@@ -122,20 +135,34 @@ def main():
 
         try:
             # Definição das variáveis
+            diagnostico.fase("modelo")
             y = LpVariable.dicts('y', range(len(Fn)), cat='Binary')
-            x = LpVariable.dicts('x', (range(l), range(f)), cat='Binary')
+            if modelo_esparso:
+                x = {i: {j: LpVariable(f"x_{i}_{j}", cat='Binary') for j in range(f) if d[i][j] <= d_max}
+                     for i in range(l)}
+                sem_facility = [i for i in range(l) if not x[i]]
+                if sem_facility:
+                    raise ValueError(f"Localidades sem facility a até {d_max} km: {sem_facility}")
+            else:
+                x = LpVariable.dicts('x', (range(l), range(f)), cat='Binary')
+
+            # Localidades que podem ser alocadas em cada facility
+            clientes = [[] for _ in range(f)]
+            for i in range(l):
+                for j in x[i]:
+                    clientes[j].append(i)
 
             prob = LpProblem("minimizar", LpMinimize)
 
             # Definição da função objetivo
             if flag_problema == 1:
-                prob += lpSum(x[i][j] * d[i][j] * w[i] for i in range(l) for j in range(f)), "Minimizar_Distancia_Ponderada"
+                prob += lpSum(x[i][j] * d[i][j] * w[i] for i in range(l) for j in x[i]), "Minimizar_Distancia_Ponderada"
             else:
                 prob += lpSum(y[j] * c[j] for j in range(len(Fn))), "Minimizar_Custo"
 
             # Definição das restrições
             for i in range(l):
-                prob += lpSum(x[i][j] for j in range(f)) == 1, f"Localidade_{i}_alocada"
+                prob += lpSum(x[i][j] for j in x[i]) == 1, f"Localidade_{i}_alocada"
                 
 
             prob += lpSum(y[j] for j in range(len(Fn))) == k - len(Ff), "Numero_de_facilities_novas_ativadas"
@@ -143,14 +170,15 @@ def main():
 
             if flag_problema == 1:  
                 for j in range(len(Fn)):
-                    for i in range(l):
+                    for i in clientes[j]:
                         prob += x[i][j] <= y[j], f"Facility_{j}_considerada_se_Localidade_{i}_alocada"
                         #logging.debug(f" Facility_{j}_considerada_se_Localidade_{i}_alocada")
 
-            for i in range(l):
-                for j in range(f):
-                    prob += d[i][j] * x[i][j] <= d_max, f"Localidade_{i}_alocada_em_Facility_{j}_proxima"
-                    #logging.debug(f"Localidade_{i}_alocada_em_Facility_{j}_proxima com distância {d[i][j]} e d_max {d_max}")
+            if not modelo_esparso:
+                for i in range(l):
+                    for j in range(f):
+                        prob += d[i][j] * x[i][j] <= d_max, f"Localidade_{i}_alocada_em_Facility_{j}_proxima"
+                        #logging.debug(f"Localidade_{i}_alocada_em_Facility_{j}_proxima com distância {d[i][j]} e d_max {d_max}")
 
             prob +=lpSum(y[j] * c[j] for j in range(len(Fn))) <= c_max , f"Facility_Custo_Maximo_{j}"
             #logging.debug(f"Facility_Custo_Maximo_{j} com custo {c[j]}")
@@ -158,7 +186,11 @@ def main():
             
             if flag_problema == 2:    
                     for j in range(f):
-                        prob += lpSum(p[i] * x[i][j] for i in range(l)) <= cap[j], f"Capacidade_Facility_{j}"
+                        prob += lpSum(p[i] * x[i][j] for i in clientes[j]) <= cap[j], f"Capacidade_Facility_{j}"
+
+            diagnostico.registrar_modelo(prob.numVariables(), prob.numConstraints(),
+                                         sum(len(restricao) for restricao in prob.constraints.values()),
+                                         sum(len(x[i]) for i in range(l)), l * f)
                     
 
         
@@ -168,17 +200,19 @@ def main():
 
         try:
            
+            diagnostico.fase("resolucao")
             inicio = time.time()
 
-            solver = CPLEX_CMD(msg=1)
-            solver.timeLimit = 180
+            nome_solver, solver = criar_solver_pulp(config_solver)
+            print(f"Solver: {nome_solver}")
             prob.solve(solver)
+            diagnostico.fase("extracao")
             
             for j in range(len(Fn)):
                 logging.debug(f"facility{j}: {y[j].varValue}")
                 
             for i in range(l):
-                for j in range(f):
+                for j in x[i]:
                     logging.debug(f"alocacao({i},{j}): {x[i][j].varValue}")
                     # logging.debug(f"dist({i},{j}): {d[i][j]}")
                     
@@ -209,7 +243,7 @@ def main():
                     "orcamento": c_max,
                     "metricas": nome_metricas,
                     "prioridades": lambdas,
-                    "alocacoes": [[i, j] for i in range(l) for j in range(f) if abs(x[i][j].varValue - 1) <= 0.1],
+                    "alocacoes": [[i, j] for i in range(l) for j in x[i] if abs(x[i][j].varValue - 1) <= 0.1],
                     "centros_adicionados": centros_utilizados,
                     "centros_fixos": centros_fixos
                 })
@@ -217,17 +251,22 @@ def main():
         except Exception as e:
             raise ValueError(f"Erro ao resolver o problema de otimizacao: {e}")
         
+        diagnostico.fase("escrita")
+        resultados["diagnostico"] = diagnostico.resumo()
         with open(saida, 'w', encoding='utf-8') as saidas:
                 json.dump(resultados, saidas, indent=4)
 
     except Exception as e:
         resultados = {"status": "Erro", "mensagem": str(e)}
+        diagnostico.fase("escrita")
+        resultados["diagnostico"] = diagnostico.resumo()
         with open(saida, 'w', encoding='utf-8') as saidas:
             json.dump(resultados, saidas, indent=4)
 
     
     
 # PLOT
+    diagnostico.fase("graficos")
     if resultados.get("status") == "Optimal":
         alocacoes_utilizadas = resultados["alocacoes"]
         centros_utilizados = resultados["centros_adicionados"]
@@ -275,8 +314,10 @@ def main():
 
         plt.savefig(f'{saida}.png')
         plt.show()
+        diagnostico.encerrar()
     else:
         print("Nenhuma alocação encontrada ou status não é Ótimo. Nenhum gráfico será gerado.")
+        diagnostico.encerrar()
         sys.exit(1)
 
 
@@ -1,13 +1,31 @@
 import logging
-from matplotlib import pyplot as plt
 from numpy import arccos, cos, sin, pi
 import numpy as np
-from pulp import LpVariable, LpProblem, LpMinimize, lpSum, value, LpStatus, CPLEX_CMD
+from pulp import LpVariable, LpProblem, LpMinimize, lpSum, value, LpStatus
 import math
 import json
 import time
 import sys
-import cplex
+from instancia import preparar_instancia, calcular_distancias
+from leitura import ler_entrada
+from escrita import gravar_resultados
+from modelo_matricial import montar_modelo, resolver_highs, decodificar, vetor_solucao
+from heuristicas import heuristica_inicial
+from solucao import montar_resultados, valores_variaveis, STATUS_COM_SOLUCAO
+from solvers import configuracao_solver, criar_solver_pulp, aceita_solucao_inicial
+from graficos import plotar_resultados
+from vns import resolver_vns
+from candidatos import resolver_restrito
+from lagrangiana import limitante_inferior, gap_relativo, resumo_lagrangiana
+from cenarios import executar_lote
+from varredura import executar_varredura
+from fechamento import executar_fechamento
+from agregacao import agregar, desagregar, limitante_valido
+from decomposicao import resolver_decomposicao
+from modelo_radial import resolver_radial
+from atribuicao import resolver_atribuicao
+from diagnostico import Diagnostico
+from cache_resultados import CacheResultados
 
 def distancia_euclidiana(ponto1, ponto2):
     """
@@ -17,37 +35,6 @@ def distancia_euclidiana(ponto1, ponto2):
     x2, y2 = ponto2
     return math.sqrt((x2 - x1)**2 + (y2 - y1)**2) * 1000
 
-def extrair_coord(cf):
-    """
-    Converte qualquer formato em (lat, lon, idx)
-    aceita:
-      • (lat, lon)
-      • [(lat, lon)]
-      • [idx, (lat, lon)]
-      • {"centro": [lat, lon], ...}
-      • {"centro": [[lat, lon]], ...}
-    """
-    if isinstance(cf, dict) and "centro" in cf:
-        val = cf["centro"]
-        if isinstance(val, (list, tuple)) and len(val) == 1 and isinstance(val[0], (list, tuple)):
-            val = val[0]                    # desfaz colchete duplo
-        lat, lon = val                      # agora são dois números
-        idx = cf.get("codigo_cnes") or cf.get("idx")
-
-    elif isinstance(cf, (list, tuple)):
-        if len(cf) == 2 and all(isinstance(v, (int, float)) for v in cf):
-            lat, lon = cf; idx = None
-        elif len(cf) == 1:
-            lat, lon = cf[0]; idx = None
-        else:
-            idx, (lat, lon) = cf
-
-    else:
-        raise ValueError(f"Formato inesperado: {cf}")
-
-    return lat, lon, idx
-
-
 def rad2deg(radians):
     """
     Converte radianos para graus.
@@ -87,103 +74,127 @@ def main():
     
     #logging.basicConfig(filename='teste.txt', level=logging.DEBUG, format='%(asctime)s - %(message)s')
 
-   
+    executar(sys.argv[1], sys.argv[2])
+
+
+def executar(entrada, saida, dados=None):
+    """
+    Resolve a instância do arquivo `entrada` (ou já carregada em `dados`), grava o resultado
+    em `saida` e o retorna.
+    """
+    gerar_graficos = False
+    # Tempo de parede e de CPU, memória e tamanho do modelo por fase (bloco "diagnostico")
+    diagnostico = Diagnostico()
     try:
-        entrada = sys.argv[1]
-        saida = sys.argv[2]
         d_max = 10
         c_max = 100000  
         
 
         try:
             
-            with open(entrada, encoding='utf-8') as entradas:
-                dados = json.load(entradas)
+            diagnostico.fase("leitura")
+            if dados is None:
+                # .json (lido de forma incremental) ou .npz colunar, direto para arrays
+                dados = ler_entrada(entrada)
             print("Dados lidos com sucesso.")
         except Exception as e:
             raise ValueError(f"Erro ao abrir ou ler o arquivo JSON: {e}")
 
+        # Lote de cenários ({"base": ..., "cenarios": [...]}): cada cenário vai para o seu arquivo
+        executar_modo = None
+        if "cenarios" in dados:
+            executar_modo = executar_lote
+        # Varredura de num_centros_desejado ("varredura": {"k_min", "k_max", "passo"}): curva objetivo x k
+        elif "varredura" in dados:
+            executar_modo = executar_varredura
+        # Impacto do fechamento de cada facility fixa ("fechamento": {"abertas", "localidades"})
+        elif "fechamento" in dados:
+            executar_modo = executar_fechamento
+        if executar_modo is not None:
+            resultados = executar_modo(dados, saida)
+            diagnostico.encerrar()
+            return resultados
+
         try:
             
             
-            k = dados.get("num_centros_desejado")  # Número de centros que deseja criar/alocar na cidade (já existentes incluso)
+            diagnostico.configurar(dados.get("diagnostico"))
+            diagnostico.fase("preparacao")
+            inst = preparar_instancia(dados)
+
+            # Solver (campo "solver" do JSON ou variáveis SOLVER_*), com fallback para solvers livres
+            config_solver = configuracao_solver(dados, tempo_limite_padrao=1000)
+
+            # Cache de resultados ("cache_resultados"): entrada idêntica devolve o resultado guardado
+            # (sem refazer os gráficos); a mesma instância com outro k ou pesos dá a solução inicial
+            cache = CacheResultados(dados.get("cache_resultados", True), dados, inst, config_solver)
+            guardado = cache.buscar()
+            if guardado is not None:
+                print("Resultado lido do cache de resultados.")
+                diagnostico.fase("escrita")
+                guardado["diagnostico"] = diagnostico.resumo()
+                gravar_resultados(guardado, saida)
+                diagnostico.encerrar()
+                return guardado
+
+            # Agregação das localidades em pontos de demanda ("agregacao": {"metodo", "alvo"}):
+            # o modelo é resolvido sobre os pontos e a solução volta às localidades no final
+            agregacao = None
+            if dados.get("agregacao"):
+                diagnostico.fase("agregacao")
+                original = inst
+                opcoes_agregacao = dados["agregacao"] if isinstance(dados["agregacao"], dict) else None
+                inst, grupos, agregacao = agregar(original, opcoes_agregacao)
+                print(f"Agregação: {agregacao['localidades']} localidades em {agregacao['pontos']} pontos, "
+                      f"limite de erro {agregacao['limite_erro']}")
+
+            k = inst["k"]  # Número de centros que deseja criar/alocar na cidade (já existentes incluso)
+            flag_problema = inst["flag_problema"]  # Tipo de problema (1: minimizar distância ponderada, 2: minimizar custo)
+            codigo_cnes = inst["codigo_cnes"]
 
-            codigo_cnes = [fac['codigo_cnes'] for fac in dados["facilities"] if fac.get("fixed") is True]
-
-            flag_problema = dados.get("tipo_problema")  # Tipo de problema (1: minimizar distância ponderada, 2: minimizar custo)
-            if flag_problema not in [1, 2]:
-                raise ValueError("Flag invalida. Deve ser 1 ou 2.")
-            
           # Leitura dos dados
-            L = [(loc["coordenada"][0], loc["coordenada"][1]) for loc in dados["localidades"] if "fixed" not in loc]  
-            Ff = [(fac["coordenada"][0], fac["coordenada"][1]) for fac in dados["facilities"] if fac.get("fixed") is True]  
-            Fn = [(loc["coordenada"][0], loc["coordenada"][1]) for loc in dados["facilities"] if loc.get("fixed") is False]  
-
+            L, Ff, Fn, F = inst["L"], inst["Ff"], inst["Fn"], inst["F"]
 
             print(f"ff: {len(Ff)}")
             print(f"fn: {len(Fn)}")
 
-            # Combinação de facilities fixas
-            F = Ff  + Fn
-            # Extração de métricas
-            M = [loc["metricas"] for loc in dados["localidades"]]  # Métricas para localidades 
-
-            nome_metricas = dados.get("nome_metricas", None)
-            
-            # Extração de pesos
-            lambdas = dados.get("pesos", None)
-            if lambdas is None:
-                raise ValueError("Pesos não fornecidos.")
-            if len(lambdas) != len(M[0]):
-                raise ValueError("Número de pesos não corresponde ao número de métricas.")
-            
-            flag_proporcao_inversa = dados.get("proporcao_inversa", None)
-
-            if flag_proporcao_inversa is None:
-                raise ValueError("Flag de proporção inversa não fornecida.")
-
-            
-            if len(flag_proporcao_inversa) != len(M[0]):
-                raise ValueError("O tamanho de flag_proporcao_inversa deve ser igual ao número de métricas.")
-
-            if any(f not in [0, 1] for f in flag_proporcao_inversa):
-                raise ValueError("Flag de proporção inversa deve conter apenas 0 ou 1.")
-
-            # Aplica a inversão para cada localidade e para cada métrica conforme a flag
-            for i in range(len(M)):
-                for j in range(len(M[i])):
-                    if flag_proporcao_inversa[j] == 1 and M[i][j] != 0:
-                        M[i][j] = 1 / M[i][j]
-
-
-
-            #Verificação K
-            if k < len(Ff):
-                raise ValueError("Número de centros desejados não pode ser menor que o número de centros que já existem.")
-
-            if k > len(F):
-                raise ValueError("Número de centros disponíveis é menor que o número de centros desejados.")
-
-
-            # Custos e capacidades para localidades com fixed = false
-            c = [loc["custo"] for loc in dados["facilities"]]  
-
-            cap = [12000 for loc in dados["facilities"]]  
+            nome_metricas = inst["nome_metricas"]
+            lambdas = inst["lambdas"]
 
-            # Total de moradores nas localidades sem o campo "fixed"
-            p = [loc["total_moradores"] for loc in dados["localidades"]]
+            # Custos e capacidades das facilities novas, total de moradores e pesos w das localidades
+            c, cap, p, w = inst["c"], inst["cap"], inst["p"], inst["w"]
 
             # Cálculos e distâncias
             l, f = len(L), len(F)
 
+            # Modo de solução: "exato" (MILP, padrão), "restrito" (MILP sobre as K facilities mais
+            # próximas de cada localidade, expandido até provar a otimalidade) ou "vns"
+            # (metaheurística para instâncias grandes), "decomposicao" (regiões resolvidas em paralelo)
+            # ou "avaliacao" (só a alocação para as facilities abertas dadas em "avaliacao")
+            modo = dados.get("modo", "exato")
+            if modo not in ["exato", "restrito", "vns", "decomposicao", "avaliacao"]:
+                raise ValueError("Modo inválido. Deve ser 'exato', 'restrito', 'vns', 'decomposicao' ou 'avaliacao'.")
+
+            # Calcule d (matriz l x f) e d_max, a maior distância até a facility mais próxima.
+            # Os demais modos calculam só as distâncias às facilities candidatas.
+            if modo in ["exato", "avaliacao"]:
+                diagnostico.fase("distancias")
+                d = calcular_distancias(inst)
+                d_max = inst["d_max"]
+                print(f"Distâncias: {inst['origem_distancias']}")
+
+            # Modelo esparso: não cria x[i][j] para pares com d[i][j] > d_max (mesmo conjunto viável)
+            modelo_esparso = dados.get("modelo_esparso", False)
+
+            # Modelo: "pulp" (padrão), "matricial" (matriz esparsa resolvida pelo HiGHS no próprio
+            # processo) ou "radial" (formulação por níveis de distância, com alocação explícita só
+            # perto das facilities de capacidade ativa; no tipo_problema 2 usa o matricial)
+            tipo_modelo = dados.get("modelo", "pulp")
+            if tipo_modelo not in ["pulp", "matricial", "radial"]:
+                raise ValueError("Modelo inválido. Deve ser 'pulp', 'matricial' ou 'radial'.")
+
+            gerar_graficos = dados.get("gerar_graficos", False)
 
-            # Calcule w usando a lista atualizada de métricas M
-            w = [sum(lambdas[j] * M[i][j] for j in range(len(lambdas))) for i in range(len(M))]
-
-
-            # Calcule d se houver localidades e facilities
-            d = [[getDistanceBetweenPointsNew(L[i], F[j]) for j in range(f)] for i in range(l)] if l > 0 and f > 0 else []
-            d_max = max([min(d[i]) for i in range(l)]) 
             # Log para distâncias e w
             #logging.debug(f"Distancias: {d}")
             #logging.debug(f"Pesos: {w}")
@@ -191,9 +202,8 @@ def main():
             print(f"Tamanho de F (facilities): {len(F)}")
             print(f"Tamanho de Fn (facilities novas): {len(Fn)}")
             print(f"Tamanho de Ff (facilities fixas): {len(Ff)}")
-            print(f"Tamanho de M (métricas): {len(M)}")
-            if len(M) > 0:
-                print(f"Tamanho das métricas (elementos em M[0]): {len(M[0])}")
+            print(f"Tamanho de M (métricas): {len(w)}")
+            print(f"Tamanho das métricas (elementos em M[0]): {len(lambdas)}")
 
 
 
@@ -205,8 +215,8 @@ def main():
             # logging.debug(f"flag: {flag_problema}")
             # logging.debug(f"entrada: {entrada}")
 
-            logging.debug(f"Fn (facilities novas): {Fn}")
-            logging.debug(f"Ff (facilities fixas): {Ff}")
+            logging.debug("Fn (facilities novas): %s", Fn)
+            logging.debug("Ff (facilities fixas): %s", Ff)
             # logging.debug(f"Fn tamanho : {len(Fn)}")
             # logging.debug(f"Ff tamanho : {len(Ff)}")
             # logging.debug(f"F (todas as facilities): {F}")
@@ -217,54 +227,156 @@ def main():
             # logging.debug(f"l (número de localidades): {l}")
             # logging.debug(f"f (número de facilities): {f}")
             # logging.debug(f"w (pesos): {w}")
-            logging.debug(f"Valor de k: {k}, len(Ff): {len(Ff)}, l (localidades): {l}, f (facilities): {f}")
+            logging.debug("Valor de k: %s, len(Ff): %s, l (localidades): %s, f (facilities): %s", k, len(Ff), l, f)
 
 
         except Exception as e:
             raise ValueError(f"Erro ao processar os dados: {e}")
 
         try:
-            # Definição das variáveis
-            y = LpVariable.dicts('y', range(len(Fn)), cat='Binary')
-            x = LpVariable.dicts('x', (range(l), range(f)), cat='Binary')
-
-            prob = LpProblem("minimizar", LpMinimize)
-
-            # Definição da função objetivo
-            if flag_problema == 1:
-                prob += lpSum(x[i][j] * d[i][j] * w[i] for i in range(l) for j in range(f)), "Minimizar_Distancia_Ponderada"
+            # Solução inicial heurística (adição gulosa + trocas) para o p-median, usada como MIP start
+            heuristica = None
+            inicial_cache = False
+            # No modelo PuLP, só vale calcular a solução inicial se o solver escolhido a recebe
+            # (ou se ela for o limitante superior da fixação lagrangiana)
+            solver = None
+            aceita_inicial = True
+            if modo == "exato" and tipo_modelo == "pulp":
+                nome_solver, solver = criar_solver_pulp(config_solver, warm_start=True)
+                aceita_inicial = aceita_solucao_inicial(solver)
+            if modo == "exato" and dados.get("heuristica_inicial", True) and flag_problema == 1 and not aceita_inicial:
+                logging.warning("O solver %s não aceita solução inicial; heurística inicial não usada como MIP start.",
+                                nome_solver)
+            if (modo == "exato" and dados.get("heuristica_inicial", True) and flag_problema == 1
+                    and (aceita_inicial or dados.get("limitante_inferior", False))):
+                diagnostico.fase("heuristica")
+                heuristica = heuristica_inicial(inst)
+                print(f"Heurística: objetivo {heuristica['objetivo']} em {heuristica['tempo']:.2f} s")
+                # Acerto próximo do cache: parte das facilities da solução guardada, se for melhor
+                proxima = cache.proxima()
+                if proxima is not None:
+                    alternativa = heuristica_inicial(inst, proxima)
+                    print(f"Solução inicial do cache: objetivo {alternativa['objetivo']}")
+                    if alternativa["objetivo"] is not None and (heuristica["objetivo"] is None
+                                                               or alternativa["objetivo"] < heuristica["objetivo"]):
+                        heuristica = alternativa
+                        inicial_cache = True
+            usar_inicial = heuristica is not None and heuristica["objetivo"] is not None
+
+            # Limitante inferior lagrangiano; com a solução heurística como limitante superior,
+            # também remove do modelo os pares e facilities fixados por custo reduzido
+            lagrangiana = None
+            fixar = False
+            if modo == "exato" and dados.get("limitante_inferior", False) and flag_problema == 1:
+                diagnostico.fase("lagrangiana")
+                lagrangiana = limitante_inferior(inst, heuristica["objetivo"] if usar_inicial else None)
+                fixar = usar_inicial
+                print(f"Limitante lagrangiano: {lagrangiana['lower_bound']} em {lagrangiana['tempo']:.2f} s")
+                if fixar:
+                    manter = lagrangiana["manter"]
+                    pares = (lagrangiana["pares_i"][manter], lagrangiana["pares_j"][manter])
+                    print(f"Fixação por custo reduzido: {len(manter) - manter.sum()} pares removidos")
+
+            diagnostico.fase("modelo")
+            if modo != "exato" or tipo_modelo == "radial":
+                # montado por resolver_restrito / resolver_decomposicao / resolver_radial, não usado pela VNS
+                # nem pela avaliação
+                modelo = None
+            elif tipo_modelo == "matricial":
+                modelo = montar_modelo(inst, pares if fixar else None)
+                if fixar:
+                    modelo["col_lb"][modelo["n_x"] + lagrangiana["abertas_fixadas"]] = 1
+                    modelo["col_ub"][modelo["n_x"] + lagrangiana["fechadas_fixadas"]] = 0
+                print(f"Modelo matricial: {modelo['A'].shape[0]} restrições, {modelo['A'].shape[1]} variáveis, {modelo['A'].nnz} não nulos")
+                diagnostico.registrar_modelo(modelo["A"].shape[1], modelo["A"].shape[0], modelo["A"].nnz,
+                                             modelo["n_x"], l * f)
             else:
-                prob += lpSum(y[j] * c[j] for j in range(len(Fn))), "Minimizar_Custo"
-
-            # Definição das restriçõe
-            for i in range(l):
-                prob += lpSum(x[i][j] for j in range(f)) == 1, f"Localidade_{i}_alocada"
+                # Definição das variáveis
+                y = LpVariable.dicts('y', range(len(Fn)), cat='Binary')
+                viaveis = d <= d_max
+                if fixar:
+                    viaveis = np.zeros_like(viaveis)
+                    viaveis[pares] = True
+                if modelo_esparso:
+                    x = {i: {j: LpVariable(f"x_{i}_{j}", cat='Binary') for j in np.flatnonzero(viaveis[i]).tolist()}
+                         for i in range(l)}
+                    print(f"Modelo esparso: {sum(len(x[i]) for i in range(l))} de {l * f} pares mantidos")
+                else:
+                    x = LpVariable.dicts('x', (range(l), range(f)), cat='Binary')
+
+                # Localidades que podem ser alocadas em cada facility (índices de F = Ff + Fn) e os
+                # pares (i, j) das variáveis x na ordem de variaveis_x, para ler a solução em arrays
+                offset = len(Ff)
+                clientes = [[] for _ in range(f)]
+                alocacao_i, alocacao_j, variaveis_x = [], [], []
+                for i in range(l):
+                    for j in x[i]:
+                        clientes[j].append(i)
+                        alocacao_i.append(i)
+                        alocacao_j.append(j)
+                        variaveis_x.append(x[i][j])
+                alocacao_i = np.array(alocacao_i, dtype=np.int64)
+                alocacao_j = np.array(alocacao_j, dtype=np.int64)
+
+                prob = LpProblem("minimizar", LpMinimize)
+
+                # Definição da função objetivo
+                if flag_problema == 1:
+                    prob += lpSum(x[i][j] * d[i][j] * w[i] for i in range(l) for j in x[i]), "Minimizar_Distancia_Ponderada"
+                else:
+                    prob += lpSum(y[j] * c[j] for j in range(len(Fn))), "Minimizar_Custo"
+
+                # Definição das restriçõe
+                for i in range(l):
+                    prob += lpSum(x[i][j] for j in x[i]) == 1, f"Localidade_{i}_alocada"
                 
 
-            prob += lpSum(y[j] for j in range(len(Fn))) == k - len(Ff), "Numero_de_facilities_novas_ativadas"
+                prob += lpSum(y[j] for j in range(len(Fn))) == k - len(Ff), "Numero_de_facilities_novas_ativadas"
             
 
-            if flag_problema == 1:  
-                for j in range(len(Fn)):
-                    for i in range(l):
-                        prob += x[i][j] <= y[j], f"Facility_{j}_considerada_se_Localidade_{i}_alocada"
-                        #logging.debug(f" Facility_{j}_considerada_se_Localidade_{i}_alocada")
+                if flag_problema == 1:  
+                    for j in range(len(Fn)):
+                        for i in clientes[j + offset]:
+                            prob += x[i][j + offset] <= y[j], f"Facility_{j}_considerada_se_Localidade_{i}_alocada"
+                            #logging.debug(f" Facility_{j}_considerada_se_Localidade_{i}_alocada")
 
 
-            for i in range(l):
-                for j in range(f):
-                    prob += d[i][j] * x[i][j] <= d_max, f"Localidade_{i}_alocada_em_Facility_{j}_proxima"
-                    #logging.debug(f"Localidade_{i}_alocada_em_Facility_{j}_proxima com distância {d[i][j]} e d_max {d_max}")
+                if not modelo_esparso:
+                    for i in range(l):
+                        for j in range(f):
+                            prob += d[i][j] * x[i][j] <= d_max, f"Localidade_{i}_alocada_em_Facility_{j}_proxima"
+                            #logging.debug(f"Localidade_{i}_alocada_em_Facility_{j}_proxima com distância {d[i][j]} e d_max {d_max}")
 
-            for j in range(len(Fn)):
-                        prob += lpSum(p[i] * x[i][j] for i in range(l)) <= cap[j], f"Capacidade_Facility_{j}"
+                for j in range(len(Fn)):
+                            prob += lpSum(p[i] * x[i][j + offset] for i in clientes[j + offset]) <= cap[j], f"Capacidade_Facility_{j}"
             
             
             
-            if flag_problema == 2:    
+                if flag_problema == 2:    
                         
-                    prob +=lpSum(y[j] * c[j] for j in range(len(Fn))) <= c_max , f"Facility_Custo_Maximo_{j}"
-                    #logging.debug(f"Facility_Custo_Maximo_{j} com custo {c[j]}")
+                        prob +=lpSum(y[j] * c[j] for j in range(len(Fn))) <= c_max , f"Facility_Custo_Maximo_{j}"
+                        #logging.debug(f"Facility_Custo_Maximo_{j} com custo {c[j]}")
+
+                if fixar:
+                    for j in lagrangiana["abertas_fixadas"].tolist():
+                        y[j].lowBound = 1
+                    for j in lagrangiana["fechadas_fixadas"].tolist():
+                        y[j].upBound = 0
+                    if not modelo_esparso:
+                        for i, j in zip(*np.nonzero(~viaveis & (d <= d_max))):
+                            x[i][j].upBound = 0
+
+                if usar_inicial:
+                    abertas_iniciais = set(heuristica["abertas"].tolist())
+                    for j in range(len(Fn)):
+                        y[j].setInitialValue(1 if j in abertas_iniciais else 0)
+                    for i, j in enumerate(heuristica["atribuicao"].tolist()):
+                        if j in x[i]:
+                            x[i][j].setInitialValue(1)
+
+                diagnostico.registrar_modelo(prob.numVariables(), prob.numConstraints(),
+                                             sum(len(restricao) for restricao in prob.constraints.values()),
+                                             sum(len(x[i]) for i in range(l)), l * f)
                     
 
         
@@ -274,197 +386,161 @@ def main():
 
         try:
            
+            diagnostico.fase("resolucao")
             inicio = time.time()
 
-            solver = CPLEX_CMD(msg=1)
-            solver.timeLimit = 1000
-            prob.solve(solver)
-            
-            #for j in range(len(Fn)):
-                #logging.debug(f"facility{j}: {y[j].varValue}")
-                
-            for i in range(l):
-                for j in range(f):
-                    logging.debug(f"alocacao({i},{j}): {x[i][j].varValue}")
-                    #logging.debug(f"dist({i},{j}): {d[i][j]}")
-                    
-       
+            if modo == "vns":
+                # Cada nova melhor solução já é gravada em `saida` enquanto a busca continua
+                status, objective_value, abertas, atribuicao, info_vns = resolver_vns(
+                    inst, dados.get("vns"), saida, limitante=dados.get("limitante_inferior", False))
+                lagrangiana = info_vns.pop("lagrangiana", None)
+                print(f"VNS: {info_vns['iteracoes']} iterações em {info_vns['inicios']} inícios")
+            elif modo == "restrito":
+                status, objective_value, abertas, atribuicao, info_restrito = resolver_restrito(
+                    inst, dados.get("restrito"), config_solver)
+            elif modo == "decomposicao":
+                status, objective_value, abertas, atribuicao, info_decomposicao = resolver_decomposicao(
+                    inst, dados.get("decomposicao"), config_solver)
+            elif modo == "avaliacao":
+                status, objective_value, abertas, atribuicao, info_avaliacao = resolver_atribuicao(
+                    inst, dados.get("avaliacao"), config_solver)
+            elif tipo_modelo == "radial":
+                status, objective_value, abertas, atribuicao, info_radial = resolver_radial(
+                    inst, config_solver, (heuristica["abertas"], heuristica["atribuicao"]) if usar_inicial else None)
+                diagnostico.registrar_modelo(info_radial["variaveis"], info_radial["restricoes"],
+                                             info_radial["nao_nulos"])
+            elif tipo_modelo == "matricial":
+                status, vetor, objective_value = resolver_highs(
+                    modelo,
+                    time_limit=config_solver["tempo_limite"],
+                    mip_rel_gap=config_solver["gap"],
+                    threads=config_solver["threads"],
+                    inicial=vetor_solucao(modelo, heuristica["abertas"], heuristica["atribuicao"]) if usar_inicial else None,
+                )
+                diagnostico.fase("extracao")
+                if vetor is not None:
+                    abertas, atribuicao = decodificar(modelo, vetor)
+            else:
+                if not usar_inicial:
+                    nome_solver, solver = criar_solver_pulp(config_solver)
+                print(f"Solver: {nome_solver}")
+                prob.solve(solver)
+                diagnostico.fase("extracao")
+
+                status = LpStatus[prob.status]
+                if status == "Optimal":
+                    objective_value = value(prob.objective)
+                    # Solução lida uma vez para arrays: facility de cada localidade pelos pares usados
+                    valores_x = valores_variaveis(variaveis_x)
+                    abertas = np.flatnonzero(valores_variaveis([y[j] for j in range(len(Fn))]) > 0.5)
+                    usados = valores_x > 0.5
+                    atribuicao = np.full(l, -1, dtype=np.int64)
+                    atribuicao[alocacao_i[usados]] = alocacao_j[usados]
+
+                    if logging.getLogger().isEnabledFor(logging.DEBUG):
+                        alocadas = atribuicao >= 0
+                        cargas = np.bincount(atribuicao[alocadas], weights=p[alocadas], minlength=f)
+                        logging.debug("facilities abertas: %s", abertas.tolist())
+                        logging.debug("alocacoes (localidade, facility): %s",
+                                      list(zip(alocacao_i[usados].tolist(), alocacao_j[usados].tolist())))
+                        logging.debug("cargas das facilities: %s", cargas.tolist())
+
+            # Desagregação: cada localidade volta com a facility do seu ponto (ou uma aberta mais
+            # próxima) e o objetivo é recalculado sobre as localidades originais
+            if agregacao is not None:
+                diagnostico.fase("agregacao")
+                d_max_agregado = inst.get("d_max")
+                inst = original
+                status_agregado = status
+                if status in STATUS_COM_SOLUCAO:
+                    atribuicao_representantes = np.asarray(atribuicao, dtype=np.int64)[grupos]
+                    atribuicao, objetivo_desagregado = desagregar(inst, grupos, abertas, atribuicao)
+                    agregacao["objetivo_agregado"] = objective_value
+                    # O ótimo agregado não é ótimo da instância original
+                    status = "Feasible"
+                    if flag_problema == 1:
+                        # Sem capacidade ativa e com o mesmo d_max, ótimo original >= limitante agregado - limite_erro
+                        limitante_agregado = lagrangiana["lower_bound"] if lagrangiana is not None else None
+                        if status_agregado == "Optimal":
+                            limitante_agregado = max(limitante_agregado or -np.inf, objective_value)
+                        objective_value = objetivo_desagregado
+                        if limitante_agregado is not None and limitante_valido(
+                                inst, d_max_agregado, abertas, [atribuicao_representantes, atribuicao]):
+                            agregacao["lower_bound"] = limitante_agregado - agregacao["limite_erro"]
+                            agregacao["gap"] = gap_relativo(agregacao["lower_bound"], objective_value)
 
             termino = time.time()
             tempo_execucao = termino - inicio
-            status = LpStatus[prob.status]
-
-            resultados = {"status": status}
-            if status == "Optimal":
-                objective_value = value(prob.objective)
-                
-
-                centros_utilizados = []
-                centros_fixos = []
-
-
-                for j in range(len(Ff)):
-                        centros_fixos.append([Ff[j]])
-                
-                offset = len(Ff)
-                for j in range(len(Fn)):
-                    if abs(y[j].varValue - 1) <= 0.1:
-                        centros_utilizados.append([j + offset, Fn[j]])
 
+            diagnostico.fase("resultados")
 
-                # Verificação para evitar duplicação de índices
-                print("Centros não fixos:", centros_utilizados)
-                print("Centros fixos com índices ajustados:", centros_fixos)
-                alocacoes_utilizadas = []
-                for i in range(l):
-                    for j in range(f):
-                        if abs(x[i][j].varValue - 1) <= 0.1:
-                            if j < len(Ff): 
-                                alocacoes_utilizadas.append({
-                                    "localidade": dados["localidades"][i]["codigo"],
-                                    "centro": codigo_cnes[j]
-                                })
-                            else:  
-                                alocacoes_utilizadas.append({
-                                    "localidade": dados["localidades"][i]["codigo"],
-                                    "centro": dados["facilities"][j - len(Ff)]["coordenada"]
-                                })
-              
-                          
-
-
-                problema = "min_dist" if flag_problema == 1 else "min_custo"
-                resultados.update({
-                    "tipo_problema": problema,
-                    "tempo_execucao": tempo_execucao,
-                    problema: objective_value,
-                    "num_centros": k,
-                    "orcamento": c_max,
-                    "metricas": nome_metricas,
-                    "prioridades": lambdas,
-                    "alocacoes": alocacoes_utilizadas,
-                    "centros_adicionados": centros_utilizados,
-                    "centros_fixos": [{"centro": coord, "codigo_cnes": codigo_cnes} for coord, codigo_cnes in zip(centros_fixos, codigo_cnes)],
-                })
+            if status in STATUS_COM_SOLUCAO:
+                if modo == "avaliacao":
+                    # num_centros da saída: as fixas e as novas efetivamente abertas
+                    inst["k"] = len(inst["Ff"]) + len(abertas)
+                resultados = montar_resultados(inst, status, objective_value, tempo_execucao, abertas, atribuicao)
+                print("Centros não fixos:", (len(inst["Ff"]) + np.asarray(abertas)).tolist())
+            else:
+                resultados = {"status": status}
+
+            if modo == "vns":
+                resultados["vns"] = info_vns
+            elif modo == "restrito":
+                resultados["restrito"] = info_restrito
+                if info_restrito["rodadas"]:
+                    diagnostico.registrar_modelo(pares=info_restrito["rodadas"][-1]["pares"], pares_total=l * f)
+            elif modo == "decomposicao":
+                resultados["decomposicao"] = info_decomposicao
+            elif modo == "avaliacao":
+                resultados["avaliacao"] = info_avaliacao
+            elif tipo_modelo == "radial":
+                resultados["radial"] = info_radial
+
+            # Certificado de qualidade da solução: limitante inferior, superior e gap relativo
+            if lagrangiana is not None:
+                lower_bound = lagrangiana["lower_bound"]
+                upper_bound = objective_value if status in STATUS_COM_SOLUCAO else None
+                if agregacao is not None:
+                    lower_bound = agregacao.get("lower_bound")
+                elif status == "Optimal":
+                    lower_bound = max(lower_bound, objective_value)
+                resultados["upper_bound"] = upper_bound
+                # Com agregação, o limitante só sai quando vale para a instância original
+                if lower_bound is not None:
+                    resultados.update({"lower_bound": lower_bound, "gap": gap_relativo(lower_bound, upper_bound)})
+                resultados["lagrangiana"] = resumo_lagrangiana(lagrangiana)
+            if agregacao is not None:
+                resultados["agregacao"] = agregacao
+            if heuristica is not None:
+                resultados["heuristica"] = {"objetivo": heuristica["objetivo"], "tempo": heuristica["tempo"]}
+            if modo == "exato":
+                resultados["warm_start"] = usar_inicial and aceita_inicial
+            if cache.ativo:
+                resultados["cache"] = {"acerto": False, "chave": cache.chave, "inicial_cache": inicial_cache}
             
         except Exception as e:
             raise ValueError(f"Erro ao resolver o problema de otimizacao: {e}")
         
-        with open(saida, 'w', encoding='utf-8') as saidas:
-                json.dump(resultados, saidas, indent=4)
+        diagnostico.fase("escrita")
+        resultados["diagnostico"] = diagnostico.resumo()
+        gravar_resultados(resultados, saida)
+        cache.guardar(resultados, abertas if status in STATUS_COM_SOLUCAO else None,
+                      atribuicao if status in STATUS_COM_SOLUCAO else None)
 
     except Exception as e:
         resultados = {"status": "Erro", "mensagem": str(e)}
-        with open(saida, 'w', encoding='utf-8') as saidas:
-            json.dump(resultados, saidas, indent=4)
+        diagnostico.fase("escrita")
+        resultados["diagnostico"] = diagnostico.resumo()
+        gravar_resultados(resultados, saida)
 
-    
-    
-    if resultados.get("status") == "Optimal":
-        alocacoes_utilizadas = resultados["alocacoes"]
-        centros_utilizados = resultados["centros_adicionados"]
-        centros_fixos = resultados["centros_fixos"]
-
-        plt.figure(figsize=(12, 10))
-
-        # Plotagem das localidades
-        for idx, (lat, lon) in enumerate(L):
-            plt.scatter(lon, lat, color='blue', s=50, edgecolors='black', label='Localidades' if idx == 0 else "")
-            plt.text(lon, lat, f'L{idx}', fontsize=12, ha='right')
-
-        # Plotagem de facilities novas
-        if centros_utilizados:
-            for cf in centros_utilizados:
-                lat, lon, idx = extrair_coord(cf)
-                plt.scatter(lon, lat, color='green', marker='^', s=100, edgecolors='black',
-                            label='Facilities Novas' if cf == centros_utilizados[0] else "")
-                if idx is not None:
-                    plt.text(lon, lat, f'F{idx}', fontsize=12, ha='right')
-
-        # Plotagem de facilities fixas
-        if centros_fixos:
-            for cf in centros_fixos:
-                lat, lon, idx = extrair_coord(cf)
-                plt.scatter(lon, lat, color='red', marker='s', s=100, edgecolors='black',
-                            label='Facilities Fixas' if cf == centros_fixos[0] else "")
-                if idx is not None:
-                    plt.text(lon, lat, f'F{idx}', fontsize=12, ha='right')
-
-        # Remover duplicatas das legendas
-        handles, labels = plt.gca().get_legend_handles_labels()
-        by_label = dict(zip(labels, handles))
-        plt.legend(by_label.values(), by_label.keys())
-
-        # Conectar alocações com linhas
-        for localidade_idx, facility_idx in alocacoes_utilizadas:
-            # ───── normaliza índices de localidade ─────
-            try:
-                localidade_idx = int(localidade_idx)
-            except ValueError:
-                continue            # pula se não for um inteiro (IBGE em string)
-
-            # idem para facility; pode não estar na lista F
-            try:
-                facility_idx = int(facility_idx)
-            except ValueError:
-                continue            # pula se for CNES/coord fora de F
-
-            localidade_coord = L[localidade_idx]
-            facility_coord   = F[facility_idx]
-            plt.plot([localidade_coord[1], facility_coord[1]],
-                    [localidade_coord[0], facility_coord[0]],
-                    linestyle='-', color='gray', alpha=0.5)
-
-        plt.xlabel('Longitude')
-        plt.ylabel('Latitude')
-        plt.title('Alocações de Facilities')
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig(f'{saida}.png')
-        plt.show()
-    else:
-        print("Nenhuma alocação encontrada ou status não é Ótimo. Nenhum gráfico será gerado.")
-
-
-
-    if resultados.get("status") == "Optimal":
-        centros_utilizados = resultados["centros_adicionados"]
-        centros_fixos = resultados["centros_fixos"]
-
-        plt.figure(figsize=(12, 10))
-
-        # Plotagem de facilities novas
-        if centros_utilizados:
-            for cf in centros_utilizados:
-                lat, lon, idx = extrair_coord(cf)
-                plt.scatter(lon, lat, color='green', marker='^', s=100, edgecolors='black',
-                            label='Facilities Novas' if cf == centros_utilizados[0] else "")
-                if idx is not None:
-                    plt.text(lon, lat, f'F{idx}', fontsize=12, ha='right')
-
-        # Plotagem de facilities fixas
-        if centros_fixos:
-            for cf in centros_fixos:
-                lat, lon, idx = extrair_coord(cf)
-                plt.scatter(lon, lat, color='red', marker='s', s=100, edgecolors='black',
-                            label='Facilities Fixas' if cf == centros_fixos[0] else "")
-                if idx is not None:
-                    plt.text(lon, lat, f'F{idx}', fontsize=12, ha='right')
-
-        # Remover duplicatas das legendas
-        handles, labels = plt.gca().get_legend_handles_labels()
-        by_label = dict(zip(labels, handles))
-        plt.legend(by_label.values(), by_label.keys())
-
-        plt.xlabel('Longitude')
-        plt.ylabel('Latitude')
-        plt.title('Posição das Facilities')
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig(f'{saida}_facilities.png')
-    else:
-        print("Nenhuma alocação encontrada ou status não é Ótimo. Nenhum gráfico será gerado.")
 
+    # Gráficos são opcionais ("gerar_graficos": true) e não atrasam a escrita do resultado
+    if gerar_graficos and resultados.get("status") in STATUS_COM_SOLUCAO:
+        diagnostico.fase("graficos")
+        plotar_resultados(inst, abertas, atribuicao, saida)
+    diagnostico.encerrar()
+
+    return resultados
 
 
 if __name__ == "__main__":
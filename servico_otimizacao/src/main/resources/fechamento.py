@@ -0,0 +1,156 @@
+"""
+Impacto do fechamento de cada facility fixa (CNES) do facility_v4: para cada uma, quanto
+aumenta a distância ponderada e quais localidades e cargas passam para outras unidades se ela
+fechar, com as demais mantidas. Grava a tabela ordenada do maior para o menor impacto.
+
+Entrada: a do facility_v4 com o campo
+    "fechamento": {"abertas": [3, 17], "localidades": true}
+- abertas: facilities novas abertas junto com as fixas (índices em Fn ou coordenadas, como no
+  modo "avaliacao"); padrão: nenhuma.
+- localidades: inclui em cada linha os códigos das localidades realocadas.
+
+Cada localidade é atendida pela facility aberta mais próxima; ao fechar a sua, passa para a
+segunda mais próxima. Com a mais próxima e a segunda de cada localidade calculadas uma vez
+sobre a matriz de distâncias, a tabela inteira sai de somas por facility (bincount), sem
+resolver um modelo por fechamento. A capacidade não é imposta: receptoras novas que passariam
+da capacidade são marcadas em "capacidade_excedida".
+
+Uso:
+    python fechamento.py entrada.json saida.json
+"""
+import sys
+import time
+
+import numpy as np
+
+from instancia import preparar_instancia, calcular_distancias
+from leitura import ler_entrada
+from escrita import gravar_resultados
+from atribuicao import indices_abertas
+
+OPCOES_PADRAO = {
+    "abertas": [],        # facilities novas abertas além das fixas
+    "localidades": True,  # códigos das localidades realocadas em cada linha
+}
+
+
+def duas_mais_proximas(d, usadas):
+    """
+    Para cada localidade, a facility aberta mais próxima e a segunda mais próxima (índices
+    em F) e as distâncias até elas, entre as colunas `usadas` de d.
+    """
+    sub = d[:, usadas]
+    duas = np.argpartition(sub, 1, axis=1)[:, :2]
+    linhas = np.arange(len(sub))
+    a, b = sub[linhas, duas[:, 0]], sub[linhas, duas[:, 1]]
+    troca = b < a
+    primeira = np.where(troca, duas[:, 1], duas[:, 0])
+    segunda = np.where(troca, duas[:, 0], duas[:, 1])
+    return usadas[primeira], np.minimum(a, b), usadas[segunda], np.maximum(a, b)
+
+
+def impactos_fechamento(inst, abertas=(), incluir_localidades=True):
+    """
+    Tabela de impacto do fechamento de cada facility fixa, ordenada pelo aumento da
+    distância ponderada. Usa inst["d"] e inst["d_max"] (calcular_distancias).
+    """
+    nf, f = len(inst["Ff"]), len(inst["F"])
+    if nf == 0:
+        raise ValueError("Nenhuma facility fixa para analisar.")
+    usadas = np.concatenate([np.arange(nf), nf + np.asarray(abertas, dtype=np.int64)])
+    if len(usadas) < 2:
+        raise ValueError("A análise de fechamento exige ao menos duas facilities abertas.")
+
+    w, p = inst["w"], inst["p"]
+    perto, d1, segunda, d2 = duas_mais_proximas(inst["d"], usadas)
+    objetivo_base = float(np.dot(w, d1))
+    carga = np.bincount(perto, weights=p, minlength=f)
+
+    aumento = np.bincount(perto, weights=w * (d2 - d1), minlength=f)
+    realocadas = np.bincount(perto, minlength=f)
+    sem_cobertura = np.bincount(perto, weights=d2 > inst["d_max"], minlength=f).astype(np.int64)
+
+    # Receptoras de cada facility: pares (mais próxima, segunda) com a população transferida
+    pares, inverso = np.unique(perto * f + segunda, return_inverse=True)
+    recebida = np.bincount(inverso, weights=p)
+    origem, destino = pares // f, pares % f
+    inicio_origem = np.searchsorted(origem, np.arange(f + 1))
+
+    por_facility = np.argsort(perto, kind="stable")
+    inicio_localidades = np.searchsorted(perto[por_facility], np.arange(f + 1))
+    cap_f = np.concatenate([np.full(nf, np.inf), inst["cap"]])
+
+    tabela = []
+    for j in np.argsort(-aumento[:nf], kind="stable").tolist():
+        receptoras = []
+        for r in range(inicio_origem[j], inicio_origem[j + 1]):
+            k = int(destino[r])
+            carga_final = float(carga[k] + recebida[r])
+            receptoras.append({
+                "centro": k,
+                "coordenada": inst["F"][k].tolist(),
+                "codigo_cnes": inst["codigo_cnes"][k] if k < nf else None,
+                "populacao_recebida": float(recebida[r]),
+                "carga_final": carga_final,
+                "capacidade_excedida": bool(carga_final > cap_f[k]),
+            })
+        receptoras.sort(key=lambda receptora: -receptora["populacao_recebida"])
+        linha = {
+            "posicao": len(tabela) + 1,
+            "centro": j,
+            "codigo_cnes": inst["codigo_cnes"][j],
+            "coordenada": inst["F"][j].tolist(),
+            "aumento_objetivo": float(aumento[j]),
+            "aumento_relativo": float(aumento[j] / objetivo_base) if objetivo_base > 0 else None,
+            "localidades_realocadas": int(realocadas[j]),
+            "populacao_realocada": float(carga[j]),
+            "sem_cobertura": int(sem_cobertura[j]),
+            "capacidade_excedida": any(receptora["capacidade_excedida"] for receptora in receptoras),
+            "receptoras": receptoras,
+        }
+        if incluir_localidades:
+            localidades = por_facility[inicio_localidades[j]:inicio_localidades[j + 1]]
+            linha["localidades"] = [inst["codigos"][i] for i in localidades.tolist()]
+        tabela.append(linha)
+    return objetivo_base, carga, tabela
+
+
+def executar_fechamento(dados, saida):
+    """
+    Lê a instância, calcula o impacto do fechamento de cada facility fixa e grava a tabela
+    em `saida`.
+    """
+    inicio = time.time()
+    opcoes = dict(OPCOES_PADRAO)
+    if isinstance(dados.get("fechamento"), dict):
+        desconhecidas = set(dados["fechamento"]) - set(OPCOES_PADRAO)
+        if desconhecidas:
+            raise ValueError(f"Parâmetros do fechamento desconhecidos: {sorted(desconhecidas)}")
+        opcoes.update(dados["fechamento"])
+
+    inst = preparar_instancia(dados)
+    calcular_distancias(inst)
+    abertas = indices_abertas(inst, opcoes["abertas"])
+    objetivo_base, carga, tabela = impactos_fechamento(inst, abertas, opcoes["localidades"])
+
+    nf = len(inst["Ff"])
+    resultados = {
+        "status": "Concluido",
+        "tipo_problema": "min_dist",
+        "tempo_execucao": time.time() - inicio,
+        "min_dist": objetivo_base,
+        "centros_abertos": nf + len(abertas),
+        "cargas": {"centro": (np.flatnonzero(carga > 0)).tolist(), "carga": carga[carga > 0].tolist()},
+        "fechamentos": tabela,
+    }
+    print(f"Fechamento: {nf} facilities fixas analisadas em {resultados['tempo_execucao']:.2f} s")
+    gravar_resultados(resultados, saida)
+    return resultados
+
+
+def main():
+    executar_fechamento(ler_entrada(sys.argv[1]), sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ import pandas as pd
 from shapely.geometry import Polygon
 import random
 
+from leitura import gravar_npz
+
 # Selecionar a cidade
 cidade = 'Garanhuns'
 
@@ -251,6 +253,9 @@ saida = f'dados_{cidade}.json'
 with open(saida, 'w') as json_file:
     json.dump(json_data, json_file, indent=4)
 
+# Mesma entrada no formato colunar, lido pelo otimizador sem parsing (mapeado em memória)
+gravar_npz(json_data, f'dados_{cidade}.npz')
+
 # Adicionar marcadores para localidades
 for localidade in dados_setores:
     folium.Marker(
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def plotar_resultados(inst, abertas, atribuicao, saida, rotulos=False):
+    """
+    Gera {saida}.png (localidades, facilities e alocações) e {saida}_facilities.png (só as
+    facilities) com o backend Agg, sem janela e sem estado global do pyplot.
+
+    Cada classe de ponto é desenhada com um único scatter e todas as alocações com uma única
+    LineCollection; a mesma figura é reaproveitada para as duas imagens. Com rotulos=True
+    os índices L{i} / F{j} são escritos ao lado dos pontos (útil só em instâncias pequenas).
+    """
+    # Importação tardia: o matplotlib só é carregado quando há gráfico a gerar
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+
+    L, Ff, Fn, F = inst["L"], inst["Ff"], inst["Fn"], inst["F"]
+    abertas = np.asarray(abertas, dtype=np.int64)
+    atribuicao = np.asarray(atribuicao, dtype=np.int64)
+    offset = len(Ff)
+
+    fig = Figure(figsize=(12, 10))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    # Alocações: segmentos (lon, lat) localidade -> facility
+    alocadas = np.flatnonzero(atribuicao >= 0)
+    segmentos = np.stack([L[alocadas][:, ::-1], F[atribuicao[alocadas]][:, ::-1]], axis=1)
+    linhas = ax.add_collection(LineCollection(segmentos, colors='gray', alpha=0.5, linestyles='-'))
+
+    localidades = ax.scatter(L[:, 1], L[:, 0], color='blue', s=50, edgecolors='black', label='Localidades')
+    if len(abertas):
+        ax.scatter(Fn[abertas, 1], Fn[abertas, 0], color='green', marker='^', s=100, edgecolors='black',
+                   label='Facilities Novas')
+    if len(Ff):
+        ax.scatter(Ff[:, 1], Ff[:, 0], color='red', marker='s', s=100, edgecolors='black',
+                   label='Facilities Fixas')
+
+    textos = []
+    if rotulos:
+        for idx, (lat, lon) in enumerate(L):
+            textos.append(ax.text(lon, lat, f'L{idx}', fontsize=12, ha='right'))
+        for j in list(range(offset)) + (abertas + offset).tolist():
+            ax.text(F[j, 1], F[j, 0], f'F{j}', fontsize=12, ha='right')
+
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    ax.set_title('Alocações de Facilities')
+    ax.grid(True)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(f'{saida}.png')
+
+    # Mesma figura, sem localidades e alocações
+    linhas.remove()
+    localidades.remove()
+    for texto in textos:
+        texto.remove()
+    ax.set_title('Posição das Facilities')
+    ax.legend()
+    ax.relim()
+    ax.autoscale_view()
+    fig.savefig(f'{saida}_facilities.png')
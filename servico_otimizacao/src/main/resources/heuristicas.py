@@ -0,0 +1,182 @@
+import time
+
+import numpy as np
+from scipy import sparse
+
+
+def matriz_custos(inst):
+    """
+    Custo w_i * d_ij de alocar cada localidade em cada facility de F. Pares com d > d_max
+    recebem uma penalidade maior que o custo de qualquer solução viável.
+    """
+    custos = inst["w"][:, None] * inst["d"]
+    viaveis = inst["d"] <= inst["d_max"]
+    maior = float(custos[viaveis].max()) if viaveis.any() else 0.0
+    penalidade = (maior + 1) * (len(custos) + 1)
+    return np.where(viaveis, custos, penalidade), penalidade
+
+
+def _mais_proximas(custos, abertas_f):
+    """
+    Para cada localidade, retorna (c1, c2, perto): menor e segundo menor custo entre as
+    facilities abertas (índices em F) e o índice em F da mais próxima.
+    """
+    sub = custos[:, abertas_f]
+    if sub.shape[1] == 1:
+        return sub[:, 0], np.full(len(sub), np.inf), np.full(len(sub), abertas_f[0])
+    duas = np.argpartition(sub, 1, axis=1)[:, :2]
+    linhas = np.arange(len(sub))
+    a, b = sub[linhas, duas[:, 0]], sub[linhas, duas[:, 1]]
+    troca = b < a
+    primeiro = np.where(troca, duas[:, 1], duas[:, 0])
+    return np.minimum(a, b), np.maximum(a, b), abertas_f[primeiro]
+
+
+def guloso(custos, nf, p, iniciais=None):
+    """
+    Adição gulosa: parte das nf facilities fixas (colunas iniciais de custos) e abre, uma a
+    uma, as p facilities novas que mais reduzem o custo total. Com `iniciais` (índices em F de
+    facilities novas já abertas), abre só as que faltam para p. Retorna índices em F.
+    """
+    l, f = custos.shape
+    abertas = list(range(nf)) + ([] if iniciais is None else [int(j) for j in iniciais])
+    atual = custos[:, abertas].min(axis=1) if abertas else np.full(l, np.inf)
+    candidatas = np.setdiff1d(np.arange(nf, f), abertas)
+    for _ in range(p - (len(abertas) - nf)):
+        total = np.minimum(atual[:, None], custos[:, candidatas]).sum(axis=0)
+        melhor = int(np.argmin(total))
+        j = candidatas[melhor]
+        abertas.append(int(j))
+        atual = np.minimum(atual, custos[:, j])
+        candidatas = np.delete(candidatas, melhor)
+    return np.array(abertas, dtype=np.int64)
+
+
+def remocao_gulosa(custos, nf, abertas_f, p):
+    """
+    Fecha, uma a uma, a facility nova aberta cuja saída menos aumenta o custo (localidades
+    passam para a segunda mais próxima) até restarem p novas. Retorna índices em F.
+    """
+    abertas_f = np.array(abertas_f, dtype=np.int64)
+    while (abertas_f >= nf).sum() > p:
+        c1, c2, perto = _mais_proximas(custos, abertas_f)
+        perda = np.bincount(perto, weights=c2 - c1, minlength=custos.shape[1])
+        removiveis = abertas_f[abertas_f >= nf]
+        abertas_f = abertas_f[abertas_f != removiveis[np.argmin(perda[removiveis])]]
+    return abertas_f
+
+
+def troca_rapida(custos, nf, abertas_f, max_iteracoes=10000, tolerancia=1e-9):
+    """
+    Melhoria por trocas (Teitz–Bart com a avaliação rápida de Whitaker): a cada iteração
+    avalia de uma vez todas as trocas (entra facility nova fechada, sai facility nova aberta)
+    usando a mais próxima e a segunda mais próxima de cada localidade e aplica a melhor.
+    As nf facilities fixas nunca saem. Retorna os índices em F das facilities abertas.
+    """
+    l, f = custos.shape
+    abertas_f = np.array(abertas_f, dtype=np.int64)
+    for _ in range(max_iteracoes):
+        removiveis = abertas_f[abertas_f >= nf]
+        fechadas = np.setdiff1d(np.arange(nf, f), abertas_f)
+        if len(removiveis) == 0 or len(fechadas) == 0:
+            break
+
+        c1, c2, perto = _mais_proximas(custos, abertas_f)
+        entra = custos[:, fechadas]
+
+        # Ganho de abrir cada candidata (localidades que passam para ela)
+        ganho = np.maximum(c1[:, None] - entra, 0).sum(axis=0)
+
+        # Perda de fechar cada aberta: localidades que não migram para a candidata vão para
+        # min(candidata, segunda mais próxima)
+        perda_local = np.where(entra >= c1[:, None], np.minimum(entra, c2[:, None]) - c1[:, None], 0)
+        posicao = np.full(f, -1, dtype=np.int64)
+        posicao[removiveis] = np.arange(len(removiveis))
+        dono = posicao[perto]
+        validas = dono >= 0
+        indicadora = sparse.csr_matrix(
+            (np.ones(validas.sum()), (np.flatnonzero(validas), dono[validas])),
+            shape=(l, len(removiveis)),
+        )
+        perda = np.asarray((indicadora.T @ perda_local).T)
+
+        delta = perda - ganho[:, None]
+        melhor = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[melhor] >= -tolerancia:
+            break
+        abertas_f[abertas_f == removiveis[melhor[1]]] = fechadas[melhor[0]]
+    return np.sort(abertas_f)
+
+
+def atribuir(custos, abertas_f, p=None, cap_f=None):
+    """
+    Atribui cada localidade à facility aberta de menor custo. Com capacidades (cap_f indexado
+    por F), as localidades são atendidas em ordem decrescente de arrependimento (segunda
+    melhor menos melhor opção) e vão para a opção mais barata que ainda comporta p_i.
+    Retorna o índice em F de cada localidade (-1 se nenhuma aberta comportar).
+    """
+    abertas_f = np.asarray(abertas_f, dtype=np.int64)
+    sub = custos[:, abertas_f]
+    atribuicao = abertas_f[np.argmin(sub, axis=1)]
+    if cap_f is None:
+        return atribuicao
+
+    carga = np.bincount(atribuicao, weights=p, minlength=len(cap_f))
+    if (carga <= cap_f).all():
+        return atribuicao
+
+    ordem_custos = np.argsort(sub, axis=1)
+    if sub.shape[1] > 1:
+        melhores = np.take_along_axis(sub, ordem_custos[:, :2], axis=1)
+        arrependimento = melhores[:, 1] - melhores[:, 0]
+    else:
+        arrependimento = np.zeros(len(sub))
+
+    residual = np.asarray(cap_f, dtype=np.float64).copy()
+    atribuicao = np.full(len(sub), -1, dtype=np.int64)
+    for i in np.argsort(-arrependimento, kind="stable"):
+        for opcao in ordem_custos[i]:
+            j = abertas_f[opcao]
+            if residual[j] >= p[i]:
+                atribuicao[i] = j
+                residual[j] -= p[i]
+                break
+    return atribuicao
+
+
+def heuristica_inicial(inst, abertas_iniciais=None):
+    """
+    Solução inicial para o p-median do facility_v4 (tipo_problema 1): adição gulosa sobre as
+    facilities fixas, trocas rápidas e, se alguma capacidade for excedida, reatribuição
+    gulosa por arrependimento. Com `abertas_iniciais` (índices em Fn, por exemplo de uma
+    solução guardada com outro k), parte delas, fechando ou abrindo gulosamente até k.
+
+    Retorna um dicionário com abertas (índices em Fn), atribuicao (índice em F de cada
+    localidade), objetivo (ou None se a solução não for viável) e tempo.
+    """
+    inicio = time.time()
+    nf = len(inst["Ff"])
+    custos, penalidade = matriz_custos(inst)
+
+    if abertas_iniciais is None:
+        abertas_f = guloso(custos, nf, inst["k"] - nf)
+    else:
+        iniciais = np.concatenate([np.arange(nf), nf + np.unique(np.asarray(abertas_iniciais, dtype=np.int64))])
+        iniciais = remocao_gulosa(custos, nf, iniciais, inst["k"] - nf)
+        abertas_f = guloso(custos, nf, inst["k"] - nf, iniciais[iniciais >= nf])
+    abertas_f = troca_rapida(custos, nf, abertas_f)
+
+    # As facilities fixas não têm restrição de capacidade no modelo
+    cap_f = np.concatenate([np.full(nf, np.inf), inst["cap"]])
+    atribuicao = atribuir(custos, abertas_f, inst["p"], cap_f)
+
+    linhas = np.arange(len(atribuicao))
+    viavel = bool((atribuicao >= 0).all()) and bool((custos[linhas, atribuicao] < penalidade).all())
+    objetivo = float(np.dot(inst["w"], inst["d"][linhas, atribuicao])) if viavel else None
+
+    return {
+        "abertas": abertas_f[abertas_f >= nf] - nf,
+        "atribuicao": atribuicao,
+        "objetivo": objetivo,
+        "tempo": time.time() - inicio,
+    }
@@ -0,0 +1,191 @@
+from array import array
+
+import numpy as np
+
+from distancias import matriz_distancias
+from cache_distancias import matriz_distancias_cache
+from avaliacao import opcoes_estatisticas
+
+# Valores fixos usados pelo facility_v4
+CAPACIDADE_PADRAO = 12000
+C_MAX = 100000
+
+
+def calcular_pesos(M, lambdas, flag_proporcao_inversa):
+    """
+    Calcula w_i = sum_j lambda_j * M_ij, invertendo as métricas marcadas em flag_proporcao_inversa.
+    """
+    M = np.array(M, dtype=np.float64).reshape(len(M), -1)
+    inverter = np.asarray(flag_proporcao_inversa, dtype=bool)[None, :] & (M != 0)
+    M = np.where(inverter, 1 / np.where(M != 0, M, 1), M)
+    return M @ np.asarray(lambdas, dtype=np.float64)
+
+
+def validar_pesos(lambdas, flag_proporcao_inversa, num_metricas):
+    """
+    Valida pesos e flags de proporção inversa contra o número de métricas das localidades.
+    """
+    if lambdas is None:
+        raise ValueError("Pesos não fornecidos.")
+    if len(lambdas) != num_metricas:
+        raise ValueError("Número de pesos não corresponde ao número de métricas.")
+
+    if flag_proporcao_inversa is None:
+        raise ValueError("Flag de proporção inversa não fornecida.")
+    if len(flag_proporcao_inversa) != num_metricas:
+        raise ValueError("O tamanho de flag_proporcao_inversa deve ser igual ao número de métricas.")
+    if any(f not in [0, 1] for f in flag_proporcao_inversa):
+        raise ValueError("Flag de proporção inversa deve conter apenas 0 ou 1.")
+
+
+def validar_num_centros(k, nf, nn):
+    """
+    Valida o número de centros desejados contra as nf facilities fixas e nn novas.
+    """
+    if k is None:
+        raise ValueError("Número de centros desejados não fornecido.")
+    if k < nf:
+        raise ValueError("Número de centros desejados não pode ser menor que o número de centros que já existem.")
+    if k > nf + nn:
+        raise ValueError("Número de centros disponíveis é menor que o número de centros desejados.")
+
+
+class Colunas:
+    """
+    Acumula localidades e facilities do JSON de entrada, uma de cada vez, em arrays tipados
+    (uma única passada; a leitura incremental não precisa manter a lista de dicionários).
+    """
+
+    def __init__(self):
+        self.L, self.M, self.p = array("d"), array("d"), array("d")
+        self.codigos = []
+        self.Ff, self.Fn, self.c = array("d"), array("d"), array("d")
+        self.codigo_cnes = []
+        self.num_metricas = None
+
+    def adicionar_localidade(self, loc):
+        # Localidades com o campo "fixed" são facilities misturadas na lista e ficam de fora
+        if "fixed" in loc:
+            return
+        metricas = loc["metricas"]
+        if self.num_metricas is None:
+            self.num_metricas = len(metricas)
+        elif len(metricas) != self.num_metricas:
+            raise ValueError("Todas as localidades devem ter o mesmo número de métricas.")
+        self.L.extend(loc["coordenada"][:2])
+        self.M.extend(metricas)
+        self.p.append(loc["total_moradores"])
+        self.codigos.append(loc.get("codigo"))
+
+    def adicionar_facility(self, fac):
+        if fac.get("fixed") is True:
+            self.Ff.extend(fac["coordenada"][:2])
+            self.codigo_cnes.append(fac.get("codigo_cnes"))
+        elif fac.get("fixed") is False:
+            self.Fn.extend(fac["coordenada"][:2])
+            self.c.append(fac.get("custo", 0))
+
+    def arrays(self):
+        """
+        Dicionário de colunas aceito por preparar_instancia (campo "colunas" da entrada).
+        """
+        return {
+            "L": np.frombuffer(self.L, dtype=np.float64).reshape(-1, 2),
+            "M": np.frombuffer(self.M, dtype=np.float64).reshape(len(self.p), self.num_metricas or 0),
+            "p": np.frombuffer(self.p, dtype=np.float64),
+            "codigos": self.codigos,
+            "Ff": np.frombuffer(self.Ff, dtype=np.float64).reshape(-1, 2),
+            "Fn": np.frombuffer(self.Fn, dtype=np.float64).reshape(-1, 2),
+            "c": np.frombuffer(self.c, dtype=np.float64),
+            "codigo_cnes": self.codigo_cnes,
+        }
+
+
+def colunas_entrada(dados):
+    """
+    Colunas da entrada: as já prontas em dados["colunas"] (leitura incremental ou .npz) ou
+    as extraídas, numa passada, das listas "localidades" e "facilities".
+    """
+    if "colunas" in dados:
+        return dados["colunas"]
+    colunas = Colunas()
+    for loc in dados["localidades"]:
+        colunas.adicionar_localidade(loc)
+    for fac in dados["facilities"]:
+        colunas.adicionar_facility(fac)
+    return colunas.arrays()
+
+
+def preparar_instancia(dados, exigir_k=True):
+    """
+    Extrai do JSON de entrada do facility_v4 os dados do problema como arrays NumPy.
+
+    Retorna um dicionário com L, Ff, Fn, F (coordenadas), w, p, c, cap, k, flag_problema,
+    códigos das localidades e CNES das facilities fixas. As distâncias são calculadas
+    à parte por calcular_distancias. Com exigir_k=False (varredura de k) o
+    num_centros_desejado pode faltar e k fica None.
+    """
+    k = dados.get("num_centros_desejado")  # Número de centros desejados (já existentes incluso)
+
+    flag_problema = dados.get("tipo_problema")  # 1: minimizar distância ponderada, 2: minimizar custo
+    if flag_problema not in [1, 2]:
+        raise ValueError("Flag invalida. Deve ser 1 ou 2.")
+
+    colunas = colunas_entrada(dados)
+    L, Ff, Fn, M = colunas["L"], colunas["Ff"], colunas["Fn"], colunas["M"]
+    if len(M) == 0:
+        raise ValueError("Nenhuma localidade fornecida.")
+
+    lambdas = dados.get("pesos", None)
+    flag_proporcao_inversa = dados.get("proporcao_inversa", None)
+    validar_pesos(lambdas, flag_proporcao_inversa, M.shape[1])
+    if k is not None or exigir_k:
+        validar_num_centros(k, len(Ff), len(Fn))
+
+    formato_saida = dados.get("formato_saida", "verboso")
+    if formato_saida not in ["verboso", "compacto", "binario"]:
+        raise ValueError("Formato de saída inválido. Deve ser 'verboso', 'compacto' ou 'binario'.")
+
+    return {
+        "k": k,
+        "flag_problema": flag_problema,
+        "L": L,
+        "Ff": Ff,
+        "Fn": Fn,
+        "F": np.vstack([Ff, Fn]),
+        "codigos": list(colunas["codigos"]),
+        "codigo_cnes": list(colunas["codigo_cnes"]),
+        "w": calcular_pesos(M, lambdas, flag_proporcao_inversa),
+        "p": colunas["p"],
+        "c": colunas["c"],
+        "cap": np.full(len(Fn), CAPACIDADE_PADRAO, dtype=np.float64),
+        "c_max": C_MAX,
+        "nome_metricas": dados.get("nome_metricas", None),
+        "lambdas": lambdas,
+        "M": M,
+        "proporcao_inversa": flag_proporcao_inversa,
+        "metrica_distancia": dados.get("metrica_distancia", "cosseno"),
+        "cache_distancias": dados.get("cache_distancias", True),
+        "formato_saida": formato_saida,
+        "estatisticas": opcoes_estatisticas(dados.get("estatisticas")),
+    }
+
+
+def calcular_distancias(inst):
+    """
+    Preenche inst["d"] (matriz l x f em relação a F = Ff + Fn) e inst["d_max"], a maior
+    distância de uma localidade à sua facility mais próxima.
+
+    Com inst["cache_distancias"] a matriz vem do cache em disco (só leitura, mapeada em
+    memória) e inst["origem_distancias"] indica se foi lida, completada ou calculada.
+    """
+    metrica = inst["metrica_distancia"]
+    casas_decimais = None if metrica == "euclidiana" else 2
+    if inst.get("cache_distancias"):
+        d, inst["origem_distancias"] = matriz_distancias_cache(inst["L"], inst["F"], metrica, casas_decimais)
+    else:
+        d = matriz_distancias(inst["L"], inst["F"], metrica=metrica, casas_decimais=casas_decimais)
+        inst["origem_distancias"] = "calculada"
+    inst["d"] = d
+    inst["d_max"] = float(d.min(axis=1).max()) if d.size else 0
+    return d
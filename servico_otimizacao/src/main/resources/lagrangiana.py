@@ -0,0 +1,167 @@
+import time
+
+import numpy as np
+
+from modelo_matricial import pares_viaveis
+
+
+def _avaliar(u, pares_i, pares_j, custos, p, cap_f, nf, novas):
+    """
+    Resolve o subproblema lagrangiano para os multiplicadores u (restrições de alocação
+    relaxadas). Cada facility fixa atende toda localidade de custo reduzido negativo; cada
+    facility nova resolve uma mochila fracionária com sua capacidade e as `novas` de menor
+    valor são abertas.
+
+    Retorna (limitante, subgradiente, custos reduzidos, valor de cada facility, abertas).
+    """
+    f = len(cap_f)
+    r = custos - u[pares_i]
+    x = (r < 0).astype(np.float64)
+
+    # Mochila fracionária só nas facilities cuja demanda atraída excede a capacidade
+    carga = np.bincount(pares_j, weights=x * p[pares_i], minlength=f)
+    excedidas = carga > cap_f
+    if excedidas.any():
+        idx = np.flatnonzero((x > 0) & excedidas[pares_j])
+        pi = p[pares_i[idx]]
+        razao = np.divide(r[idx], pi, out=np.full(len(idx), -np.inf), where=pi > 0)
+        ordem = np.lexsort((razao, pares_j[idx]))
+        idx, pi, pj = idx[ordem], pi[ordem], pares_j[idx[ordem]]
+        acumulado = np.cumsum(pi)
+        inicio_grupo = np.concatenate([[True], pj[1:] != pj[:-1]])
+        anterior = acumulado - pi - np.maximum.accumulate(np.where(inicio_grupo, acumulado - pi, 0))
+        x[idx] = np.clip(np.divide(cap_f[pj] - anterior, pi, out=np.ones(len(idx)), where=pi > 0), 0, 1)
+
+    valor = np.bincount(pares_j, weights=r * x, minlength=f)
+    abertas = np.zeros(f, dtype=bool)
+    abertas[:nf] = True
+    if novas > 0:
+        abertas[nf + np.argpartition(valor[nf:], novas - 1)[:novas]] = True
+
+    limitante = float(u.sum() + valor[abertas].sum())
+    subgradiente = 1 - np.bincount(pares_i, weights=x * abertas[pares_j], minlength=len(u))
+    return limitante, subgradiente, r, valor, abertas
+
+
+def relaxacao_lagrangiana(inst, pares_i, pares_j, custos, limite_superior=None, teto=None,
+                          max_iteracoes=300, theta=2.0, paciencia=20, tolerancia=1e-4,
+                          tempo_limite=None):
+    """
+    Relaxação lagrangiana das restrições de alocação do p-median do facility_v4
+    (tipo_problema 1), otimizada por subgradiente.
+
+    pares_i, pares_j e custos (w_i * d_ij) descrevem as alocações permitidas. Se algum par
+    permitido ficou de fora (listas truncadas), teto[i] deve ser o menor custo omitido da
+    localidade i: os multiplicadores são limitados a ele e o limitante continua válido.
+
+    Com limite_superior (custo de uma solução viável), também fixa variáveis por custo
+    reduzido: pares e facilities novas que só aparecem em soluções piores que a conhecida.
+
+    Retorna um dicionário com lower_bound, multiplicadores, iteracoes, tempo, manter (máscara
+    dos pares que continuam no modelo), abertas_fixadas e fechadas_fixadas (índices em Fn).
+    """
+    inicio = time.time()
+    pares_i = np.asarray(pares_i, dtype=np.int64)
+    pares_j = np.asarray(pares_j, dtype=np.int64)
+    custos = np.asarray(custos, dtype=np.float64)
+    l, nf = len(inst["L"]), len(inst["Ff"])
+    novas = inst["k"] - nf
+    cap_f = np.concatenate([np.full(nf, np.inf), inst["cap"]])
+    argumentos = (pares_i, pares_j, custos, inst["p"], cap_f, nf, novas)
+
+    # Multiplicadores iniciais: custo da opção mais barata de cada localidade
+    u = np.full(l, np.inf)
+    np.minimum.at(u, pares_i, custos)
+    if teto is not None:
+        u = np.minimum(u, teto)
+
+    melhor, melhor_u = -np.inf, u.copy()
+    sem_melhora, iteracoes = 0, 0
+    for iteracoes in range(1, max_iteracoes + 1):
+        limitante, g, _, _, _ = _avaliar(u, *argumentos)
+        if limitante > melhor + 1e-12:
+            melhor, melhor_u, sem_melhora = limitante, u.copy(), 0
+        else:
+            sem_melhora += 1
+            if sem_melhora >= paciencia:
+                theta, sem_melhora = theta / 2, 0
+
+        norma = float(g @ g)
+        if norma == 0 or theta < 1e-4:
+            break
+        if limite_superior is not None and limite_superior - melhor <= tolerancia * abs(limite_superior):
+            break
+        if tempo_limite is not None and time.time() - inicio > tempo_limite:
+            break
+
+        alvo = limite_superior if limite_superior is not None else 1.05 * abs(limitante) + 1
+        u = u + theta * (alvo - limitante) / norma * g
+        if teto is not None:
+            u = np.minimum(u, teto)
+
+    resultado = {
+        "lower_bound": melhor,
+        "multiplicadores": melhor_u,
+        "iteracoes": iteracoes,
+        "manter": np.ones(len(pares_i), dtype=bool),
+        "abertas_fixadas": np.array([], dtype=np.int64),
+        "fechadas_fixadas": np.array([], dtype=np.int64),
+    }
+
+    if limite_superior is not None and novas > 0:
+        _, _, r, valor, abertas = _avaliar(melhor_u, *argumentos)
+        folga = limite_superior + 1e-9 * max(1.0, abs(limite_superior)) - melhor
+        valor_novas, abertas_novas = valor[nf:], abertas[nf:]
+        ultima = valor_novas[abertas_novas].max()                           # sai se outra for forçada
+        proxima = valor_novas[~abertas_novas].min() if (~abertas_novas).any() else np.inf
+
+        # Forçar a abertura (ou o fechamento) de uma facility nova troca-a por `ultima` (`proxima`)
+        fechadas_fixadas = np.flatnonzero(~abertas_novas & (valor_novas - ultima > folga))
+        abertas_fixadas = np.flatnonzero(abertas_novas & (proxima - valor_novas > folga))
+
+        # Forçar x_ij = 1 com custo reduzido positivo custa ao menos r_ij (mais a abertura de j)
+        acrescimo = np.where(r > 0, r, 0)
+        fechada = np.concatenate([np.zeros(nf, dtype=bool), ~abertas_novas])
+        acrescimo = acrescimo + np.where(fechada[pares_j], valor[pares_j] - ultima, 0)
+        manter = acrescimo <= folga
+        manter &= ~np.isin(pares_j, fechadas_fixadas + nf)
+
+        resultado.update({"manter": manter, "abertas_fixadas": abertas_fixadas,
+                          "fechadas_fixadas": fechadas_fixadas})
+
+    resultado["tempo"] = time.time() - inicio
+    return resultado
+
+
+def limitante_inferior(inst, limite_superior=None, **opcoes):
+    """
+    relaxacao_lagrangiana sobre todos os pares com d <= d_max (requer inst["d"]).
+    Retorna também pares_i e pares_j, na ordem da máscara `manter`.
+    """
+    pares_i, pares_j = pares_viaveis(inst)
+    custos = inst["w"][pares_i] * inst["d"][pares_i, pares_j]
+    resultado = relaxacao_lagrangiana(inst, pares_i, pares_j, custos, limite_superior, **opcoes)
+    resultado.update({"pares_i": pares_i, "pares_j": pares_j})
+    return resultado
+
+
+def resumo_lagrangiana(resultado):
+    """
+    Dados da relaxação que vão para a saída (sem os arrays).
+    """
+    return {
+        "iteracoes": resultado["iteracoes"],
+        "tempo": resultado["tempo"],
+        "pares_removidos": int((~resultado["manter"]).sum()),
+        "abertas_fixadas": len(resultado["abertas_fixadas"]),
+        "fechadas_fixadas": len(resultado["fechadas_fixadas"]),
+    }
+
+
+def gap_relativo(lower_bound, upper_bound):
+    """
+    Gap (upper_bound - lower_bound) / |upper_bound|, ou None sem os dois limitantes.
+    """
+    if lower_bound is None or upper_bound is None:
+        return None
+    return max(0.0, upper_bound - lower_bound) / max(abs(upper_bound), 1e-12)
@@ -0,0 +1,155 @@
+"""
+Leitura da entrada do facility_v4 direto para arrays.
+
+- .json: lido de forma incremental com o ijson (se instalado), convertendo cada localidade e
+  facility assim que termina de ser lida; sem o ijson, json.load seguido da conversão.
+- .npz: formato colunar binário gravado por gravar_npz (ou pelo gerar_dados.py); os arrays
+  são mapeados em memória direto do arquivo, sem cópia.
+
+Em ambos os casos o resultado é o dicionário da entrada com as listas "localidades" e
+"facilities" substituídas pelo campo "colunas", aceito por preparar_instancia.
+"""
+import json
+import struct
+import zipfile
+
+import numpy as np
+
+from instancia import Colunas, colunas_entrada
+
+try:
+    import ijson
+except ImportError:  # dependência opcional: sem ela o JSON é lido inteiro
+    ijson = None
+
+LISTAS = {"localidades": "adicionar_localidade", "facilities": "adicionar_facility"}
+_INICIOS, _FINS = ("start_map", "start_array"), ("end_map", "end_array")
+
+
+def _valor(primeiro, eventos):
+    """
+    Monta o valor JSON que começa no evento `primeiro`, consumindo os eventos seguintes.
+    """
+    construtor = ijson.ObjectBuilder()
+    _, evento, valor = primeiro
+    construtor.event(evento, valor)
+    profundidade = int(evento in _INICIOS)
+    while profundidade:
+        _, evento, valor = next(eventos)
+        construtor.event(evento, valor)
+        profundidade += (evento in _INICIOS) - (evento in _FINS)
+    return construtor.value
+
+
+def _ler_json_incremental(arquivo):
+    colunas = Colunas()
+    dados = {}
+    eventos = ijson.parse(arquivo, use_float=True)
+    _, evento, _ = next(eventos)
+    if evento != "start_map":
+        raise ValueError("A entrada deve ser um objeto JSON.")
+    for _, evento, chave in eventos:
+        if evento == "end_map":
+            break
+        primeiro = next(eventos)
+        if chave in LISTAS and primeiro[1] == "start_array":
+            adicionar = getattr(colunas, LISTAS[chave])
+            item = next(eventos)
+            while item[1] != "end_array":
+                adicionar(_valor(item, eventos))
+                item = next(eventos)
+        else:
+            dados[chave] = _valor(primeiro, eventos)
+    dados["colunas"] = colunas.arrays()
+    return dados
+
+
+def ler_json(caminho):
+    """
+    Lê a entrada JSON convertendo localidades e facilities em colunas.
+    """
+    with open(caminho, 'rb') as arquivo:
+        if ijson is not None:
+            return _ler_json_incremental(arquivo)
+        dados = json.load(arquivo)
+    dados["colunas"] = colunas_entrada(dados)
+    dados.pop("localidades", None)
+    dados.pop("facilities", None)
+    return dados
+
+
+def _mapear_npz(caminho):
+    """
+    Arrays de um .npz gravado sem compressão, mapeados em memória (só leitura). Membros
+    comprimidos são lidos normalmente.
+    """
+    arrays = {}
+    with zipfile.ZipFile(caminho) as pacote, open(caminho, 'rb') as arquivo:
+        for info in pacote.infolist():
+            nome = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with pacote.open(info) as membro:
+                    arrays[nome] = np.lib.format.read_array(membro)
+                continue
+            # Cabeçalho local do zip: 30 bytes fixos + nome + campo extra, depois o .npy
+            arquivo.seek(info.header_offset + 26)
+            tamanho_nome, tamanho_extra = struct.unpack("<HH", arquivo.read(4))
+            arquivo.seek(info.header_offset + 30 + tamanho_nome + tamanho_extra)
+            versao = np.lib.format.read_magic(arquivo)
+            ler_cabecalho = (np.lib.format.read_array_header_1_0 if versao == (1, 0)
+                             else np.lib.format.read_array_header_2_0)
+            formato, fortran, dtype = ler_cabecalho(arquivo)
+            if dtype.hasobject:
+                raise ValueError(f"Array {nome} com objetos Python não é suportado no .npz.")
+            if int(np.prod(formato)) == 0:
+                arrays[nome] = np.empty(formato, dtype=dtype)
+                continue
+            arrays[nome] = np.asarray(np.memmap(caminho, dtype=dtype, mode='r', offset=arquivo.tell(),
+                                                shape=formato, order='F' if fortran else 'C'))
+    return arrays
+
+
+def ler_npz(caminho):
+    """
+    Lê a entrada colunar gravada por gravar_npz.
+    """
+    arrays = _mapear_npz(caminho)
+    dados = json.loads(arrays.pop("parametros").item())
+    dados["colunas"] = {
+        "L": arrays["L"], "M": arrays["M"], "p": arrays["p"],
+        "codigos": [codigo or None for codigo in arrays["codigos"].tolist()],
+        "Ff": arrays["Ff"], "Fn": arrays["Fn"], "c": arrays["c"],
+        "codigo_cnes": [codigo or None for codigo in arrays["codigo_cnes"].tolist()],
+    }
+    return dados
+
+
+def ler_entrada(caminho):
+    """
+    Lê a entrada do facility_v4 (.json ou .npz) em colunas.
+    """
+    if str(caminho).endswith(".npz"):
+        return ler_npz(caminho)
+    return ler_json(caminho)
+
+
+def gravar_npz(dados, caminho):
+    """
+    Grava a entrada do facility_v4 (com listas ou colunas) no formato colunar .npz, sem
+    compressão para que os arrays possam ser mapeados em memória na leitura. Os demais
+    campos da entrada vão em "parametros", como JSON.
+    """
+    colunas = colunas_entrada(dados)
+    parametros = {chave: valor for chave, valor in dados.items() if chave not in ("localidades", "facilities", "colunas")}
+    np.savez(
+        caminho,
+        parametros=np.array(json.dumps(parametros)),
+        L=np.asarray(colunas["L"], dtype=np.float64),
+        M=np.asarray(colunas["M"], dtype=np.float64),
+        p=np.asarray(colunas["p"], dtype=np.float64),
+        codigos=np.array(["" if codigo is None else str(codigo) for codigo in colunas["codigos"]]),
+        Ff=np.asarray(colunas["Ff"], dtype=np.float64),
+        Fn=np.asarray(colunas["Fn"], dtype=np.float64),
+        c=np.asarray(colunas["c"], dtype=np.float64),
+        codigo_cnes=np.array(["" if codigo is None else str(codigo) for codigo in colunas["codigo_cnes"]]),
+    )
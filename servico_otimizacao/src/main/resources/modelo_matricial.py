@@ -0,0 +1,235 @@
+import numpy as np
+from scipy import sparse
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+
+def pares_viaveis(inst):
+    """
+    Pares (i, j) com d[i][j] <= d_max, equivalentes às restrições de proximidade do facility_v4.
+    """
+    return np.nonzero(inst["d"] <= inst["d_max"])
+
+
+def montar_modelo(inst, pares=None, custos=None, folgas=None):
+    """
+    Monta o modelo do facility_v4 diretamente como matriz esparsa CSR, sem objetos do PuLP.
+
+    Colunas: x para cada par (pares_i, pares_j) seguido de y para cada facility de Fn e,
+    se informadas as folgas (linhas, custos), de uma coluna por folga que atende a alocação
+    da localidade sem usar facility (modelo restrito). `custos` substitui w_i * d_ij dos
+    pares, dispensando inst["d"].
+    Linhas: alocação de cada localidade, número de facilities novas, ligação x <= y
+    (tipo_problema 1), capacidade das facilities novas e custo máximo (tipo_problema 2).
+    Os limites das colunas (col_lb, col_ub) podem ser alterados para fixar variáveis.
+    """
+    if pares is None:
+        pares = pares_viaveis(inst)
+    pares_i = np.asarray(pares[0], dtype=np.int64)
+    pares_j = np.asarray(pares[1], dtype=np.int64)
+
+    l, nf, nn = len(inst["L"]), len(inst["Ff"]), len(inst["Fn"])
+    folgas_i = np.asarray(folgas[0] if folgas is not None else [], dtype=np.int64)
+    n_x, n_y, n_f = len(pares_i), nn, len(folgas_i)
+    n = n_x + n_y + n_f
+    col_x = np.arange(n_x)
+    col_y = n_x + np.arange(n_y)
+    col_f = n_x + n_y + np.arange(n_f)
+
+    # Função objetivo
+    c = np.zeros(n)
+    if inst["flag_problema"] == 1:
+        c[:n_x] = custos if custos is not None else inst["w"][pares_i] * inst["d"][pares_i, pares_j]
+        if n_f:
+            c[col_f] = folgas[1]
+    else:
+        c[col_y] = inst["c"]
+
+    linhas, colunas, valores, lb, ub = [], [], [], [], []
+    proxima = 0
+
+    def adicionar(r, cols, vals, inferior, superior):
+        linhas.append(r)
+        colunas.append(cols)
+        valores.append(vals)
+        lb.append(inferior)
+        ub.append(superior)
+
+    # Localidade_{i}_alocada
+    adicionar(np.concatenate([pares_i, folgas_i]), np.concatenate([col_x, col_f]), np.ones(n_x + n_f),
+              np.ones(l), np.ones(l))
+    proxima += l
+
+    # Numero_de_facilities_novas_ativadas
+    linha_cardinalidade = proxima
+    adicionar(np.full(n_y, proxima), col_y, np.ones(n_y), [inst["k"] - nf], [inst["k"] - nf])
+    proxima += 1
+
+    novos = np.flatnonzero(pares_j >= nf)
+    if inst["flag_problema"] == 1:
+        # Facility_{j}_considerada_se_Localidade_{i}_alocada: x_ij - y_j <= 0
+        r = proxima + np.arange(len(novos))
+        adicionar(np.concatenate([r, r]), np.concatenate([col_x[novos], col_y[pares_j[novos] - nf]]),
+                  np.concatenate([np.ones(len(novos)), -np.ones(len(novos))]),
+                  np.full(len(novos), -np.inf), np.zeros(len(novos)))
+        proxima += len(novos)
+
+    # Capacidade_Facility_{j}
+    adicionar(proxima + pares_j[novos] - nf, col_x[novos], inst["p"][pares_i[novos]],
+              np.full(nn, -np.inf), inst["cap"])
+    proxima += nn
+
+    if inst["flag_problema"] == 2:
+        adicionar(np.full(n_y, proxima), col_y, inst["c"], [-np.inf], [inst["c_max"]])
+        proxima += 1
+
+    A = sparse.csr_matrix(
+        (np.concatenate(valores), (np.concatenate(linhas), np.concatenate(colunas))),
+        shape=(proxima, n),
+    )
+    return {
+        "c": c,
+        "A": A,
+        "lb": np.concatenate([np.asarray(v, dtype=np.float64) for v in lb]),
+        "ub": np.concatenate([np.asarray(v, dtype=np.float64) for v in ub]),
+        "col_lb": np.zeros(n),
+        "col_ub": np.ones(n),
+        "pares_i": pares_i,
+        "pares_j": pares_j,
+        "n_x": n_x,
+        "n_y": n_y,
+        "n_f": n_f,
+        "folgas_i": folgas_i,
+        "l": l,
+        "linha_cardinalidade": linha_cardinalidade,
+    }
+
+
+def _resolver_scipy(modelo, time_limit, mip_rel_gap, msg):
+    from scipy.optimize import milp, LinearConstraint, Bounds
+
+    opcoes = {"disp": bool(msg)}
+    if time_limit is not None:
+        opcoes["time_limit"] = float(time_limit)
+    if mip_rel_gap is not None:
+        opcoes["mip_rel_gap"] = float(mip_rel_gap)
+
+    n = len(modelo["c"])
+    res = milp(
+        modelo["c"],
+        integrality=modelo.get("integralidade", np.ones(n)),
+        bounds=Bounds(modelo["col_lb"], modelo["col_ub"]),
+        constraints=LinearConstraint(modelo["A"], modelo["lb"], modelo["ub"]),
+        options=opcoes,
+    )
+    if res.status == 0:
+        status = "Optimal"
+    elif res.status == 1:
+        status = "Feasible" if res.x is not None else "Not Solved"
+    elif res.status == 2:
+        status = "Infeasible"
+    elif res.status == 3:
+        status = "Unbounded"
+    else:
+        status = "Undefined"
+    return status, res.x, res.fun
+
+
+def _resolver_highspy(modelo, time_limit, mip_rel_gap, threads, inicial, msg):
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", bool(msg))
+    if time_limit is not None:
+        h.setOptionValue("time_limit", float(time_limit))
+    if mip_rel_gap is not None:
+        h.setOptionValue("mip_rel_gap", float(mip_rel_gap))
+    if threads is not None:
+        h.setOptionValue("threads", int(threads))
+
+    A = modelo["A"]
+    n = len(modelo["c"])
+    lp = highspy.HighsLp()
+    lp.num_col_ = n
+    lp.num_row_ = A.shape[0]
+    lp.col_cost_ = modelo["c"]
+    lp.col_lower_ = modelo["col_lb"]
+    lp.col_upper_ = modelo["col_ub"]
+    lp.row_lower_ = modelo["lb"]
+    lp.row_upper_ = modelo["ub"]
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.start_ = A.indptr
+    lp.a_matrix_.index_ = A.indices
+    lp.a_matrix_.value_ = A.data
+    h.passModel(lp)
+    # Integralidade como array uint8 (1 = inteira), sem montar uma lista de HighsVarType por coluna
+    integralidade = np.asarray(modelo.get("integralidade", np.ones(n)), dtype=np.uint8)
+    h.changeColsIntegrality(n, np.arange(n, dtype=np.int32), integralidade)
+
+    if inicial is not None:
+        sol = highspy.HighsSolution()
+        sol.col_value = np.asarray(inicial, dtype=np.float64)
+        h.setSolution(sol)
+
+    h.run()
+    estado = h.getModelStatus()
+    info = h.getInfo()
+    tem_solucao = info.primal_solution_status == 2
+
+    if estado == highspy.HighsModelStatus.kOptimal:
+        status = "Optimal"
+    elif estado == highspy.HighsModelStatus.kInfeasible:
+        status = "Infeasible"
+    elif estado == highspy.HighsModelStatus.kUnbounded:
+        status = "Unbounded"
+    elif tem_solucao:
+        status = "Feasible"
+    else:
+        status = "Not Solved"
+
+    if not tem_solucao:
+        return status, None, None
+    return status, np.asarray(h.getSolution().col_value), info.objective_function_value
+
+
+def resolver_highs(modelo, time_limit=None, mip_rel_gap=None, threads=None, inicial=None, msg=False):
+    """
+    Resolve o modelo com o HiGHS no próprio processo.
+
+    Usa o highspy quando instalado (permite threads e solução inicial) e, caso contrário,
+    scipy.optimize.milp. Todas as colunas são inteiras, salvo indicação em
+    modelo["integralidade"] (1 inteira, 0 contínua). Retorna (status, vetor solução, valor objetivo) com os mesmos nomes
+    de status do PuLP, mais "Feasible" quando o limite de tempo é atingido com solução.
+    """
+    if highspy is not None:
+        return _resolver_highspy(modelo, time_limit, mip_rel_gap, threads, inicial, msg)
+    return _resolver_scipy(modelo, time_limit, mip_rel_gap, msg)
+
+
+def decodificar(modelo, vetor):
+    """
+    Converte o vetor solução em (abertas, atribuicao): índices em Fn das facilities novas
+    ativadas e índice em F da facility de cada localidade.
+    """
+    n_x = modelo["n_x"]
+    selecionados = vetor[:n_x] > 0.5
+    atribuicao = np.full(modelo["l"], -1, dtype=np.int64)
+    atribuicao[modelo["pares_i"][selecionados]] = modelo["pares_j"][selecionados]
+    abertas = np.flatnonzero(vetor[n_x:n_x + modelo["n_y"]] > 0.5)
+    return abertas, atribuicao
+
+
+def vetor_solucao(modelo, abertas, atribuicao):
+    """
+    Operação inversa de decodificar: monta o vetor (x, y) de uma solução, por exemplo para
+    usá-la como solução inicial. Atribuições fora dos pares do modelo são ignoradas e
+    localidades sem atribuição (-1) usam sua folga, quando houver.
+    """
+    vetor = np.zeros(len(modelo["c"]))
+    atribuicao = np.asarray(atribuicao)
+    escolhidos = atribuicao[modelo["pares_i"]] == modelo["pares_j"]
+    vetor[:modelo["n_x"]][escolhidos] = 1
+    vetor[modelo["n_x"] + np.asarray(abertas, dtype=np.int64)] = 1
+    vetor[modelo["n_x"] + modelo["n_y"]:][atribuicao[modelo["folgas_i"]] < 0] = 1
+    return vetor
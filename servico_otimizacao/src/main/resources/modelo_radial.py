@@ -0,0 +1,271 @@
+"""
+Formulação radial (Elloumi) do p-median do facility_v4 (tipo_problema 1).
+
+Para cada localidade i, os níveis D_i^1 < D_i^2 < ... são as distâncias distintas às
+facilities novas mais próximas que a facility fixa mais próxima (e dentro de d_max); alocar i
+além da fixa mais próxima nunca compensa, pois as fixas não têm capacidade. A variável contínua
+z_i^k vale 1 quando a distância de i à facility aberta mais próxima passa de D_i^k:
+
+    min  sum_i w_i (D_i^1 + sum_k (D_i^{k+1} - D_i^k) z_i^k)
+    s.a. z_i^k - z_i^{k-1} + sum_{j: d_ij = D_i^k} y_j >= 0   (z_i^0 = 1)
+         sum_j y_j = k - |Ff|
+
+com D_i^{K+1} a distância à fixa mais próxima (sem fixa a até d_max, o último nível tem z = 0).
+São |Fn| binárias e um par (linha, coluna) por nível, em vez de l x f binárias e l x |Fn|
+ligações; a alocação é a facility aberta mais próxima.
+
+Capacidade: as facilities novas com capacidade violada passam a ser críticas, e as localidades
+que podem ser atendidas por alguma crítica ganham variáveis de alocação x (ligação x <= y e
+capacidade das críticas) no lugar dos níveis. O modelo é uma relaxação do original; ele é
+resolvido de novo, com mais críticas, até a solução respeitar todas as capacidades, quando
+então é ótima para o original. Com tipo_problema 2 usa-se o modelo clássico (modelo_matricial).
+"""
+import time
+
+import numpy as np
+from scipy import sparse
+
+from modelo_matricial import montar_modelo, resolver_highs, decodificar, vetor_solucao
+from solucao import valor_objetivo
+
+
+def montar_modelo_radial(inst, criticas=()):
+    """
+    Monta a formulação radial como matriz esparsa CSR. Colunas: y das facilities novas, z de
+    cada nível das localidades radiais e x dos pares das localidades explícitas (as que têm
+    alguma facility de `criticas`, índices em Fn, entre as candidatas). Usa inst["d"] e
+    inst["d_max"] (calcular_distancias).
+    """
+    d, d_max, w = inst["d"], inst["d_max"], inst["w"]
+    l, nf, nn = len(inst["L"]), len(inst["Ff"]), len(inst["Fn"])
+
+    fixa = d[:, :nf].min(axis=1) if nf else np.full(l, np.inf)
+    fixa_proxima = d[:, :nf].argmin(axis=1) if nf else np.zeros(l, dtype=np.int64)
+    coberta = fixa <= d_max
+
+    # Pares (localidade, facility nova) mais próximos que a fixa, ordenados por distância
+    novas = d[:, nf:]
+    pares_i, pares_j = np.nonzero((novas < fixa[:, None]) & (novas <= d_max))
+    distancias = novas[pares_i, pares_j]
+    ordem = np.lexsort((distancias, pares_i))
+    pares_i, pares_j, distancias = pares_i[ordem], pares_j[ordem], distancias[ordem]
+
+    sem_facility = np.flatnonzero(~coberta & (np.bincount(pares_i, minlength=l) == 0))
+    if len(sem_facility):
+        raise ValueError(f"Localidades sem facility a até d_max: {sem_facility.tolist()}")
+
+    e_critica = np.zeros(nn, dtype=bool)
+    e_critica[np.asarray(criticas, dtype=np.int64)] = True
+    explicita = np.zeros(l, dtype=bool)
+    explicita[pares_i[e_critica[pares_j]]] = True
+
+    # Níveis das localidades radiais: distâncias distintas de cada uma
+    radial = ~explicita[pares_i]
+    ri, rj, rd = pares_i[radial], pares_j[radial], distancias[radial]
+    inicio_nivel = np.ones(len(ri), dtype=bool)
+    inicio_nivel[1:] = (ri[1:] != ri[:-1]) | (rd[1:] != rd[:-1])
+    nivel_par = np.cumsum(inicio_nivel) - 1
+    niveis_i, niveis_d = ri[inicio_nivel], rd[inicio_nivel]
+    n_niveis = len(niveis_i)
+    quantidade = np.bincount(niveis_i, minlength=l)
+    posicao = np.arange(n_niveis) - np.searchsorted(niveis_i, niveis_i)  # k - 1 dentro da localidade
+
+    # z existe em todo nível, exceto o último das localidades sem fixa a até d_max
+    ultimo = posicao == quantidade[niveis_i] - 1
+    tem_z = coberta[niveis_i] | ~ultimo
+    n_z = int(tem_z.sum())
+    col_z = np.full(n_niveis, -1, dtype=np.int64)
+    col_z[tem_z] = nn + np.arange(n_z)
+
+    # Pares x das localidades explícitas: facilities novas candidatas e a fixa mais próxima
+    com_fixa = np.flatnonzero(explicita & coberta)
+    x_i = np.concatenate([pares_i[~radial], com_fixa])
+    x_j = np.concatenate([nf + pares_j[~radial], fixa_proxima[com_fixa]])
+    n_x = len(x_i)
+    col_x = nn + n_z + np.arange(n_x)
+    n = nn + n_z + n_x
+
+    proximo = np.where(ultimo, np.where(coberta[niveis_i], fixa[niveis_i], niveis_d), np.roll(niveis_d, -1))
+    c = np.zeros(n)
+    c[col_z[tem_z]] = (w[niveis_i] * (proximo - niveis_d))[tem_z]
+    c[col_x] = w[x_i] * d[x_i, x_j]
+    primeiro = np.where(quantidade > 0, 0.0, fixa)
+    primeiro[niveis_i[posicao == 0]] = niveis_d[posicao == 0]
+    primeiro[explicita] = 0.0
+    constante = float(np.dot(w, primeiro))
+
+    # Blocos de linhas (índices de linha locais ao bloco, colunas, coeficientes, lb, ub)
+    blocos = []
+
+    # Nível de cada localidade radial: +y das facilities no nível, +z_k, -z_{k-1} >= [k = 1]
+    anterior = np.flatnonzero(posicao > 0)
+    blocos.append((np.concatenate([nivel_par, np.flatnonzero(tem_z), anterior]),
+                   np.concatenate([rj, col_z[tem_z], col_z[anterior - 1]]),
+                   np.concatenate([np.ones(len(rj)), np.ones(n_z), -np.ones(len(anterior))]),
+                   (posicao == 0).astype(np.float64), np.full(n_niveis, np.inf)))
+
+    # Número de facilities novas ativadas
+    blocos.append((np.zeros(nn, dtype=np.int64), np.arange(nn), np.ones(nn),
+                   np.array([inst["k"] - nf], dtype=np.float64), np.array([inst["k"] - nf], dtype=np.float64)))
+
+    # Localidades explícitas: cada uma atendida por exatamente um par
+    localidades_x = np.flatnonzero(explicita)
+    linha_localidade = np.full(l, -1, dtype=np.int64)
+    linha_localidade[localidades_x] = np.arange(len(localidades_x))
+    blocos.append((linha_localidade[x_i], col_x, np.ones(n_x),
+                   np.ones(len(localidades_x)), np.ones(len(localidades_x))))
+
+    # Ligação x_ij <= y_j dos pares com facility nova
+    novos = np.flatnonzero(x_j >= nf)
+    blocos.append((np.tile(np.arange(len(novos)), 2), np.concatenate([col_x[novos], x_j[novos] - nf]),
+                   np.concatenate([np.ones(len(novos)), -np.ones(len(novos))]),
+                   np.full(len(novos), -np.inf), np.zeros(len(novos))))
+
+    # Capacidade das críticas
+    lista_criticas = np.flatnonzero(e_critica)
+    linha_critica = np.full(nn, -1, dtype=np.int64)
+    linha_critica[lista_criticas] = np.arange(len(lista_criticas))
+    capacitados = novos[e_critica[x_j[novos] - nf]]
+    blocos.append((linha_critica[x_j[capacitados] - nf], col_x[capacitados],
+                   inst["p"][x_i[capacitados]].astype(np.float64),
+                   np.full(len(lista_criticas), -np.inf), inst["cap"][lista_criticas].astype(np.float64)))
+
+    deslocamentos = np.cumsum([0] + [len(bloco[3]) for bloco in blocos])
+    A = sparse.csr_matrix(
+        (np.concatenate([bloco[2] for bloco in blocos]),
+         (np.concatenate([bloco[0] + inicio for bloco, inicio in zip(blocos, deslocamentos)]),
+          np.concatenate([bloco[1] for bloco in blocos]))),
+        shape=(deslocamentos[-1], n),
+    )
+    return {
+        "c": c,
+        "A": A,
+        "lb": np.concatenate([bloco[3] for bloco in blocos]),
+        "ub": np.concatenate([bloco[4] for bloco in blocos]),
+        "col_lb": np.zeros(n),
+        "col_ub": np.ones(n),
+        "integralidade": (np.arange(n) < nn) | (np.arange(n) >= nn + n_z),
+        "constante": constante,
+        "niveis_i": niveis_i,
+        "niveis_d": niveis_d,
+        "col_z": col_z,
+        "x_i": x_i,
+        "x_j": x_j,
+        "n_y": nn,
+        "n_z": n_z,
+        "linha_cardinalidade": deslocamentos[1],
+    }
+
+
+def atribuir_mais_proxima(inst, abertas):
+    """
+    Facility aberta (fixas e novas em `abertas`) mais próxima de cada localidade, em F.
+    """
+    nf = len(inst["Ff"])
+    usadas = np.concatenate([np.arange(nf), nf + np.asarray(abertas, dtype=np.int64)])
+    return usadas[np.argmin(inst["d"][:, usadas], axis=1)]
+
+
+def decodificar_radial(modelo, inst, vetor):
+    """
+    (abertas, atribuicao) do vetor solução: localidades explícitas pelo x escolhido e as
+    demais na facility aberta mais próxima.
+    """
+    abertas = np.flatnonzero(vetor[:modelo["n_y"]] > 0.5)
+    atribuicao = atribuir_mais_proxima(inst, abertas)
+    escolhidos = vetor[modelo["n_y"] + modelo["n_z"]:] > 0.5
+    atribuicao[modelo["x_i"][escolhidos]] = modelo["x_j"][escolhidos]
+    return abertas, atribuicao
+
+
+def vetor_radial(modelo, inst, abertas, atribuicao):
+    """
+    Vetor (y, z, x) de uma solução viável, para uso como solução inicial. As localidades
+    explícitas mantêm sua facility quando ela é um par do modelo e vão para a fixa mais
+    próxima caso contrário, o que não aumenta a carga de nenhuma facility nova.
+    """
+    vetor = np.zeros(len(modelo["c"]))
+    vetor[np.asarray(abertas, dtype=np.int64)] = 1
+    distancia = inst["d"][np.arange(len(inst["L"])), atribuir_mais_proxima(inst, abertas)]
+    tem_z = modelo["col_z"] >= 0
+    acima = distancia[modelo["niveis_i"]] > modelo["niveis_d"]
+    vetor[modelo["col_z"][tem_z]] = acima[tem_z]
+
+    x = vetor[modelo["n_y"] + modelo["n_z"]:]
+    mantidos = np.asarray(atribuicao)[modelo["x_i"]] == modelo["x_j"]
+    x[mantidos] = 1
+    sem_par = np.ones(len(inst["L"]), dtype=bool)
+    sem_par[modelo["x_i"][mantidos]] = False
+    x[sem_par[modelo["x_i"]] & (modelo["x_j"] < len(inst["Ff"]))] = 1
+    return vetor
+
+
+def facilities_violadas(inst, atribuicao):
+    """
+    Índices (em Fn) das facilities novas cuja carga na `atribuicao` passa da capacidade.
+    """
+    nf = len(inst["Ff"])
+    novas = atribuicao >= nf
+    cargas = np.bincount(atribuicao[novas] - nf, weights=inst["p"][novas], minlength=len(inst["Fn"]))
+    return np.flatnonzero(cargas > inst["cap"] + 1e-9)
+
+
+def resolver_radial(inst, config_solver=None, inicial=None, abertas=None):
+    """
+    Resolve o facility_v4 pela formulação radial, acrescentando as facilities com capacidade
+    violada às críticas até obter uma solução viável. Com tipo_problema 2 resolve o modelo
+    clássico (modelo_matricial). `inicial` é (abertas, atribuicao) de uma solução viável,
+    usada como ponto de partida. Com `abertas` (índices em Fn) as facilities novas ficam
+    fixadas e só a alocação é otimizada (pela distância ponderada, em qualquer tipo_problema).
+
+    Retorna (status, objetivo, abertas, atribuicao, info); info["aplicado"] diz se o
+    resultado veio da formulação radial e info["rodadas"] traz o tamanho de cada modelo.
+    """
+    config_solver = config_solver or {}
+    inicio = time.time()
+    parametros = {"time_limit": config_solver.get("tempo_limite"), "mip_rel_gap": config_solver.get("gap"),
+                  "threads": config_solver.get("threads")}
+
+    if inst["flag_problema"] != 1 and abertas is None:
+        print("Formulação radial não se aplica (tipo_problema 2); usando o modelo clássico")
+        modelo = montar_modelo(inst)
+        status, vetor, objetivo = resolver_highs(
+            modelo, inicial=vetor_solucao(modelo, *inicial) if inicial is not None else None, **parametros)
+        info = {"aplicado": False, "motivo": "tipo_problema 2", "variaveis": modelo["A"].shape[1],
+                "restricoes": modelo["A"].shape[0], "nao_nulos": int(modelo["A"].nnz), "tempo": time.time() - inicio}
+        if vetor is None:
+            return status, None, None, None, info
+        abertas, atribuicao = decodificar(modelo, vetor)
+        return status, objetivo, abertas, atribuicao, info
+
+    criticas, rodadas = np.array([], dtype=np.int64), []
+    info = {"aplicado": True, "rodadas": rodadas}
+    while True:
+        modelo = montar_modelo_radial(inst, criticas)
+        if abertas is not None:
+            fixadas = np.zeros(modelo["n_y"])
+            fixadas[np.asarray(abertas, dtype=np.int64)] = 1
+            modelo["col_lb"][:modelo["n_y"]] = modelo["col_ub"][:modelo["n_y"]] = fixadas
+            modelo["lb"][modelo["linha_cardinalidade"]] = modelo["ub"][modelo["linha_cardinalidade"]] = len(abertas)
+        info.update({"variaveis": modelo["A"].shape[1], "restricoes": modelo["A"].shape[0],
+                     "nao_nulos": int(modelo["A"].nnz)})
+        status, vetor, objetivo = resolver_highs(
+            modelo, inicial=vetor_radial(modelo, inst, *inicial) if inicial is not None else None, **parametros)
+        rodada = {"criticas": len(criticas), "variaveis": info["variaveis"], "restricoes": info["restricoes"],
+                  "status": status}
+        rodadas.append(rodada)
+        if vetor is None:
+            info["tempo"] = time.time() - inicio
+            return status, None, None, None, info
+
+        abertas_solucao, atribuicao = decodificar_radial(modelo, inst, vetor)
+        violadas = facilities_violadas(inst, atribuicao)
+        # Objetivo pela alocação decodificada (igual ao do modelo no ótimo; com limite de tempo
+        # os z da solução incumbente podem estar folgados)
+        rodada.update({"objetivo": valor_objetivo(inst, abertas_solucao, atribuicao), "violadas": len(violadas)})
+        print(f"Radial: {len(criticas)} críticas, {info['variaveis']} variáveis, "
+              f"{len(violadas)} capacidades violadas, objetivo {rodada['objetivo']}")
+        if len(violadas) == 0:
+            info["tempo"] = time.time() - inicio
+            return status, rodada["objetivo"], abertas_solucao, atribuicao, info
+        criticas = np.union1d(criticas, violadas)
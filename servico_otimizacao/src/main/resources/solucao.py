@@ -0,0 +1,95 @@
+import numpy as np
+
+from avaliacao import avaliar
+
+# Status para os quais existe uma solução a ser escrita na saída
+STATUS_COM_SOLUCAO = ("Optimal", "Feasible")
+
+
+def valor_objetivo(inst, abertas, atribuicao):
+    """
+    Calcula o objetivo do facility_v4 para uma solução (facilities novas abertas e facility
+    de F atribuída a cada localidade).
+    """
+    if inst["flag_problema"] == 1:
+        linhas = np.arange(len(atribuicao))
+        return float(np.dot(inst["w"], inst["d"][linhas, atribuicao]))
+    return float(inst["c"][np.asarray(abertas, dtype=np.int64)].sum())
+
+
+def valores_variaveis(variaveis):
+    """
+    Valores de uma lista de variáveis PuLP após a resolução, lidos uma única vez num array
+    (variáveis sem valor contam como 0).
+    """
+    return np.fromiter((variavel.varValue or 0.0 for variavel in variaveis), dtype=np.float64, count=len(variaveis))
+
+
+def montar_resultados(inst, status, objetivo=None, tempo_execucao=None, abertas=None, atribuicao=None):
+    """
+    Monta o dicionário de saída do facility_v4.
+
+    abertas: índices (em Fn) das facilities novas ativadas.
+    atribuicao: índice (em F = Ff + Fn) da facility de cada localidade.
+    Com inst["formato_saida"] "compacto" ou "binario", as alocações saem como arrays
+    paralelos de índices numa tabela de centros (ver escrita.py). Com inst["estatisticas"]
+    o resultado traz também o bloco de avaliacao.avaliar.
+    """
+    resultados = {"status": status}
+    if status not in STATUS_COM_SOLUCAO:
+        return resultados
+
+    Ff, Fn = inst["Ff"], inst["Fn"]
+    offset = len(Ff)
+    codigos, codigo_cnes = inst["codigos"], inst["codigo_cnes"]
+
+    problema = "min_dist" if inst["flag_problema"] == 1 else "min_custo"
+    resultados.update({
+        "tipo_problema": problema,
+        "tempo_execucao": tempo_execucao,
+        problema: objetivo,
+        "num_centros": inst["k"],
+        "orcamento": inst["c_max"],
+        "metricas": inst["nome_metricas"],
+        "prioridades": inst["lambdas"],
+    })
+    if inst.get("estatisticas"):
+        resultados["estatisticas"] = avaliar(inst, atribuicao, abertas, inst["estatisticas"])
+
+    formato = inst.get("formato_saida", "verboso")
+    if formato != "verboso":
+        # Tabela de centros (fixos e novos abertos, cada um uma vez) e alocações como índices nela
+        usados = np.concatenate([np.arange(offset), offset + np.asarray(abertas, dtype=np.int64)])
+        posicao = np.full(len(inst["F"]), -1, dtype=np.int64)
+        posicao[usados] = np.arange(len(usados))
+        resultados.update({
+            "formato": formato,
+            "centros": {
+                "indice": usados,
+                "coordenada": inst["F"][usados],
+                "fixo": usados < offset,
+                "codigo_cnes": list(codigo_cnes) + [None] * (len(usados) - offset),
+            },
+            "alocacoes": {
+                "localidade": codigos,
+                "centro": posicao[np.asarray(atribuicao, dtype=np.int64)],
+            },
+        })
+        return resultados
+
+    centros_utilizados = [[int(j) + offset, Fn[j].tolist()] for j in abertas]
+    centros_fixos = [[Ff[j].tolist()] for j in range(len(Ff))]
+
+    alocacoes_utilizadas = []
+    for i, j in enumerate(np.asarray(atribuicao).tolist()):
+        if j < offset:
+            alocacoes_utilizadas.append({"localidade": codigos[i], "centro": codigo_cnes[j]})
+        else:
+            alocacoes_utilizadas.append({"localidade": codigos[i], "centro": Fn[j - offset].tolist()})
+
+    resultados.update({
+        "alocacoes": alocacoes_utilizadas,
+        "centros_adicionados": centros_utilizados,
+        "centros_fixos": [{"centro": coord, "codigo_cnes": cnes} for coord, cnes in zip(centros_fixos, codigo_cnes)],
+    })
+    return resultados
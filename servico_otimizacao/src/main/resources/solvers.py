@@ -0,0 +1,145 @@
+import logging
+import os
+
+import pulp
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# Ordem de preferência quando o solver pedido não está disponível (ou com "auto")
+ORDEM_FALLBACK = ["cplex", "highs", "cbc"]
+
+# Variáveis de ambiente aceitas (o campo "solver" do JSON de entrada tem prioridade)
+VARIAVEIS_AMBIENTE = {
+    "nome": "SOLVER",
+    "threads": "SOLVER_THREADS",
+    "gap": "SOLVER_GAP",
+    "tempo_limite": "SOLVER_TEMPO_LIMITE",
+    "memoria_nos_mb": "SOLVER_MEMORIA_NOS_MB",
+    "caminho": "CPLEX_PATH",
+}
+
+_CONVERSORES = {
+    "nome": lambda v: str(v).lower(),
+    "threads": int,
+    "gap": float,
+    "tempo_limite": float,
+    "memoria_nos_mb": int,
+    "caminho": str,
+    "msg": int,
+}
+
+
+def configuracao_solver(dados=None, tempo_limite_padrao=None, caminho_padrao=None):
+    """
+    Monta a configuração do solver a partir do campo "solver" do JSON de entrada, das
+    variáveis de ambiente SOLVER_* e dos padrões de cada script, nesta ordem de prioridade.
+
+    Exemplo de entrada: "solver": {"nome": "highs", "threads": 4, "gap": 0.01,
+    "tempo_limite": 600, "memoria_nos_mb": 4096}
+    """
+    config = {
+        "nome": "auto",
+        "threads": None,
+        "gap": None,
+        "tempo_limite": tempo_limite_padrao,
+        "memoria_nos_mb": None,
+        "caminho": caminho_padrao,
+        "msg": 1,
+    }
+
+    for chave, variavel in VARIAVEIS_AMBIENTE.items():
+        valor = os.environ.get(variavel)
+        if valor:
+            config[chave] = valor
+
+    entrada = (dados or {}).get("solver") or {}
+    if isinstance(entrada, str):
+        entrada = {"nome": entrada}
+    for chave, valor in entrada.items():
+        if chave not in config:
+            raise ValueError(f"Parâmetro de solver desconhecido: {chave}")
+        config[chave] = valor
+
+    for chave, converter in _CONVERSORES.items():
+        if config[chave] is not None:
+            config[chave] = converter(config[chave])
+
+    if config["nome"] not in ORDEM_FALLBACK + ["auto"]:
+        raise ValueError(f"Solver inválido: {config['nome']}. Use um de {ORDEM_FALLBACK} ou 'auto'.")
+    return config
+
+
+if highspy is not None and hasattr(pulp, "HiGHS"):
+    class HiGHSInicial(pulp.HiGHS):
+        """
+        pulp.HiGHS que envia ao highspy, antes de resolver, os valores definidos por
+        setInitialValue como solução inicial (a classe do PuLP os ignora).
+        """
+
+        def callSolver(self, lp):
+            valores = [0.0] * lp.solverModel.getNumCol()
+            for var in lp.variables():
+                if var.varValue is not None:
+                    valores[var.index] = float(var.varValue)
+            sol = highspy.HighsSolution()
+            sol.col_value = valores
+            lp.solverModel.setSolution(sol)
+            super().callSolver(lp)
+else:
+    HiGHSInicial = None
+
+
+def _instanciar(nome, config, warm_start=False):
+    """
+    Cria o solver do PuLP correspondente a `nome` com os limites da configuração.
+    """
+    comuns = {
+        "msg": config["msg"],
+        "timeLimit": config["tempo_limite"],
+        "gapRel": config["gap"],
+        "threads": config["threads"],
+    }
+    if nome == "cplex":
+        return pulp.CPLEX_CMD(path=config["caminho"], maxMemory=config["memoria_nos_mb"],
+                              warmStart=warm_start, **comuns)
+    if config["memoria_nos_mb"] is not None:
+        logging.warning("Limite de memória da árvore não suportado pelo solver %s; ignorado.", nome)
+    if nome == "highs":
+        # Pelo highspy quando instalado (com HiGHSInicial para a solução inicial); senão, o executável
+        if HiGHSInicial is not None:
+            solver = HiGHSInicial(**comuns) if warm_start else pulp.HiGHS(**comuns)
+            if solver.available():
+                return solver
+        return pulp.HiGHS_CMD(warmStart=warm_start, **comuns)
+    return pulp.PULP_CBC_CMD(warmStart=warm_start, **comuns)
+
+
+def aceita_solucao_inicial(solver):
+    """
+    Se o solver do PuLP envia os valores de setInitialValue como solução inicial.
+    """
+    if HiGHSInicial is not None and isinstance(solver, HiGHSInicial):
+        return True
+    return bool(getattr(solver, "optionsDict", {}).get("warmStart", False))
+
+
+def criar_solver_pulp(config, warm_start=False):
+    """
+    Retorna (nome, solver) para o PuLP. Se o solver pedido não estiver instalado (por exemplo
+    o CPLEX em nós sem licença), usa o próximo disponível de ORDEM_FALLBACK. Com warm_start,
+    os valores definidos por setInitialValue são enviados ao solver como solução inicial.
+    """
+    pedido = config["nome"]
+    candidatos = ORDEM_FALLBACK if pedido == "auto" else [pedido] + [n for n in ORDEM_FALLBACK if n != pedido]
+
+    for nome in candidatos:
+        solver = _instanciar(nome, config, warm_start)
+        if solver.available():
+            if pedido not in ("auto", nome):
+                logging.warning("Solver %s indisponível; usando %s.", pedido, nome)
+            return nome, solver
+
+    raise ValueError(f"Nenhum solver disponível entre {candidatos}.")
@@ -0,0 +1,251 @@
+"""
+Varredura do número de centros do facility_v4 (tipo_problema 1): resolve o p-median para
+k = k_min, k_min + passo, ..., k_max em sequência e grava a curva objetivo x k.
+
+Entrada: a do facility_v4 com o campo
+    "varredura": {"k_min": 150, "k_max": 200, "passo": 5}
+(padrões: k_min = limite inferior de viabilidade, k_max = total de facilities, passo = 1);
+o num_centros_desejado não é usado e pode faltar. Com "modo": "restrito" cada k é resolvido
+pelo modelo restrito às facilities candidatas.
+
+O limite inferior vem das restrições de proximidade: cada localidade sem facility fixa a até
+d_max precisa de uma nova a até d_max, e a população delas tem de caber na capacidade das
+novas abertas. Valores de k abaixo dele são inviáveis e entram na curva sem ser resolvidos.
+
+O modelo (ou as listas de candidatas) é montado uma vez; entre um k e o seguinte muda só o
+lado direito da restrição de cardinalidade. Cada k parte do ótimo anterior acrescido das
+facilities de maior ganho marginal, solução viável do novo modelo.
+
+Uso:
+    python varredura.py entrada.json saida.json
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from instancia import preparar_instancia, calcular_distancias
+from leitura import ler_entrada
+from distancias import distancias_pares
+from modelo_matricial import montar_modelo, resolver_highs, decodificar, vetor_solucao
+from heuristicas import heuristica_inicial
+from candidatos import ListasCandidatas, resolver_restrito, OPCOES_PADRAO as OPCOES_RESTRITO
+from solucao import STATUS_COM_SOLUCAO
+from solvers import configuracao_solver
+
+
+def limite_inferior_k(inst, pares_i, pares_j, completas=None):
+    """
+    Menor k que pode ser viável, dados os pares (pares_i, pares_j) com d <= d_max. Só contam
+    as localidades sem facility fixa entre os pares e com a lista completa (`completas`,
+    máscara por localidade; None: todas): cada uma exige uma facility nova aberta entre os
+    seus pares. O limite é o maior entre um empacotamento guloso dessas localidades (listas
+    disjuntas exigem facilities distintas) e o número de novas cuja capacidade comporta a
+    população delas.
+    """
+    nf, nn = len(inst["Ff"]), len(inst["Fn"])
+    descobertas = np.ones(len(inst["L"]), dtype=bool)
+    descobertas[pares_i[pares_j < nf]] = False
+    if completas is not None:
+        descobertas &= completas
+    selecionados = descobertas[pares_i]  # pares ordenados por localidade: cada lista é contígua
+    linhas, inicios, tamanhos = np.unique(pares_i[selecionados], return_index=True, return_counts=True)
+    candidatas = pares_j[selecionados] - nf
+
+    usadas = np.zeros(nn, dtype=bool)
+    empacotadas = 0
+    ordem = np.argsort(tamanhos, kind="stable")
+    for inicio, tamanho in zip(inicios[ordem].tolist(), tamanhos[ordem].tolist()):
+        lista = candidatas[inicio:inicio + tamanho]
+        if not usadas[lista].any():
+            usadas[lista] = True
+            empacotadas += 1
+
+    demanda = float(inst["p"][linhas].sum())
+    capacidades = np.cumsum(np.sort(inst["cap"])[::-1])
+    por_capacidade = int(np.searchsorted(capacidades, demanda)) + 1 if demanda > 0 else 0
+    return min(nf + max(empacotadas, por_capacidade), nf + nn)
+
+
+def valores_k(inst, opcoes, k_inferior=None):
+    """
+    Lista de k da varredura a partir de {"k_min", "k_max", "passo"}; sem k_min, começa em
+    k_inferior (ou no número de facilities fixas).
+    """
+    nf, nn = len(inst["Ff"]), len(inst["Fn"])
+    desconhecidas = set(opcoes) - {"k_min", "k_max", "passo"}
+    if desconhecidas:
+        raise ValueError(f"Parâmetros da varredura desconhecidos: {sorted(desconhecidas)}")
+    k_max = opcoes.get("k_max", nf + nn)
+    k_min = opcoes.get("k_min", nf if k_inferior is None else min(k_inferior, k_max))
+    passo = opcoes.get("passo", 1)
+    if passo < 1:
+        raise ValueError("O passo da varredura deve ser pelo menos 1.")
+    if not nf <= k_min <= k_max <= nf + nn:
+        raise ValueError("A varredura exige número de centros fixos <= k_min <= k_max <= total de facilities.")
+    return list(range(k_min, k_max + 1, passo))
+
+
+def acrescentar(inst, pares_i, pares_j, custos, abertas, atribuicao, quantidade):
+    """
+    Solução inicial para k + quantidade a partir da solução (abertas, atribuicao) de k, usando
+    só os pares (pares_i, pares_j) do modelo e seus custos: abre, uma a uma, a facility nova
+    fechada de maior ganho marginal (redução de custo das localidades que ficariam mais perto
+    dela) e move para as facilities abertas as localidades que ganham com a troca, enquanto
+    houver capacidade. A solução anterior continua viável com as facilities extras vazias.
+    """
+    nf = len(inst["Ff"])
+    atribuicao = atribuicao.copy()
+    atual = np.zeros(len(atribuicao))  # localidades fora dos pares (atendidas fora da lista) não contam
+    usados = atribuicao[pares_i] == pares_j
+    atual[pares_i[usados]] = custos[usados]
+    fechadas = np.ones(len(inst["Fn"]), dtype=bool)
+    fechadas[abertas] = False
+
+    novas = []
+    for _ in range(quantidade):
+        candidatos = (pares_j >= nf) & fechadas[np.maximum(pares_j - nf, 0)]
+        ganho = np.bincount(pares_j[candidatos] - nf,
+                            weights=np.maximum(atual[pares_i[candidatos]] - custos[candidatos], 0),
+                            minlength=len(fechadas))
+        ganho[~fechadas] = -np.inf
+        escolhida = int(np.argmax(ganho))
+        fechadas[escolhida] = False
+        novas.append(escolhida)
+        no_par = pares_j == nf + escolhida
+        np.minimum.at(atual, pares_i[no_par], custos[no_par])
+
+    # Realocação gulosa para as facilities abertas agora, pela maior economia
+    residual = inst["cap"].astype(np.float64).copy()
+    atendidas = atribuicao >= nf
+    residual -= np.bincount(atribuicao[atendidas] - nf, weights=inst["p"][atendidas], minlength=len(residual))
+    custo_atual = np.zeros(len(atribuicao))
+    custo_atual[pares_i[usados]] = custos[usados]
+    movimentos = np.flatnonzero(np.isin(pares_j, nf + np.array(novas, dtype=np.int64)))
+    economia = custo_atual[pares_i[movimentos]] - custos[movimentos]
+    movimentos = movimentos[economia > 0][np.argsort(-economia[economia > 0], kind="stable")]
+    for par in movimentos.tolist():
+        i, j = pares_i[par], pares_j[par]
+        if custos[par] < custo_atual[i] and residual[j - nf] >= inst["p"][i]:
+            if atribuicao[i] >= nf:
+                residual[atribuicao[i] - nf] += inst["p"][i]
+            residual[j - nf] -= inst["p"][i]
+            atribuicao[i], custo_atual[i] = j, custos[par]
+    return np.flatnonzero(~fechadas), atribuicao
+
+
+def varrer(inst, opcoes=None, modo="exato", opcoes_restrito=None, config_solver=None):
+    """
+    Resolve o p-median para cada k da varredura `opcoes` ({"k_min", "k_max", "passo"}, em
+    ordem crescente) partindo da solução anterior. No modo "exato" o modelo completo é montado
+    uma vez e só o lado direito da cardinalidade muda; no modo "restrito" as listas de
+    facilities candidatas são criadas uma vez e continuam sendo expandidas de um k para o
+    outro. Os k abaixo de limite_inferior_k entram como inviáveis sem ser resolvidos.
+    Retorna a lista de pontos da curva.
+    """
+    if inst["flag_problema"] != 1:
+        raise ValueError("A varredura suporta apenas tipo_problema 1 (minimizar distância ponderada).")
+    if modo not in ["exato", "restrito"]:
+        raise ValueError("A varredura suporta os modos 'exato' e 'restrito'.")
+    config_solver = config_solver or {}
+    nf = len(inst["Ff"])
+    metrica = inst["metrica_distancia"]
+    casas_decimais = None if metrica == "euclidiana" else 2
+
+    if modo == "exato":
+        calcular_distancias(inst)
+        modelo = montar_modelo(dict(inst, k=nf))
+        pares_i, pares_j, custos = modelo["pares_i"], modelo["pares_j"], modelo["c"][:modelo["n_x"]]
+        k_inferior = limite_inferior_k(inst, pares_i, pares_j)
+    else:
+        listas = ListasCandidatas(inst, {**OPCOES_RESTRITO, **(opcoes_restrito or {})}["vizinhos"])
+        pares_i, pares_j, _ = listas.pares()
+        k_inferior = limite_inferior_k(inst, pares_i, pares_j, np.isinf(listas.proxima))
+    ks = valores_k(inst, opcoes or {}, k_inferior)
+
+    curva, anterior, objetivo_anterior = [], None, None
+    for k in ks:
+        inicio = time.time()
+        if k < k_inferior:
+            print(f"k = {k}: Infeasible (abaixo do limite inferior {k_inferior})")
+            curva.append({"num_centros": k, "status": "Infeasible", "min_dist": None, "tempo": 0.0})
+            continue
+        inst_k = dict(inst, k=k)
+        if modo == "restrito":
+            pares_i, pares_j, distancias = listas.pares()
+            custos = inst["w"][pares_i] * distancias
+
+        inicial = None
+        if anterior is not None:
+            inicial = acrescentar(inst, pares_i, pares_j, custos, *anterior, k - nf - len(anterior[0]))
+        elif modo == "exato":
+            heuristica = heuristica_inicial(inst_k)
+            if heuristica["objetivo"] is not None:
+                inicial = (heuristica["abertas"], heuristica["atribuicao"])
+
+        if modo == "exato":
+            modelo["lb"][modelo["linha_cardinalidade"]] = k - nf
+            modelo["ub"][modelo["linha_cardinalidade"]] = k - nf
+            status, vetor, objetivo = resolver_highs(
+                modelo,
+                time_limit=config_solver.get("tempo_limite"),
+                mip_rel_gap=config_solver.get("gap"),
+                threads=config_solver.get("threads"),
+                inicial=vetor_solucao(modelo, *inicial) if inicial is not None else None,
+            )
+            abertas, atribuicao = decodificar(modelo, vetor) if status in STATUS_COM_SOLUCAO else (None, None)
+        else:
+            status, objetivo, abertas, atribuicao, _ = resolver_restrito(
+                inst_k, opcoes_restrito, config_solver, listas=listas, inicial=inicial)
+
+        ponto = {"num_centros": k, "status": status, "min_dist": None}
+        if status in STATUS_COM_SOLUCAO:
+            ponto.update({
+                "min_dist": objetivo,
+                "ganho_marginal": objetivo_anterior - objetivo if objetivo_anterior is not None else None,
+                "distancia_maxima": float(distancias_pares(inst["L"], inst["F"][atribuicao],
+                                                           metrica, casas_decimais).max()),
+                "centros_adicionados": (nf + abertas).tolist(),
+            })
+            if anterior is not None:
+                # Facilities que entram (e saem, pois os ótimos não são necessariamente encaixados)
+                ponto["entraram"] = [[int(j) + nf, inst["Fn"][j].tolist()] for j in np.setdiff1d(abertas, anterior[0])]
+                ponto["sairam"] = [[int(j) + nf, inst["Fn"][j].tolist()] for j in np.setdiff1d(anterior[0], abertas)]
+            anterior, objetivo_anterior = (abertas, atribuicao), objetivo
+        ponto["tempo"] = time.time() - inicio
+        print(f"k = {k}: {status} {ponto['min_dist']} em {ponto['tempo']:.2f} s")
+        curva.append(ponto)
+    return curva
+
+
+def executar_varredura(dados, saida):
+    """
+    Lê a instância uma vez, varre os valores de k e grava a curva em `saida`.
+    """
+    inicio = time.time()
+    inst = preparar_instancia(dados, exigir_k=False)
+    curva = varrer(inst, dados.get("varredura") or {}, dados.get("modo", "exato"), dados.get("restrito"),
+                   configuracao_solver(dados, tempo_limite_padrao=1000))
+
+    resolvidos = [ponto for ponto in curva if ponto["status"] in STATUS_COM_SOLUCAO]
+    resultados = {
+        "status": "Optimal" if all(ponto["status"] == "Optimal" for ponto in curva)
+        else ("Feasible" if resolvidos else curva[-1]["status"]),
+        "tipo_problema": "min_dist",
+        "tempo_execucao": time.time() - inicio,
+        "metricas": inst["nome_metricas"],
+        "pesos": inst["lambdas"],
+        "curva": curva,
+    }
+    with open(saida, 'w', encoding='utf-8') as saidas:
+        json.dump(resultados, saidas, indent=4)
+    return resultados
+
+
+def main():
+    executar_varredura(ler_entrada(sys.argv[1]), sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
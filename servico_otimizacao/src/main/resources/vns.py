@@ -0,0 +1,485 @@
+import heapq
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from distancias import vizinhos_mais_proximos
+from lagrangiana import relaxacao_lagrangiana
+from solucao import montar_resultados
+from escrita import gravar_resultados
+
+OPCOES_PADRAO = {
+    "tempo_limite": 60,       # segundos por início
+    "inicios": None,          # número de inícios (padrão: workers)
+    "workers": None,          # processos (padrão: os.cpu_count())
+    "vizinhos": 64,           # facilities candidatas (mais próximas) por localidade
+    "k_max": 5,               # maior vizinhança de perturbação (trocas simultâneas)
+    "max_sem_melhora": 50,    # ciclos completos de vizinhanças sem melhora antes de parar
+    "entradas_capacidade": 8, # trocas com capacidades: candidatas mais próximas de cada localidade deslocada
+    "saidas_capacidade": 5,   # trocas com capacidades: saídas testadas por entrada
+    "semente": 0,
+}
+
+# Listas de candidatas e fila de melhorias compartilhadas com os processos do pool (via fork)
+_LISTAS = None
+_FILA = None
+
+
+def listas_candidatas(inst, vizinhos):
+    """
+    Para cada localidade, as facilities de F mais próximas (até `vizinhos`) a no máximo d_max,
+    em ordem crescente de custo w_i * d_ij. Só essas distâncias são calculadas, o que permite
+    instâncias em que a matriz l x f não cabe na memória.
+
+    Preenche inst["d_max"] e retorna um dicionário com as listas (J, D, C; a sentinela f / inf
+    completam as linhas), a lista invertida por facility (CSR) e a penalidade de localidade sem
+    atendimento.
+    """
+    metrica = inst["metrica_distancia"]
+    casas_decimais = None if metrica == "euclidiana" else 2
+    J, D = vizinhos_mais_proximos(inst["L"], inst["F"], vizinhos, metrica, casas_decimais)
+
+    # A mais próxima de cada localidade está sempre na lista, então d_max é o mesmo do modelo exato
+    d_max = float(D[:, 0].max()) if D.size else 0
+    inst["d_max"] = d_max
+    viaveis = D <= d_max
+    f = len(inst["F"])
+    J = np.where(viaveis, J, f)  # f é uma coluna sentinela, nunca aberta
+    C = np.where(viaveis, inst["w"][:, None] * D, np.inf)
+
+    maior = float(C[viaveis].max()) if viaveis.any() else 0.0
+    penalidade = (maior + 1) * (len(C) + 1)
+
+    linhas, posicoes = np.nonzero(viaveis)
+    colunas = J[linhas, posicoes]
+    ordem = np.argsort(colunas, kind="stable")
+    return {
+        "J": J, "D": D, "C": C, "f": f,
+        "nf": len(inst["Ff"]),
+        "penalidade": penalidade,
+        "inv_inicio": np.concatenate([[0], np.cumsum(np.bincount(colunas, minlength=f))]),
+        "inv_linhas": linhas[ordem],
+        "inv_custos": C[linhas, posicoes][ordem],
+    }
+
+
+class EstadoVNS:
+    """
+    Conjunto de facilities abertas com a mais próxima e a segunda mais próxima de cada
+    localidade (dentro da sua lista), o que permite avaliar e aplicar trocas incrementalmente.
+    """
+
+    def __init__(self, listas, abertas_f):
+        self.listas = listas
+        self.aberta = np.zeros(listas["f"] + 1, dtype=bool)
+        self.aberta[np.asarray(abertas_f, dtype=np.int64)] = True
+        self.n1 = np.empty(len(listas["J"]), dtype=np.int64)
+        self.n2 = np.empty_like(self.n1)
+        self.c1 = np.empty(len(listas["J"]))
+        self.c2 = np.empty_like(self.c1)
+        self._recalcular(np.arange(len(listas["J"])))
+        self._atualizar_removiveis()
+
+    def copiar(self):
+        novo = object.__new__(EstadoVNS)
+        novo.listas = self.listas
+        for nome in ("aberta", "n1", "n2", "c1", "c2", "removiveis", "posicao", "base"):
+            setattr(novo, nome, getattr(self, nome).copy())
+        return novo
+
+    @property
+    def custo(self):
+        return float(self.c1.sum())
+
+    @property
+    def abertas(self):
+        return np.flatnonzero(self.aberta)
+
+    def fechadas(self):
+        nf = self.listas["nf"]
+        return np.flatnonzero(~self.aberta[nf:-1]) + nf
+
+    def _recalcular(self, linhas):
+        """
+        Recalcula a primeira e a segunda aberta da lista de cada linha indicada.
+        """
+        if len(linhas) == 0:
+            return
+        J, C = self.listas["J"][linhas], self.listas["C"][linhas]
+        sem = self.listas["f"]
+        abertas = self.aberta[J]
+        r = np.arange(len(linhas))
+        primeiro = np.argmax(abertas, axis=1)
+        tem1 = abertas[r, primeiro]
+        abertas[r, primeiro] = False
+        segundo = np.argmax(abertas, axis=1)
+        tem2 = abertas[r, segundo]
+
+        penalidade = self.listas["penalidade"]
+        self.n1[linhas] = np.where(tem1, J[r, primeiro], sem)
+        self.c1[linhas] = np.where(tem1, C[r, primeiro], penalidade)
+        self.n2[linhas] = np.where(tem2, J[r, segundo], sem)
+        self.c2[linhas] = np.where(tem2, C[r, segundo], penalidade)
+
+    def _atualizar_removiveis(self):
+        """
+        Facilities novas abertas, sua posição e a perda de fechar cada uma (todas as suas
+        localidades indo para a segunda mais próxima).
+        """
+        nf = self.listas["nf"]
+        self.removiveis = np.flatnonzero(self.aberta[nf:-1]) + nf
+        self.posicao = np.full(self.listas["f"] + 1, -1, dtype=np.int64)
+        self.posicao[self.removiveis] = np.arange(len(self.removiveis))
+        dono = self.posicao[self.n1]
+        validas = dono >= 0
+        self.base = np.bincount(dono[validas], weights=(self.c2 - self.c1)[validas],
+                                minlength=len(self.removiveis))
+
+    def _clientes(self, j):
+        inicio, fim = self.listas["inv_inicio"][j], self.listas["inv_inicio"][j + 1]
+        return self.listas["inv_linhas"][inicio:fim], self.listas["inv_custos"][inicio:fim]
+
+    def deltas(self, entra):
+        """
+        Variação do custo (sem capacidade) de cada troca de `entra` (fechada) por uma das
+        removiveis. Só as localidades que têm `entra` na lista são percorridas.
+        """
+        linhas, custos = self._clientes(entra)
+        c1 = self.c1[linhas]
+        ganho = np.maximum(c1 - custos, 0).sum()
+
+        # Correção da perda base para as localidades que têm `entra` como opção
+        c2 = self.c2[linhas]
+        perda_real = np.where(custos < c1, 0, np.minimum(custos, c2) - c1)
+        dono = self.posicao[self.n1[linhas]]
+        validas = dono >= 0
+        correcao = np.bincount(dono[validas], weights=(c2 - c1 - perda_real)[validas],
+                               minlength=len(self.removiveis))
+        return self.base - correcao - ganho
+
+    def melhor_saida(self, entra):
+        """
+        Para a facility `entra` (fechada), retorna (delta, sai) da melhor troca.
+        """
+        linhas, custos = self._clientes(entra)
+        if len(self.removiveis) == 0 or np.maximum(self.c1[linhas] - custos, 0).sum() <= 0:
+            return np.inf, -1
+        delta = self.deltas(entra)
+        melhor = int(np.argmin(delta))
+        return float(delta[melhor]), int(self.removiveis[melhor])
+
+    def trocar(self, entra, sai):
+        """
+        Abre `entra`, fecha `sai` e atualiza só as localidades afetadas.
+        """
+        self.aberta[entra], self.aberta[sai] = True, False
+
+        linhas, custos = self._clientes(entra)
+        melhor = custos < self.c1[linhas]
+        segundo = ~melhor & (custos < self.c2[linhas])
+        m, s = linhas[melhor], linhas[segundo]
+        self.c2[m], self.n2[m] = self.c1[m], self.n1[m]
+        self.c1[m], self.n1[m] = custos[melhor], entra
+        self.c2[s], self.n2[s] = custos[segundo], entra
+
+        self._recalcular(np.flatnonzero((self.n1 == sai) | (self.n2 == sai)))
+        self._atualizar_removiveis()
+
+
+def busca_local(estado, rng, tolerancia=1e-9):
+    """
+    Primeira melhora sobre as trocas, percorrendo as candidatas em ordem aleatória até que
+    nenhuma troca melhore a solução.
+    """
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        for entra in rng.permutation(estado.fechadas()):
+            if estado.aberta[entra]:
+                continue
+            delta, sai = estado.melhor_saida(entra)
+            if delta < -tolerancia:
+                estado.trocar(entra, sai)
+                melhorou = True
+    return estado
+
+
+def busca_capacitada(listas, estado, custo, atribuicao, capacidade, opcoes, rng, limite):
+    """
+    Primeira melhora sobre trocas avaliadas pelo custo com capacidades (custo_capacitado),
+    para quando a alocação à mais próxima excede alguma capacidade. Entram as facilities
+    fechadas entre as opcoes["entradas_capacidade"] mais próximas das localidades que o reparo
+    tirou da sua mais próxima e, para cada uma, são testadas as opcoes["saidas_capacidade"]
+    trocas de menor variação do custo sem capacidade.
+    Retorna (estado, custo, atribuicao).
+    """
+    p, cap_f = capacidade
+    nf, f = listas["nf"], listas["f"]
+    melhorou = True
+    while melhorou and time.time() < limite and len(estado.removiveis):
+        melhorou = False
+        deslocadas = atribuicao != estado.n1
+        entradas = np.unique(listas["J"][deslocadas, :opcoes["entradas_capacidade"]])
+        entradas = entradas[(entradas >= nf) & (entradas < f)]
+        entradas = entradas[~estado.aberta[entradas]]
+        for entra in rng.permutation(entradas):
+            for r in np.argsort(estado.deltas(entra), kind="stable")[:opcoes["saidas_capacidade"]]:
+                vizinho = estado.copiar()
+                vizinho.trocar(int(entra), int(estado.removiveis[r]))
+                custo_vizinho, atribuicao_vizinho = custo_capacitado(listas, vizinho, p, cap_f)
+                if custo_vizinho < custo - 1e-9:
+                    estado, custo, atribuicao, melhorou = vizinho, custo_vizinho, atribuicao_vizinho, True
+                    break
+            if melhorou or time.time() >= limite:
+                break
+    return estado, custo, atribuicao
+
+
+def perturbar(estado, k, rng):
+    """
+    Vizinhança k: troca k facilities novas abertas por k fechadas, ao acaso.
+    """
+    removiveis, fechadas = estado.removiveis, estado.fechadas()
+    k = min(k, len(removiveis), len(fechadas))
+    for sai, entra in zip(rng.choice(removiveis, k, replace=False), rng.choice(fechadas, k, replace=False)):
+        estado.trocar(int(entra), int(sai))
+    return estado
+
+
+def vns(listas, abertas_f, opcoes, semente, reportar=None, capacidade=None):
+    """
+    Busca em vizinhança variável (VNS básica) a partir de abertas_f (índices em F).
+
+    A busca local usa o custo sem capacidade, avaliado de forma incremental; com
+    capacidade=(p, cap_f), cada ótimo local é avaliado pelo custo depois do reparo das
+    capacidades (custo_capacitado) e, se alguma capacidade está ativa, melhorado por trocas
+    avaliadas com capacidades (busca_capacitada). Esse custo decide a aceitação. A melhor solução que respeita as
+    capacidades é mantida à parte e reportar(custo, abertas_f, atribuicao) é chamada a cada
+    nova melhor. Retorna (custo, abertas_f) dessa solução, ou (None, None) se nenhuma coube, e
+    o número de iterações.
+    """
+    rng = np.random.default_rng(semente)
+    limite = time.time() + opcoes["tempo_limite"]
+
+    def otimizar(estado, referencia=np.inf):
+        """
+        Busca local sem capacidade e, se o reparo das capacidades muda o custo, trocas
+        avaliadas com capacidades; estas só quando o custo sem capacidade fica abaixo de
+        `referencia` (o custo da solução atual), pois raramente compensam acima dele.
+        Retorna (estado, custo, atribuicao).
+        """
+        estado = busca_local(estado, rng)
+        if capacidade is None:
+            return estado, estado.custo, np.where(estado.n1 < listas["f"], estado.n1, -1)
+        custo, atribuicao = custo_capacitado(listas, estado, *capacidade)
+        if custo > estado.custo + 1e-9 and estado.custo < referencia - 1e-9:
+            return busca_capacitada(listas, estado, custo, atribuicao, capacidade, opcoes, rng, limite)
+        return estado, custo, atribuicao
+
+    melhor = {"custo": None, "abertas": None}
+
+    def registrar(custo, estado, atribuicao):
+        # Só soluções em que todas as localidades couberam (sem a penalidade) são incumbentes
+        if custo >= listas["penalidade"] or (melhor["custo"] is not None and custo >= melhor["custo"] - 1e-9):
+            return
+        melhor.update({"custo": custo, "abertas": estado.abertas})
+        if reportar:
+            reportar(custo, melhor["abertas"], atribuicao)
+
+    atual, custo_atual, atribuicao = otimizar(EstadoVNS(listas, abertas_f))
+    registrar(custo_atual, atual, atribuicao)
+
+    iteracoes, sem_melhora, k = 0, 0, 1
+    while time.time() < limite and sem_melhora < opcoes["max_sem_melhora"]:
+        candidato, custo_candidato, atribuicao = otimizar(perturbar(atual.copiar(), k, rng), custo_atual)
+        registrar(custo_candidato, candidato, atribuicao)
+        iteracoes += 1
+        if custo_candidato < custo_atual - 1e-9:
+            atual, custo_atual, k = candidato, custo_candidato, 1
+            sem_melhora = 0
+        elif k < opcoes["k_max"]:
+            k += 1
+        else:
+            k, sem_melhora = 1, sem_melhora + 1
+    return melhor["custo"], melhor["abertas"], iteracoes
+
+
+def guloso_listas(listas, p):
+    """
+    Adição gulosa sobre as listas: parte das facilities fixas e abre, uma a uma, as p
+    facilities novas que mais reduzem o custo total. Como o ganho de cada candidata só diminui
+    à medida que outras abrem, os ganhos são reavaliados de forma preguiçosa (heap).
+    Retorna índices em F.
+    """
+    estado = EstadoVNS(listas, np.arange(listas["nf"]))
+    colunas = np.repeat(np.arange(listas["f"]), np.diff(listas["inv_inicio"]))
+    ganhos = np.bincount(colunas, weights=np.maximum(estado.c1[listas["inv_linhas"]] - listas["inv_custos"], 0),
+                         minlength=listas["f"])
+    heap = [(-ganhos[j], int(j)) for j in estado.fechadas()]
+    heapq.heapify(heap)
+    for _ in range(p):
+        while True:
+            _, j = heapq.heappop(heap)
+            linhas, custos = estado._clientes(j)
+            ganho = np.maximum(estado.c1[linhas] - custos, 0).sum()
+            if not heap or ganho >= -heap[0][0]:
+                break
+            heapq.heappush(heap, (-ganho, j))
+        estado.aberta[j] = True
+        estado._recalcular(linhas)
+    return estado.abertas
+
+
+def atribuir_listas(listas, abertas_f, p, cap_f, estado=None):
+    """
+    Atribuição respeitando capacidades: cada localidade vai para a primeira aberta da sua
+    lista; se alguma capacidade for excedida, as localidades são atendidas em ordem decrescente
+    de arrependimento e vão para a opção mais barata que ainda comporta p_i. `estado` é um
+    EstadoVNS com as mesmas abertas, quando o chamador já o tem.
+    Retorna o índice em F de cada localidade (-1 se nenhuma opção comportar).
+    """
+    if estado is None:
+        estado = EstadoVNS(listas, abertas_f)
+    sem = listas["f"]
+    atribuicao = np.where(estado.n1 < sem, estado.n1, -1)
+    carga = np.bincount(estado.n1, weights=p, minlength=sem + 1)[:sem]
+    if (carga <= cap_f).all():
+        return atribuicao
+
+    residual = np.asarray(cap_f, dtype=np.float64).copy()
+    atribuicao = np.full(len(atribuicao), -1, dtype=np.int64)
+    for i in np.argsort(-(estado.c2 - estado.c1), kind="stable"):
+        for j in listas["J"][i]:
+            if estado.aberta[j] and residual[j] >= p[i]:
+                atribuicao[i] = j
+                residual[j] -= p[i]
+                break
+    return atribuicao
+
+
+def custo_capacitado(listas, estado, p, cap_f):
+    """
+    Custo das abertas de `estado` depois do reparo das capacidades (atribuir_listas), com a
+    penalidade das listas para cada localidade que não coube em nenhuma aberta.
+    Retorna (custo, atribuicao).
+    """
+    atribuicao = atribuir_listas(listas, estado.abertas, p, cap_f, estado)
+    atendidas = np.flatnonzero(atribuicao >= 0)
+    posicoes = np.argmax(listas["J"][atendidas] == atribuicao[atendidas, None], axis=1)
+    custo = float(listas["C"][atendidas, posicoes].sum())
+    return custo + listas["penalidade"] * (len(atribuicao) - len(atendidas)), atribuicao
+
+
+def _inicializar_processo(fila):
+    global _FILA
+    _FILA = fila
+
+
+def _executar_inicio(abertas_f, opcoes, semente, capacidade):
+    """
+    Um início da VNS num processo do pool; as melhorias vão para a fila compartilhada.
+    """
+    def reportar(custo, abertas, atribuicao):
+        _FILA.put((custo, abertas, atribuicao, semente))
+    return vns(_LISTAS, abertas_f, opcoes, semente, reportar, capacidade)
+
+
+def resolver_vns(inst, opcoes=None, saida=None, limitante=False):
+    """
+    Resolve o p-median do facility_v4 (tipo_problema 1) com VNS multi-início em paralelo,
+    respeitando facilities fixas, k, d_max e capacidades, sem montar a matriz de distâncias
+    l x f. Cada conjunto de abertas é avaliado pela atribuição com capacidades
+    (custo_capacitado), e só soluções que cabem nas capacidades são reportadas.
+
+    Se `saida` for informada, cada nova melhor solução é gravada nela com o esquema de saída
+    do facility_v4 e status "Feasible". Com limitante=True, info["lagrangiana"] traz o
+    limitante inferior lagrangiano calculado sobre as mesmas listas de candidatas.
+    Retorna (status, objetivo, abertas, atribuicao, info).
+    """
+    global _LISTAS
+    if inst["flag_problema"] != 1:
+        raise ValueError("O modo vns suporta apenas tipo_problema 1 (minimizar distância ponderada).")
+
+    opcoes = {**OPCOES_PADRAO, **(opcoes or {})}
+    desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+    if desconhecidas:
+        raise ValueError(f"Parâmetros de vns desconhecidos: {sorted(desconhecidas)}")
+    workers = opcoes["workers"] or os.cpu_count() or 1
+    inicios = opcoes["inicios"] or workers
+
+    inicio = time.time()
+    listas = listas_candidatas(inst, opcoes["vizinhos"])
+    nf, novas = listas["nf"], inst["k"] - listas["nf"]
+    cap_f = np.concatenate([np.full(nf, np.inf), inst["cap"]])  # fixas não têm capacidade no modelo
+    linhas = np.arange(len(listas["J"]))
+
+    # Início 0 a partir da adição gulosa; os demais a partir de conjuntos aleatórios
+    rng = np.random.default_rng(opcoes["semente"])
+    partidas = [guloso_listas(listas, novas)]
+    for _ in range(1, inicios):
+        sorteadas = rng.choice(np.arange(nf, listas["f"]), novas, replace=False)
+        partidas.append(np.concatenate([np.arange(nf), sorteadas]))
+
+    melhor = {"objetivo": None, "abertas": None, "atribuicao": None, "inicio": None}
+
+    def receber(custo, abertas_f, atribuicao, semente):
+        if custo >= listas["penalidade"] or (atribuicao < 0).any():
+            return
+        posicoes = np.argmax(listas["J"] == atribuicao[:, None], axis=1)
+        objetivo = float(np.dot(inst["w"], listas["D"][linhas, posicoes]))
+        if melhor["objetivo"] is not None and objetivo >= melhor["objetivo"] - 1e-9:
+            return
+        melhor.update({"objetivo": objetivo, "abertas": abertas_f[abertas_f >= nf] - nf,
+                       "atribuicao": atribuicao, "inicio": semente})
+        if saida is not None:
+            parcial = montar_resultados(inst, "Feasible", objetivo, time.time() - inicio,
+                                        melhor["abertas"], atribuicao)
+            parcial["vns"] = {"parcial": True, "inicio": semente}
+            gravar_resultados(parcial, saida)
+
+    sementes = [opcoes["semente"] + s for s in range(inicios)]
+    iteracoes = 0
+    if workers == 1:
+        for partida, semente in zip(partidas, sementes):
+            _, _, it = vns(listas, partida, opcoes, semente,
+                           lambda c, a, t, s=semente: receber(c, a, t, s), (inst["p"], cap_f))
+            iteracoes += it
+    else:
+        contexto = multiprocessing.get_context("fork")
+        fila = contexto.Queue()
+        _LISTAS = listas
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=contexto,
+                                     initializer=_inicializar_processo, initargs=(fila,)) as pool:
+                futuros = [pool.submit(_executar_inicio, partida, opcoes, semente, (inst["p"], cap_f))
+                           for partida, semente in zip(partidas, sementes)]
+                while not all(f.done() for f in futuros) or not fila.empty():
+                    try:
+                        receber(*fila.get(timeout=0.2))
+                    except queue.Empty:
+                        pass
+                iteracoes = sum(f.result()[2] for f in futuros)
+        finally:
+            _LISTAS = None
+
+    if limitante and melhor["objetivo"] is not None:
+        # Pares fora das listas custam ao menos o último custo de uma lista completa
+        validas = np.isfinite(listas["C"])
+        truncadas = validas.all(axis=1) & (listas["C"].shape[1] < listas["f"])
+        teto = np.where(truncadas, listas["C"][:, -1], np.inf)
+        i, r = np.nonzero(validas)
+        lagrangiana = relaxacao_lagrangiana(inst, i, listas["J"][i, r], listas["C"][i, r],
+                                            melhor["objetivo"], teto=teto)
+
+    info = {"inicios": inicios, "workers": workers, "iteracoes": iteracoes,
+            "vizinhos": opcoes["vizinhos"], "melhor_inicio": melhor["inicio"],
+            "tempo": time.time() - inicio}
+    if limitante and melhor["objetivo"] is not None:
+        info["lagrangiana"] = lagrangiana
+    if melhor["objetivo"] is None:
+        return "Not Solved", None, None, None, info
+    return "Feasible", melhor["objetivo"], melhor["abertas"], melhor["atribuicao"], info
@@ -0,0 +1,211 @@
+"""
+Worker persistente do otimizador: mantém PuLP, NumPy e SciPy (e o matplotlib, quando usado)
+carregados e resolve vários jobs do facility_v4 sem pagar a inicialização do interpretador
+a cada um.
+
+Cada job é uma linha JSON com o arquivo de saída e a entrada (caminho ou JSON inline):
+    {"id": "42", "entrada": "/upload/entrada.json", "saida": "/upload/saida.json"}
+    {"id": "43", "dados": {"localidades": [...], ...}, "saida": "/upload/saida2.json"}
+
+Para cada job é escrita uma linha JSON de resposta com id, saida, status e tempo.
+
+Uso:
+    python worker.py [--workers N]                 # jobs pelo stdin, respostas pelo stdout
+    python worker.py --socket /tmp/otimizacao.sock # jobs por um socket Unix local
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socketserver
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Importa os módulos pesados uma única vez; os processos do pool herdam tudo via fork
+import facility_v4
+
+
+def _inicializar_processo():
+    """
+    Nos processos do pool, desvia o stdout (prints do script e log dos solvers) para o stderr,
+    deixando o stdout do worker só para as respostas.
+    """
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+
+def executar_job(job):
+    """
+    Executa um job no processo atual e retorna a resposta.
+    """
+    inicio = time.time()
+    resposta = {"id": job.get("id"), "saida": job.get("saida")}
+    try:
+        if "saida" not in job:
+            raise ValueError("Job sem o campo 'saida'.")
+        if "entrada" not in job and "dados" not in job:
+            raise ValueError("Job sem 'entrada' nem 'dados'.")
+        resultados = facility_v4.executar(job.get("entrada"), job["saida"], dados=job.get("dados"))
+        resposta["status"] = resultados.get("status")
+        if "mensagem" in resultados:
+            resposta["mensagem"] = resultados["mensagem"]
+    except Exception as e:
+        resposta.update({"status": "Erro", "mensagem": str(e)})
+    resposta["tempo"] = time.time() - inicio
+    return resposta
+
+
+class Worker:
+    """
+    Pool limitado de processos que resolve jobs; no máximo 2 * workers jobs ficam pendentes.
+    Se um processo do pool morre (falta de memória, falha no solver), o pool é recriado e os
+    jobs afetados recebem uma resposta de erro.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.trava_pool = threading.Lock()
+        self.pool = self._novo_pool()
+        self.vagas = threading.BoundedSemaphore(2 * workers)
+
+    def _novo_pool(self):
+        contexto = multiprocessing.get_context("fork")
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=contexto,
+                                   initializer=_inicializar_processo)
+
+    def _recriar_pool(self, quebrado):
+        """
+        Troca o pool quebrado por um novo (uma vez só, se vários jobs notarem a quebra).
+        """
+        with self.trava_pool:
+            if self.pool is quebrado:
+                quebrado.shutdown(wait=False)
+                self.pool = self._novo_pool()
+
+    def submeter(self, linha, responder):
+        """
+        Interpreta uma linha de job e agenda sua execução; `responder` recebe a resposta.
+        """
+        linha = linha.strip()
+        if not linha:
+            return
+        try:
+            job = json.loads(linha)
+        except ValueError as e:
+            responder({"status": "Erro", "mensagem": f"Job inválido: {e}"})
+            return
+        if not isinstance(job, dict):
+            responder({"status": "Erro", "mensagem": "Job inválido: esperado um objeto JSON."})
+            return
+
+        def erro(mensagem):
+            return {"id": job.get("id"), "saida": job.get("saida"), "status": "Erro", "mensagem": mensagem}
+
+        self.vagas.acquire()
+        with self.trava_pool:
+            pool = self.pool
+        try:
+            futuro = pool.submit(executar_job, job)
+        except Exception as e:
+            self.vagas.release()
+            if isinstance(e, BrokenProcessPool):
+                self._recriar_pool(pool)
+            responder(erro(f"Falha ao agendar o job: {e}"))
+            return
+
+        def concluir(f):
+            self.vagas.release()
+            try:
+                resposta = f.result()
+            except BrokenProcessPool as e:
+                self._recriar_pool(pool)
+                resposta = erro(f"Processo do worker terminou de forma anormal: {e}")
+            except Exception as e:
+                resposta = erro(str(e))
+            responder(resposta)
+
+        futuro.add_done_callback(concluir)
+
+    def encerrar(self):
+        with self.trava_pool:
+            pool = self.pool
+        pool.shutdown(wait=True)
+
+
+def servir_stdin(worker):
+    """
+    Lê jobs do stdin até EOF e escreve as respostas no stdout, uma por linha.
+    """
+    trava = threading.Lock()
+
+    def responder(resposta):
+        with trava:
+            sys.stdout.write(json.dumps(resposta) + "\n")
+            sys.stdout.flush()
+
+    for linha in sys.stdin:
+        worker.submeter(linha, responder)
+    worker.encerrar()
+
+
+def servir_socket(worker, caminho):
+    """
+    Atende jobs em um socket Unix local; as respostas voltam pela mesma conexão.
+    """
+    # Só remove um socket deixado por uma execução anterior, nunca outro tipo de arquivo
+    if os.path.lexists(caminho):
+        if not stat.S_ISSOCK(os.lstat(caminho).st_mode):
+            raise ValueError(f"{caminho} já existe e não é um socket.")
+        os.remove(caminho)
+
+    class Tratador(socketserver.StreamRequestHandler):
+        def handle(self):
+            condicao = threading.Condition()
+            pendentes = [0]
+
+            def responder(resposta):
+                with condicao:
+                    try:
+                        self.wfile.write((json.dumps(resposta) + "\n").encode("utf-8"))
+                        self.wfile.flush()
+                    except OSError:
+                        pass  # cliente desconectou; o resultado continua no arquivo de saída
+                    pendentes[0] -= 1
+                    condicao.notify_all()
+
+            for linha in self.rfile:
+                linha = linha.decode("utf-8")
+                if not linha.strip():
+                    continue
+                with condicao:
+                    pendentes[0] += 1
+                worker.submeter(linha, responder)
+            with condicao:
+                condicao.wait_for(lambda: pendentes[0] == 0)
+
+    with socketserver.ThreadingUnixStreamServer(caminho, Tratador) as servidor:
+        try:
+            servidor.serve_forever()
+        finally:
+            worker.encerrar()
+            os.remove(caminho)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker persistente do otimizador de facilities.")
+    parser.add_argument("--workers", type=int, default=1, help="número de processos resolvendo jobs")
+    parser.add_argument("--socket", help="caminho do socket Unix (padrão: stdin/stdout)")
+    args = parser.parse_args()
+
+    worker = Worker(max(1, args.workers))
+    if args.socket:
+        servir_socket(worker, args.socket)
+    else:
+        servir_stdin(worker)
+
+
+if __name__ == "__main__":
+    main()
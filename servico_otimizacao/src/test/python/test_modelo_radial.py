@@ -0,0 +1,88 @@
+"""
+Formulação radial contra o modelo clássico (modelo_matricial) numa instância pequena com
+capacidade ativa.
+
+Uso (de servico_otimizacao):
+    python -m unittest discover -s src/test/python
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "main", "resources"))
+
+from instancia import preparar_instancia, calcular_distancias
+from modelo_matricial import montar_modelo, resolver_highs, decodificar
+from modelo_radial import montar_modelo_radial, resolver_radial, vetor_radial, facilities_violadas
+from solucao import valor_objetivo
+
+
+def instancia_capacitada(semente=0):
+    """
+    60 localidades em torno do centro de Recife (cerca de 90 mil moradores), 2 facilities
+    fixas e 10 novas entre elas; com 4 novas abertas, a alocação à mais próxima passa da
+    capacidade de alguma nova.
+    """
+    rng = np.random.default_rng(semente)
+    localidades = [
+        {"codigo": str(i), "total_moradores": int(rng.integers(750, 2250)),
+         "coordenada": [-8.05 + rng.normal(0, 0.02), -34.90 + rng.normal(0, 0.02)],
+         "metricas": [float(rng.uniform(0.5, 1.5))]}
+        for i in range(60)
+    ]
+    fixas = [{"codigo_cnes": f"cnes{j}", "fixed": True, "coordenada": coordenada}
+             for j, coordenada in enumerate([[-8.03, -34.92], [-8.07, -34.88]])]
+    novas = [{"fixed": False, "custo": 1000,
+              "coordenada": [-8.05 + rng.normal(0, 0.015), -34.90 + rng.normal(0, 0.015)]}
+             for _ in range(10)]
+    inst = preparar_instancia({
+        "localidades": localidades, "facilities": fixas + novas, "tipo_problema": 1,
+        "num_centros_desejado": 6, "pesos": [1], "proporcao_inversa": [0], "cache_distancias": False,
+    })
+    calcular_distancias(inst)
+    return inst
+
+
+class TestModeloRadial(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = instancia_capacitada()
+
+    def test_capacidade_ativa(self):
+        modelo = montar_modelo_radial(self.inst)
+        status, vetor, _ = resolver_highs(modelo)
+        self.assertEqual(status, "Optimal")
+        abertas = np.flatnonzero(vetor[:modelo["n_y"]] > 0.5)
+        nf = len(self.inst["Ff"])
+        usadas = np.concatenate([np.arange(nf), nf + abertas])
+        atribuicao = usadas[np.argmin(self.inst["d"][:, usadas], axis=1)]
+        self.assertGreater(len(facilities_violadas(self.inst, atribuicao)), 0)
+
+    def test_mesmo_otimo_do_modelo_classico(self):
+        modelo = montar_modelo(self.inst)
+        status_classico, vetor, objetivo_classico = resolver_highs(modelo)
+        self.assertEqual(status_classico, "Optimal")
+        abertas_classico, atribuicao_classico = decodificar(modelo, vetor)
+
+        status, objetivo, abertas, atribuicao, info = resolver_radial(self.inst)
+        self.assertEqual(status, "Optimal")
+        self.assertTrue(info["aplicado"])
+        self.assertGreater(len(info["rodadas"]), 1)
+        self.assertAlmostEqual(objetivo, objetivo_classico, places=6)
+        self.assertAlmostEqual(valor_objetivo(self.inst, abertas, atribuicao), objetivo_classico, places=6)
+        self.assertEqual(len(facilities_violadas(self.inst, atribuicao)), 0)
+        self.assertEqual(len(abertas), self.inst["k"] - len(self.inst["Ff"]))
+
+        # A solução do modelo clássico, como solução inicial, é viável no modelo radial final
+        criticas = np.arange(len(self.inst["Fn"]))
+        radial = montar_modelo_radial(self.inst, criticas)
+        inicial = vetor_radial(radial, self.inst, abertas_classico, atribuicao_classico)
+        linhas = radial["A"] @ inicial
+        self.assertTrue((linhas >= radial["lb"] - 1e-9).all())
+        self.assertTrue((linhas <= radial["ub"] + 1e-9).all())
+
+
+if __name__ == "__main__":
+    unittest.main()